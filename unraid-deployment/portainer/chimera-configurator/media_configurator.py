@@ -22,40 +22,188 @@ Usage:
     python3 media_configurator.py configure --dry-run  # Preview changes
     python3 media_configurator.py status            # Check integration status
     python3 media_configurator.py extract-keys      # Extract API keys from configs
+    python3 media_configurator.py watch             # Reconfigure on container events
+    python3 media_configurator.py inventory         # Export library contents as NDJSON
 
 Unraid-specific features:
-- Automatic Docker container detection via docker inspect
+- Automatic Docker container detection via the Docker Engine API (docker CLI fallback)
 - API key extraction from container config files
 - Unraid path conventions (/mnt/user/...)
 - Integration with Portainer-deployed stacks
 """
 
 import argparse
+import asyncio
+import codecs
+import contextlib
+import copy
+import csv
+import errno
+import hashlib
+import ipaddress
 import json
+import math
 import os
 import re
 import sys
 import time
+import queue
+import random
 import socket
+import socketserver
+import selectors
 import subprocess
+import threading
+import zlib
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field, asdict
+from functools import partial
 from pathlib import Path
-from typing import Optional, Dict, List, Any, Tuple
-from urllib.parse import urljoin
-import urllib.request
-import urllib.error
+from typing import Optional, Dict, List, Any, Tuple, Iterator, Callable
+from urllib.parse import urljoin, quote, urlsplit
+import http.client
+import http.server
 import ssl
 
+try:
+    import sqlite3
+except ImportError:  # Python built without sqlite - latency history is skipped
+    sqlite3 = None
+
+try:
+    import resource
+except ImportError:  # not on Unix - the scan keeps SCAN_CONCURRENCY as is
+    resource = None
+
 # ============================================================================
 # Configuration
 # ============================================================================
 
 # Config file location - store in /boot/config for persistence across reboots on Unraid
+# (CHIMERA_CONFIG_FILE overrides, e.g. for test runs on an Unraid host)
 UNRAID_CONFIG_DIR = Path("/boot/config/plugins/chimera")
-CONFIG_FILE = UNRAID_CONFIG_DIR / "media_stack_config.json" if UNRAID_CONFIG_DIR.parent.exists() else Path(__file__).parent / "config.json"
+CONFIG_FILE = Path(os.environ.get("CHIMERA_CONFIG_FILE") or
+                   (UNRAID_CONFIG_DIR / "media_stack_config.json" if UNRAID_CONFIG_DIR.parent.exists()
+                    else Path(__file__).parent / "config.json"))
 DEFAULT_TIMEOUT = 10
 
+# Runtime state rewritten on most runs - kept off the USB flash on Unraid (/tmp is RAM).
+# Point CHIMERA_STATE_DIR at the cache pool (e.g. /mnt/cache/appdata/chimera) to keep it across reboots
+STATE_DIR = Path(os.environ.get("CHIMERA_STATE_DIR") or
+                 ("/tmp/chimera" if UNRAID_CONFIG_DIR.parent.exists() else CONFIG_FILE.parent))
+
+# Discovery results are reused while a container's fingerprint is unchanged
+DISCOVERY_CACHE_FILE = STATE_DIR / "discovery_cache.json"
+
+# Wiring applied by configure, keyed by a hash of each item's inputs
+APPLIED_LEDGER_FILE = STATE_DIR / "applied_ledger.json"
+
+# Adaptive timeouts - derived from observed latency (p99 x multiplier, clamped)
+LATENCY_STATS_FILE = STATE_DIR / "latency_stats.json"
+LATENCY_SAMPLES = 50            # samples kept per service / endpoint
+LATENCY_MIN_SAMPLES = 5         # below this, fall back to DEFAULT_TIMEOUT
+LATENCY_PERCENTILE = 99
+TIMEOUT_MULTIPLIER = 3.0
+CONNECT_TIMEOUT_RANGE = (0.5, 5.0)
+READ_TIMEOUT_RANGE = (3.0, 30.0)
+# Transport errors for a timed-out request, by phase; these feed back into the stats
+TIMEOUT_ERRORS = {"connect": "connect timed out", "read": "timed out"}
+MAX_REDIRECTS = 3
+
+# Every service check (time, latency, HTTP status, version), for 'status --history'.
+# Kept on the cache pool when there is one - it is append-heavy and should survive reboots
+HISTORY_DB = Path(os.environ.get("CHIMERA_HISTORY_DB") or
+                  (Path("/mnt/cache/appdata/chimera") if Path("/mnt/cache").is_dir() else STATE_DIR) / "latency_history.db")
+HISTORY_RAW_DAYS = 8            # individual checks (the 1 week view is exact)
+HISTORY_ROLLUP_DAYS = 365       # older checks are downsampled to hourly rollups kept this long
+HISTORY_WINDOWS = (("1h", 3600), ("1d", 86400), ("1w", 7 * 86400))
+HISTORY_DEGRADED_RATIO = 1.5    # flag a service whose 1d p50 is this much above its 1w p50
+
+# Read-through cache for GETs; any write invalidates its resource prefix
+GET_CACHE_TTL = 60.0
+GET_CACHE_SIZE = 256
+
+# Response bodies are requested compressed and read in chunks of this size
+READ_CHUNK_SIZE = 64 * 1024
+
+# Keep-alive connection pool shared by every APIClient
+POOL_MAX_IDLE = 4               # idle connections kept per (scheme, host, port)
+POOL_IDLE_TIMEOUT = 30.0        # idle connections older than this are closed
+
+# Per base URL circuit breaker - a dead service costs a few timeouts, not one per call,
+# while a single dropped connection doesn't fail every remaining step
+CIRCUIT_FAILURE_THRESHOLD = 3   # consecutive connection failures before opening
+CIRCUIT_RESET_AFTER = 30.0      # seconds before a half-open retry (watch and other long runs)
+
+# Bounded exponential backoff for transient errors while containers start up. A 502/504
+# may come after the service already acted, so only reads retry on those; writes retry
+# only on 503, which means the request was turned away unprocessed
+RETRY_STATUSES = (502, 503, 504)
+RETRY_WRITE_STATUSES = (503,)
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 4.0
+
+# Verification fan-out - one shared pool, and a cap on concurrent requests per
+# service endpoint (host:port) so small containers aren't overwhelmed
+VERIFY_WORKERS = 16
+VERIFY_PER_HOST = 4
+
+# Readiness gate ('wait-ready', 'configure --wait') - services still starting or
+# migrating their database are polled: TCP probe first, then the status endpoint
+READY_DEADLINE = 600.0          # overall deadline for every service together
+READY_BACKOFF = 1.0             # first retry delay, doubled per attempt and jittered
+READY_BACKOFF_MAX = 15.0
+READY_PROBE_TIMEOUT = 1.0
+
+# Docker Engine API socket (DOCKER_HOST=unix://... overrides)
+DOCKER_SOCKET = "/var/run/docker.sock"
+
+# Container labels that declare a service explicitly (checked before name matching)
+LABEL_SERVICE = "com.chimera.service"   # e.g. com.chimera.service=sonarr
+LABEL_PORT = "com.chimera.port"         # published host port, e.g. 8989
+LABEL_URL = "com.chimera.url"           # full URL, e.g. http://192.168.1.10:8989
+
+# Unraid dockerMan templates - port mappings, networks and appdata for every container
+# (CHIMERA_TEMPLATES_DIR overrides)
+DOCKERMAN_TEMPLATES = Path(os.environ.get("CHIMERA_TEMPLATES_DIR") or "/boot/config/plugins/dockerMan/templates-user")
+
+# Discovery concurrency - containers are resolved on a bounded worker pool and
+# each container's candidate endpoints are probed in parallel
+DISCOVERY_WORKERS = 16
+PROBE_TIMEOUT = 2.0
+
+# Resident daemon ('serve') - a unix socket path, or host:port / port for localhost TCP.
+# Forwardable commands run there with warm connections, circuits and Docker caches
+DAEMON_ADDRESS = os.environ.get("CHIMERA_DAEMON") or str(STATE_DIR / "configurator.sock")
+DAEMON_COMMANDS = ("status", "discover", "plan", "apply", "configure")   # configure unless it would prompt
+DAEMON_CONNECT_TIMEOUT = 0.5
+DAEMON_TIMEOUT = 600.0          # how long the CLI waits for a forwarded command
+DAEMON_POOL_IDLE = 300.0        # keep-alive connections are held longer while serving
+
+# Prometheus exporter ('exporter') - scrapes are answered from a snapshot that a
+# background thread refreshes, so scrapers never add load on the services
+EXPORTER_LISTEN = "0.0.0.0:9707"
+EXPORTER_INTERVAL = 30.0        # seconds between refreshes
+EXPORTER_CONCURRENCY = 4        # requests in flight during a refresh
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Port-scan fallback - non-blocking connects multiplexed on one selector
+SCAN_RATE = 2000            # new connects per second
+SCAN_CONCURRENCY = 512      # connects in flight at once
+SCAN_FD_HEADROOM = 64       # descriptors left free (pool, Docker socket, history db) below RLIMIT_NOFILE
+SCAN_CONNECT_TIMEOUT = 1.0  # per-connect timeout
+SCAN_DEADLINE = 3.0         # global deadline for the whole scan
+SCAN_MAX_PREFIX = 24        # auto-detected networks are narrowed to a /24
+# socket() errors that free up as connects finish; the target is retried, not skipped
+SCAN_RETRY_ERRNOS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM)
+
+# Every service slot in Config, in display order
+CONFIG_SERVICES = ['sonarr', 'radarr', 'prowlarr', 'bazarr', 'overseerr', 'plex', 'rdt_client', 'tautulli', 'zurg']
+
 # Default service ports
 DEFAULT_PORTS = {
     "sonarr": 8989,
@@ -107,25 +255,47 @@ class Colors:
     DIM = '\033[2m'
     RESET = '\033[0m'
 
+# Output of steps running concurrently is buffered per thread (see capture_output)
+_output = threading.local()
+
+def emit(line: str):
+    lines = getattr(_output, "lines", None)
+    if lines is None:
+        print(line)
+    else:
+        lines.append(line)
+
+def capture_output(func: Callable[..., Any], *args: Any) -> List[str]:
+    """Run func with this thread's print_* output buffered; returns the lines"""
+    outer = getattr(_output, "lines", None)   # e.g. a daemon command capturing this thread
+    _output.lines = []
+    try:
+        func(*args)
+    except Exception as e:
+        print_error(f"Step failed: {e}")
+    finally:
+        lines, _output.lines = _output.lines, outer
+    return lines
+
 def print_header(text: str):
-    print(f"\n{Colors.CYAN}{Colors.BOLD}{'='*60}{Colors.RESET}")
-    print(f"{Colors.CYAN}{Colors.BOLD}  {text}{Colors.RESET}")
-    print(f"{Colors.CYAN}{Colors.BOLD}{'='*60}{Colors.RESET}\n")
+    emit(f"\n{Colors.CYAN}{Colors.BOLD}{'='*60}{Colors.RESET}")
+    emit(f"{Colors.CYAN}{Colors.BOLD}  {text}{Colors.RESET}")
+    emit(f"{Colors.CYAN}{Colors.BOLD}{'='*60}{Colors.RESET}\n")
 
 def print_success(text: str):
-    print(f"  {Colors.GREEN}✓{Colors.RESET} {text}")
+    emit(f"  {Colors.GREEN}✓{Colors.RESET} {text}")
 
 def print_error(text: str):
-    print(f"  {Colors.RED}✗{Colors.RESET} {text}")
+    emit(f"  {Colors.RED}✗{Colors.RESET} {text}")
 
 def print_warning(text: str):
-    print(f"  {Colors.YELLOW}⚠{Colors.RESET} {text}")
+    emit(f"  {Colors.YELLOW}⚠{Colors.RESET} {text}")
 
 def print_info(text: str):
-    print(f"  {Colors.BLUE}ℹ{Colors.RESET} {text}")
+    emit(f"  {Colors.BLUE}ℹ{Colors.RESET} {text}")
 
 def print_step(num: int, total: int, text: str):
-    print(f"\n{Colors.BOLD}[{num}/{total}]{Colors.RESET} {text}")
+    emit(f"\n{Colors.BOLD}[{num}/{total}]{Colors.RESET} {text}")
 
 # ============================================================================
 # Data Classes
@@ -185,10 +355,969 @@ class Config:
                 setattr(config, key, value)
         return config
 
+# ============================================================================
+# Tracing
+# ============================================================================
+
+TRACE_SUMMARY_ROWS = 10
+
+class Tracer:
+    """Timing spans for --trace, written as Chrome trace-event JSON (Perfetto, chrome://tracing).
+
+    Spans nest by time on each thread. When tracing is off span() costs almost nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, Tuple[int, str]] = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "", **args: Any) -> Iterator[Dict[str, Any]]:
+        """Time the block; the yielded dict can take result details (e.g. status)"""
+        if not self.enabled:
+            yield args
+            return
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            finished = time.perf_counter()
+            thread = threading.current_thread()
+            with self._lock:
+                tid = self._threads.setdefault(thread.ident, (len(self._threads) + 1, thread.name))[0]
+                self._events.append({
+                    "name": name, "cat": category or "misc", "ph": "X", "pid": os.getpid(), "tid": tid,
+                    "ts": round((started - self._origin) * 1e6, 1),
+                    "dur": round((finished - started) * 1e6, 1),
+                    "args": {key: value if isinstance(value, (int, float, bool)) else str(value)
+                             for key, value in args.items()},
+                })
+
+    def save(self, path: Path):
+        with self._lock:
+            events = list(self._events)
+            threads = list(self._threads.values())
+        metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                    for tid, name in threads]
+        try:
+            with open(path, "w") as f:
+                json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        except OSError as e:
+            print_warning(f"Failed to write trace {path}: {e}")
+
+    def print_summary(self, rows: int = TRACE_SUMMARY_ROWS):
+        """Print the slowest operations and the time spent per category"""
+        with self._lock:
+            events = [event for event in self._events if event["cat"] != "command"]
+        if not events:
+            return
+
+        print(f"\n{Colors.BOLD}Slowest operations:{Colors.RESET}")
+        for event in sorted(events, key=lambda e: e["dur"], reverse=True)[:rows]:
+            detail = event["args"].get("url") or event["args"].get("status", "")
+            print(f"  {event['dur'] / 1000:9.1f} ms  {event['cat']:<9} {event['name']}"
+                  + (f"  {Colors.DIM}{detail}{Colors.RESET}" if detail != "" else ""))
+
+        totals: Dict[str, List[float]] = {}
+        for event in events:
+            totals.setdefault(event["cat"], []).append(event["dur"])
+        print(f"\n{Colors.BOLD}By category:{Colors.RESET}")
+        for category, durations in sorted(totals.items(), key=lambda item: -sum(item[1])):
+            print(f"  {sum(durations) / 1000:9.1f} ms  {category:<9} {len(durations)} spans, "
+                  f"max {max(durations) / 1000:.1f} ms")
+
+_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer (disabled unless --trace is given)"""
+    return _tracer
+
+# ============================================================================
+# Persistence
+# ============================================================================
+
+def write_if_changed(path: Path, data: bytes) -> bool:
+    """Atomically replace path with data, skipping the write if the content is identical.
+
+    The new content goes to a temp file in the same directory, is fsynced and
+    renamed over the target, so a power cut leaves either the old or the new file.
+    Returns True if the file was written.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        if hashlib.sha256(path.read_bytes()).hexdigest() == digest:
+            return False
+    except OSError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return True
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+    return True
+
+# Durable writes staged during a run; the last content staged for a path wins
+_pending_writes: Dict[Path, bytes] = {}
+_pending_lock = threading.Lock()
+
+def stage_write(path: Path, data: bytes) -> bool:
+    """Queue data for path until flush_writes(); returns False if the file already holds it"""
+    try:
+        unchanged = path.read_bytes() == data
+    except OSError:
+        unchanged = False
+    with _pending_lock:
+        if unchanged:
+            _pending_writes.pop(path, None)
+        else:
+            _pending_writes[path] = data
+    return not unchanged
+
+def flush_writes():
+    """Write every staged file once (atomically, only if changed)"""
+    with _pending_lock:
+        pending = list(_pending_writes.items())
+        _pending_writes.clear()
+    for path, data in pending:
+        try:
+            write_if_changed(path, data)
+        except OSError as e:
+            print_warning(f"Failed to write {path}: {e}")
+
 # ============================================================================
 # API Client
 # ============================================================================
 
+class CircuitBreaker:
+    """Tracks consecutive connection failures for one base URL"""
+
+    def __init__(self, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_after: float = CIRCUIT_RESET_AFTER):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error = ""
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return False while open; after reset_after, let a single trial call through"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                # Half-open: re-arm the timer so concurrent callers keep short-circuiting
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+_circuits: Dict[str, CircuitBreaker] = {}
+_circuits_lock = threading.Lock()
+
+def get_circuit(base_url: str) -> CircuitBreaker:
+    """Return the shared circuit breaker for a base URL"""
+    with _circuits_lock:
+        if base_url not in _circuits:
+            _circuits[base_url] = CircuitBreaker()
+        return _circuits[base_url]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+def endpoint_key(endpoint: str) -> str:
+    """Normalize an endpoint for latency bookkeeping (no query string, no numeric IDs)"""
+    path = endpoint.split('?', 1)[0]
+    return '/' + '/'.join('{id}' if part.isdigit() else part for part in path.strip('/').split('/'))
+
+class LatencyStats:
+    """Rolling per-service connect and per-endpoint read latencies, persisted between runs"""
+
+    def __init__(self, path: Path = None):
+        self.path = path or LATENCY_STATS_FILE
+        self._connect: Dict[str, List[float]] = {}
+        self._read: Dict[str, List[float]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._connect = data.get("connect", {})
+            self._read = data.get("read", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def _add(samples: Dict[str, List[float]], key: str, value: float):
+        bucket = samples.setdefault(key, [])
+        bucket.append(round(value, 4))
+        del bucket[:-LATENCY_SAMPLES]
+
+    def record(self, base_url: str, endpoint: str, connect: Optional[float], read: float):
+        """Record a request; connect is None when a pooled connection was reused"""
+        with self._lock:
+            if connect is not None:
+                self._add(self._connect, base_url, connect)
+            self._add(self._read, f"{base_url} {endpoint_key(endpoint)}", read)
+            self._dirty = True
+
+    def record_timeout(self, base_url: str, endpoint: str, phase: str, default: float = DEFAULT_TIMEOUT):
+        """Record a timed-out connect or read as a sample at the timeout it hit.
+
+        Successful requests alone would leave the derived timeout wherever the
+        fast responses put it; counting the timeout itself lifts the p99, so
+        the next attempt waits up to TIMEOUT_MULTIPLIER times longer.
+        """
+        connect, read = self.timeouts(base_url, endpoint, default)
+        with self._lock:
+            if phase == "connect":
+                self._add(self._connect, base_url, connect)
+            else:
+                self._add(self._read, f"{base_url} {endpoint_key(endpoint)}", read)
+            self._dirty = True
+
+    @staticmethod
+    def _derive(samples: Optional[List[float]], bounds: Tuple[float, float], default: float) -> float:
+        if not samples or len(samples) < LATENCY_MIN_SAMPLES:
+            return default
+        low, high = bounds
+        return max(low, min(high, percentile(samples, LATENCY_PERCENTILE) * TIMEOUT_MULTIPLIER))
+
+    def timeouts(self, base_url: str, endpoint: str, default: float = DEFAULT_TIMEOUT) -> Tuple[float, float]:
+        """Return (connect_timeout, read_timeout) for a request"""
+        with self._lock:
+            connect = list(self._connect.get(base_url, []))
+            read = list(self._read.get(f"{base_url} {endpoint_key(endpoint)}", []))
+        return (
+            self._derive(connect, CONNECT_TIMEOUT_RANGE, default),
+            self._derive(read, READ_TIMEOUT_RANGE, default),
+        )
+
+    def save(self):
+        if not persistence_enabled():
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": 1, "connect": self._connect, "read": self._read}
+            self._dirty = False
+        try:
+            write_if_changed(self.path, json.dumps(data).encode("utf-8"))
+        except OSError as e:
+            print_warning(f"Failed to save latency stats: {e}")
+
+_latency_stats: Optional[LatencyStats] = None
+
+def get_latency_stats() -> LatencyStats:
+    """Return the process-wide latency stats"""
+    global _latency_stats
+    if _latency_stats is None:
+        _latency_stats = LatencyStats()
+    return _latency_stats
+
+class LatencyHistograms:
+    """Cumulative per-endpoint response-time histograms (Prometheus buckets), kept only for 'exporter'"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.enabled = False
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, base_url: str, endpoint: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._series.setdefault((base_url, endpoint_key(endpoint)),
+                                             {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["counts"][index] += 1
+            series["sum"] += seconds
+            series["count"] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        with self._lock:
+            return {key: {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+                    for key, series in self._series.items()}
+
+_latency_histograms = LatencyHistograms()
+
+def get_latency_histograms() -> LatencyHistograms:
+    """Return the process-wide latency histograms (recording only while exporting)"""
+    return _latency_histograms
+
+class LatencyHistory:
+    """Append-only SQLite log of service checks, downsampled and pruned as it grows.
+
+    Checks are buffered and written in one transaction per run (or exporter refresh).
+    Checks older than HISTORY_RAW_DAYS become hourly rollups (checks, failures, p50,
+    p95, max) and rollups older than HISTORY_ROLLUP_DAYS are dropped.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS checks (
+            ts REAL NOT NULL, service TEXT NOT NULL, latency REAL NOT NULL,
+            status INTEGER NOT NULL, version TEXT NOT NULL DEFAULT '');
+        CREATE INDEX IF NOT EXISTS checks_ts ON checks (ts);
+        CREATE TABLE IF NOT EXISTS rollups (
+            hour INTEGER NOT NULL, service TEXT NOT NULL, checks INTEGER NOT NULL, failures INTEGER NOT NULL,
+            p50 REAL, p95 REAL, max REAL, version TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (hour, service));
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = path or HISTORY_DB
+        self._pending: List[Tuple[float, str, float, int, str]] = []
+        self._lock = threading.Lock()
+
+    def record(self, service: str, latency: float, status: int, version: str = ""):
+        with self._lock:
+            self._pending.append((time.time(), service, round(latency, 4), status, version or ""))
+
+    def _connect(self) -> "sqlite3.Connection":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(self.path), timeout=10)
+        db.executescript(self.SCHEMA)
+        return db
+
+    def flush(self):
+        """Append buffered checks, then downsample and prune"""
+        if sqlite3 is None or not persistence_enabled():
+            return
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany("INSERT INTO checks VALUES (?, ?, ?, ?, ?)", pending)
+                    self._downsample(db, time.time())
+            finally:
+                db.close()
+        except (sqlite3.Error, OSError) as e:
+            print_warning(f"Failed to save latency history {self.path}: {e}")
+
+    @staticmethod
+    def _downsample(db: "sqlite3.Connection", now: float):
+        # Whole hours only, so an hour is never split between a rollup and raw rows
+        cutoff = int(now - HISTORY_RAW_DAYS * 86400) // 3600 * 3600
+        hours: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        for ts, service, latency, status, version in db.execute(
+                "SELECT ts, service, latency, status, version FROM checks WHERE ts < ? ORDER BY ts", (cutoff,)):
+            bucket = hours.setdefault((int(ts) // 3600 * 3600, service), {"ok": [], "failures": 0, "version": ""})
+            if status == 200:
+                bucket["ok"].append(latency)
+            else:
+                bucket["failures"] += 1
+            bucket["version"] = version or bucket["version"]
+
+        for (hour, service), bucket in hours.items():
+            ok = bucket["ok"]
+            db.execute("INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+                hour, service, len(ok) + bucket["failures"], bucket["failures"],
+                percentile(ok, 50) if ok else None, percentile(ok, 95) if ok else None,
+                max(ok) if ok else None, bucket["version"],
+            ))
+        if hours:
+            db.execute("DELETE FROM checks WHERE ts < ?", (cutoff,))
+        db.execute("DELETE FROM rollups WHERE hour < ?", (now - HISTORY_ROLLUP_DAYS * 86400,))
+
+    def summary(self) -> Optional[Dict[str, Dict[str, Dict[str, Any]]]]:
+        """{service: {window: {"p50", "p95", "checks", "failures", "version"}}} from the raw checks.
+
+        The database is opened read-only; None (after printing why) if it can't be read.
+        """
+        self.flush()
+        if sqlite3 is None or not self.path.exists():
+            return {}
+        now = time.time()
+        widest = max(seconds for _, seconds in HISTORY_WINDOWS)
+        try:
+            db = sqlite3.connect(self.path.resolve().as_uri() + "?mode=ro", uri=True, timeout=10)
+            try:
+                rows = db.execute("SELECT ts, service, latency, status, version FROM checks WHERE ts >= ? ORDER BY ts",
+                                  (now - widest,)).fetchall()
+            finally:
+                db.close()
+        except (sqlite3.Error, OSError) as e:
+            print_error(f"Failed to read latency history {self.path}: {e}")
+            return None
+
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for window, seconds in HISTORY_WINDOWS:
+            samples: Dict[str, Dict[str, Any]] = {}
+            for ts, service, latency, status, version in rows:
+                if ts < now - seconds:
+                    continue
+                entry = samples.setdefault(service, {"ok": [], "failures": 0, "version": ""})
+                if status == 200:
+                    entry["ok"].append(latency)
+                else:
+                    entry["failures"] += 1
+                entry["version"] = version or entry["version"]
+            for service, entry in samples.items():
+                ok = entry["ok"]
+                result.setdefault(service, {})[window] = {
+                    "p50": percentile(ok, 50) if ok else None,
+                    "p95": percentile(ok, 95) if ok else None,
+                    "checks": len(ok) + entry["failures"],
+                    "failures": entry["failures"],
+                    "version": entry["version"],
+                }
+        return result
+
+_latency_history: Optional[LatencyHistory] = None
+
+def get_latency_history() -> LatencyHistory:
+    """Return the process-wide latency history"""
+    global _latency_history
+    if _latency_history is None:
+        _latency_history = LatencyHistory()
+    return _latency_history
+
+def resource_prefix(endpoint: str) -> str:
+    """Collection path a request belongs to, e.g. /api/v3/downloadclient/5 -> /api/v3/downloadclient"""
+    parts = endpoint.split('?', 1)[0].strip('/').split('/')
+    while len(parts) > 1 and parts[-1].isdigit():
+        parts.pop()
+    return '/' + '/'.join(parts)
+
+class ResponseCache:
+    """TTL + LRU cache of successful GET responses, keyed by (base_url, api_key, endpoint)"""
+
+    def __init__(self, ttl: float = GET_CACHE_TTL, max_entries: int = GET_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Tuple[int, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, status, data = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Callers are free to mutate what they get back (e.g. Bazarr settings)
+        return status, copy.deepcopy(data)
+
+    def put(self, key: Tuple[str, str, str], status: int, data: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), status, copy.deepcopy(data))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, base_url: str, prefix: str = "/"):
+        """Drop cached GETs for base_url under a resource prefix"""
+        prefix = prefix.rstrip('/')
+        with self._lock:
+            for key in list(self._entries):
+                path = key[2].split('?', 1)[0]
+                if key[0] == base_url and (path == prefix or path.startswith(prefix + '/')):
+                    del self._entries[key]
+
+_response_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide GET response cache"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+_ssl_context: Optional[ssl.SSLContext] = None
+
+def get_ssl_context() -> ssl.SSLContext:
+    """Shared SSL context that doesn't verify (for local services)"""
+    global _ssl_context
+    if _ssl_context is None:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        _ssl_context = context
+    return _ssl_context
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections keyed by (scheme, host, port), with idle eviction"""
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, idle_timeout: float = POOL_IDLE_TIMEOUT):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle: Dict[Tuple[str, str, int], List[Tuple[http.client.HTTPConnection, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        """Close idle connections past idle_timeout (caller holds the lock)"""
+        for key in list(self._idle):
+            fresh = []
+            for conn, last_used in self._idle[key]:
+                if now - last_used < self.idle_timeout:
+                    fresh.append((conn, last_used))
+                else:
+                    conn.close()
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+    def acquire(self, scheme: str, host: str, port: int, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return (connection, reused); new connections are not yet connected"""
+        key = (scheme, host, port)
+        with self._lock:
+            self._evict(time.monotonic())
+            idle = self._idle.get(key)
+            if idle:
+                conn, _ = idle.pop()
+                return conn, True
+
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=get_ssl_context())
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        return conn, False
+
+    def release(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection):
+        """Return a connection whose response has been fully read"""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if conn.sock is not None and len(idle) < self.max_idle:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, _ in idle:
+                    conn.close()
+            self._idle.clear()
+
+_pool: Optional[ConnectionPool] = None
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool"""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool()
+    return _pool
+
+class ContentDecoder:
+    """Incremental gzip/deflate decoder for a Content-Encoding header"""
+
+    def __init__(self, encoding: str = ""):
+        self.encoding = (encoding or "").strip().lower()
+        self._zlib = None
+
+    def feed(self, data: bytes) -> bytes:
+        if self.encoding not in ("gzip", "deflate"):
+            return data
+        if self._zlib is None:
+            if self.encoding == "gzip":
+                wbits = 16 + zlib.MAX_WBITS
+            elif len(data) >= 2 and (data[0] & 0x0f) == 8 and (data[0] * 256 + data[1]) % 31 == 0:
+                wbits = zlib.MAX_WBITS
+            else:
+                # Some servers send raw deflate without the zlib header
+                wbits = -zlib.MAX_WBITS
+            self._zlib = zlib.decompressobj(wbits)
+        return self._zlib.decompress(data)
+
+    def flush(self) -> bytes:
+        return self._zlib.flush() if self._zlib else b""
+
+class PooledResponse:
+    """A response on a pooled connection; the connection is released once the body is consumed"""
+
+    def __init__(self, response: http.client.HTTPResponse, conn: http.client.HTTPConnection,
+                 key: Tuple[str, str, int], started: float, connect_latency: Optional[float]):
+        self.response = response
+        self.status = response.status
+        self.conn = conn
+        self.key = key
+        self.started = started
+        self.connect_latency = connect_latency
+        self._complete = False
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        """Yield the decompressed body in chunks"""
+        decoder = ContentDecoder(self.response.getheader('Content-Encoding', ''))
+        try:
+            while True:
+                chunk = self.response.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = decoder.feed(chunk)
+                if data:
+                    yield data
+            tail = decoder.flush()
+            if tail:
+                yield tail
+            self._complete = True
+        finally:
+            self.release()
+
+    def iter_text(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        for chunk in self.iter_bytes():
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def read(self) -> bytes:
+        return b"".join(self.iter_bytes())
+
+    def release(self):
+        """Return the connection to the pool if the body was fully read, else close it"""
+        if self.conn is None:
+            return
+        if self._complete and not self.response.will_close:
+            get_pool().release(*self.key, self.conn)
+        else:
+            self.conn.close()
+        self.conn = None
+
+def decode_body(body: bytes) -> Any:
+    """Decode a response body as JSON, falling back to text"""
+    text = body.decode('utf-8', errors='replace')
+    try:
+        return json.loads(text) if text else {}
+    except json.JSONDecodeError:
+        return text
+
+def iter_stream_text(response: Any) -> Iterator[str]:
+    """A response's text chunks, with a broken transfer as OSError and a corrupt body as ValueError"""
+    try:
+        yield from response.iter_text()
+    except http.client.HTTPException as e:
+        raise OSError(f"Stream interrupted: {e!r}") from e
+    except zlib.error as e:
+        raise ValueError(f"Corrupt compressed body: {e}") from e
+
+def iter_json_array(chunks: Iterator[str]) -> Iterator[Any]:
+    """Incrementally decode a top-level JSON array, yielding one item at a time.
+
+    An item that spans several chunks is re-decoded only once its text has at
+    least doubled since the last attempt (or the stream ends), so large items
+    cost linear rather than quadratic time.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer, pos = "", 0
+    started = False
+    held: List[str] = []    # chunks not yet joined onto the buffer
+    held_size = 0
+    retry_at = 0            # partial-item size worth another decode attempt
+
+    while True:
+        chunk = next(chunks, None)
+        final = chunk is None
+        if not final:
+            held.append(chunk)
+            held_size += len(chunk)
+            if len(buffer) - pos + held_size < retry_at:
+                continue
+        if held:
+            buffer = buffer[pos:] + "".join(held)
+            pos, held, held_size = 0, [], 0
+
+        retry_at = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                for _ in chunks:
+                    pass  # drain trailing bytes so the connection can be reused
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                retry_at = 2 * (len(buffer) - pos)   # item continues in later chunks
+                break
+            if end == len(buffer) and not final and not isinstance(item, (dict, list, str)):
+                break  # a bare number/literal may still be growing
+            yield item
+            pos = end
+
+        if final:
+            raise ValueError("Truncated JSON array")
+
+# ============================================================================
+# Transports
+# ============================================================================
+
+_MISSING = object()
+
+class HTTPTransport:
+    """Default transport: real connections from the keep-alive pool"""
+
+    offline = False
+
+    def open(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes],
+             connect_timeout: float, read_timeout: float) -> Tuple[Optional[Any], str]:
+        """Send a request (following GET redirects) and return (unread response, error)"""
+        pool = get_pool()
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            scheme, host = parts.scheme or 'http', parts.hostname or ''
+            port = parts.port or (443 if scheme == 'https' else 80)
+            path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+            # A pooled connection may have been closed by the server while idle;
+            # in that case retry once on a fresh connection
+            for _ in range(2):
+                conn, reused = pool.acquire(scheme, host, port, connect_timeout)
+                try:
+                    started = time.monotonic()
+                    connect_latency = None
+                    phase = "read"
+                    if not reused:
+                        phase = "connect"
+                        # DNS + TCP (+ TLS) - the usual suspect when a service stalls
+                        with get_tracer().span(f"connect {host}:{port}", "connect"):
+                            conn.connect()
+                        connect_latency = time.monotonic() - started
+                        phase = "read"
+                    conn.sock.settimeout(read_timeout)
+
+                    request_started = time.monotonic()
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                    conn.close()
+                    if reused:
+                        continue
+                    return None, str(e)
+                except socket.timeout:
+                    conn.close()
+                    return None, TIMEOUT_ERRORS[phase]
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    return None, str(e)
+                break
+            else:
+                return None, "Connection closed by server"
+
+            pooled = PooledResponse(response, conn, (scheme, host, port), request_started, connect_latency)
+
+            location = response.getheader('Location')
+            if method == 'GET' and response.status in (301, 302, 303, 307, 308) and location:
+                try:
+                    pooled.read()
+                except (OSError, http.client.HTTPException, zlib.error):
+                    pass
+                url = urljoin(url, location)
+                continue
+
+            return pooled, ""
+
+        return None, "Too many redirects"
+
+    def call(self, key: str, fetch: Callable[[], Any], default: Any = _MISSING) -> Any:
+        """Run a non-HTTP lookup (Docker API call, port probe); recorders hook in here"""
+        return fetch()
+
+    def save(self):
+        pass
+
+class BufferedResponse:
+    """A fully-read response held in memory (recorded or replayed)"""
+
+    def __init__(self, status: int, body: bytes, started: Optional[float] = None,
+                 connect_latency: Optional[float] = None):
+        self.status = status
+        self.body = body
+        self.started = time.monotonic() if started is None else started
+        self.connect_latency = connect_latency
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        for offset in range(0, len(self.body), READ_CHUNK_SIZE):
+            yield self.body[offset:offset + READ_CHUNK_SIZE]
+
+    def iter_text(self) -> Iterator[str]:
+        if self.body:
+            yield self.body.decode('utf-8', errors='replace')
+
+    def read(self) -> bytes:
+        return self.body
+
+    def release(self):
+        pass
+
+def interaction_key(method: str, url: str, body: Optional[bytes]) -> str:
+    return f"{method} {url} {body.decode('utf-8', errors='replace') if body else ''}".rstrip()
+
+class RecordingTransport:
+    """Wraps a transport and captures every interaction into a cassette file"""
+
+    offline = False
+
+    def __init__(self, inner: Any, path: Path):
+        self.inner = inner
+        self.path = path
+        self._interactions: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _record(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._interactions.append(entry)
+
+    def open(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes],
+             connect_timeout: float, read_timeout: float) -> Tuple[Optional[Any], str]:
+        key = interaction_key(method, url, body)
+        response, error = self.inner.open(method, url, headers, body, connect_timeout, read_timeout)
+        if response is None:
+            self._record({"key": key, "error": error})
+            return None, error
+        try:
+            data = response.read()
+        except (OSError, http.client.HTTPException, zlib.error) as e:
+            self._record({"key": key, "error": str(e)})
+            return None, str(e)
+        self._record({"key": key, "status": response.status, "body": data.decode('utf-8', errors='replace')})
+        return BufferedResponse(response.status, data, response.started, response.connect_latency), ""
+
+    def call(self, key: str, fetch: Callable[[], Any], default: Any = _MISSING) -> Any:
+        result = self.inner.call(key, fetch, default)
+        self._record({"key": key, "result": result})
+        return result
+
+    def save(self):
+        with self._lock:
+            data = {"version": 1, "interactions": list(self._interactions)}
+        try:
+            with open(self.path, "w") as f:
+                json.dump(data, f, indent=1)
+            print_info(f"Recorded {len(data['interactions'])} interactions to {self.path}")
+        except OSError as e:
+            print_warning(f"Failed to write cassette {self.path}: {e}")
+
+class ReplayTransport:
+    """Serves recorded interactions from memory; nothing touches the network or Docker.
+
+    Repeated requests are answered in recorded order, and the last answer is
+    repeated once a key runs out.
+    """
+
+    offline = True
+
+    def __init__(self, path: Path):
+        with open(path) as f:
+            data = json.load(f)
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in data.get("interactions", []):
+            self._entries.setdefault(entry["key"], []).append(entry)
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _next(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                return None
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def open(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes],
+             connect_timeout: float, read_timeout: float) -> Tuple[Optional[Any], str]:
+        entry = self._next(interaction_key(method, url, body))
+        if entry is None:
+            return None, f"No recorded response for {method} {url}"
+        if "error" in entry:
+            return None, entry["error"]
+        return BufferedResponse(entry["status"], entry["body"].encode('utf-8')), ""
+
+    def call(self, key: str, fetch: Callable[[], Any], default: Any = _MISSING) -> Any:
+        entry = self._next(key)
+        if entry is None:
+            if default is _MISSING:
+                raise LookupError(f"No recorded result for {key}")
+            return default
+        return entry["result"]
+
+    def save(self):
+        pass
+
+_transport: Any = None
+
+def get_transport() -> Any:
+    """Return the active transport (HTTPTransport unless recording or replaying)"""
+    global _transport
+    if _transport is None:
+        _transport = HTTPTransport()
+    return _transport
+
+def set_transport(transport: Any):
+    global _transport
+    _transport = transport
+
+def persistence_enabled() -> bool:
+    """Replayed runs never write config or runtime state"""
+    return not get_transport().offline
+
 class APIClient:
     """Simple HTTP client for *arr APIs (no external dependencies)"""
 
@@ -196,46 +1325,125 @@ class APIClient:
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.timeout = timeout
-        # Create SSL context that doesn't verify (for local services)
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE
 
-    def _request(self, method: str, endpoint: str, data: dict = None) -> Tuple[int, Any]:
-        """Make HTTP request and return (status_code, response_data)"""
+    def _request(self, method: str, endpoint: str, data: dict = None, use_cache: bool = True,
+                 stream: bool = False) -> Tuple[int, Any]:
+        """Make HTTP request and return (status_code, response_data)
+
+        See _dispatch for caching, circuit breaking and retries.
+        """
+        with get_tracer().span(f"{method} {endpoint_key(endpoint)}", "http", url=self.base_url) as span:
+            status, response = self._dispatch(method, endpoint, data, use_cache, stream)
+            span["status"] = status
+            return status, response
+
+    def _dispatch(self, method: str, endpoint: str, data: dict = None, use_cache: bool = True,
+                  stream: bool = False) -> Tuple[int, Any]:
+        """Serve a request from the cache, or send it through the circuit breaker and retries
+
+        Successful GETs are served from the shared response cache until a write
+        to the same resource prefix invalidates them (use_cache=False bypasses it).
+        Streamed GETs (see stream) never touch the cache.
+
+        Connection failures trip the base URL's circuit breaker, after which calls
+        fail immediately with status 0. GETs are retried on 502/503/504 and writes
+        only on 503, with bounded exponential backoff.
+        """
+        cache = get_response_cache()
+        cache_key = (self.base_url, self.api_key, '/' + endpoint.lstrip('/'))
+        if method == 'GET' and use_cache and not stream:
+            cached = cache.get(cache_key)
+            if cached:
+                return cached
+        elif method != 'GET':
+            cache.invalidate(self.base_url, resource_prefix(cache_key[2]))
+
+        circuit = get_circuit(self.base_url)
+        if not circuit.allow():
+            return 0, f"Circuit open ({circuit.last_error})"
+
+        retry_statuses = RETRY_STATUSES if method in IDEMPOTENT_METHODS else RETRY_WRITE_STATUSES
+        delay = RETRY_BACKOFF
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            status, response = self._send(method, endpoint, data, stream)
+            if status == 0:
+                circuit.record_failure(str(response))
+                return status, response
+
+            circuit.record_success()
+            if status not in retry_statuses or attempt == RETRY_ATTEMPTS:
+                if method == 'GET' and status == 200 and not stream:
+                    cache.put(cache_key, status, response)
+                return status, response
+            time.sleep(min(delay, RETRY_BACKOFF_MAX))
+            delay *= 2
+
+        return status, response
+
+    def _send(self, method: str, endpoint: str, data: dict = None, stream: bool = False) -> Tuple[int, Any]:
+        """Perform a single HTTP request and decode the whole body (or, streaming, return an item iterator)"""
+        pooled, error = self._open(method, endpoint, data)
+        if pooled is None:
+            for phase, message in TIMEOUT_ERRORS.items():
+                if error == message:
+                    get_latency_stats().record_timeout(self.base_url, endpoint, phase, self.timeout)
+            return 0, error
+        if stream and pooled.status == 200:
+            return 200, self._iter_items(endpoint, pooled)
+        try:
+            body = pooled.read()
+        except socket.timeout:
+            get_latency_stats().record_timeout(self.base_url, endpoint, "read", self.timeout)
+            return 0, TIMEOUT_ERRORS["read"]
+        except (OSError, http.client.HTTPException, zlib.error) as e:
+            return 0, str(e)
+        elapsed = time.monotonic() - pooled.started
+        get_latency_stats().record(self.base_url, endpoint, pooled.connect_latency, elapsed)
+        get_latency_histograms().observe(self.base_url, endpoint, elapsed)
+        return pooled.status, decode_body(body)
+
+    def _open(self, method: str, endpoint: str, data: dict = None) -> Tuple[Optional[Any], str]:
+        """Send a request through the active transport and return the unread response"""
         url = urljoin(self.base_url + '/', endpoint.lstrip('/'))
 
         headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
         }
         if self.api_key:
             headers['X-Api-Key'] = self.api_key
 
         body = json.dumps(data).encode('utf-8') if data else None
 
-        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        connect_timeout, read_timeout = get_latency_stats().timeouts(self.base_url, endpoint, self.timeout)
+
+        return get_transport().open(method, url, headers, body, connect_timeout, read_timeout)
+
+    def stream(self, endpoint: str) -> Tuple[int, Any]:
+        """GET a JSON array and return (200, iterator over its items) without buffering the body.
 
+        Items are decoded from the socket as they arrive. The request goes through
+        the same tracing, circuit breaker and retries as get() (never the cache),
+        and its latency is recorded once the whole array has been read. On failure
+        the usual (status, response_data) pair is returned instead. The iterator
+        raises ValueError/OSError if the stream is cut short.
+        """
+        return self._request('GET', endpoint, stream=True)
+
+    def _iter_items(self, endpoint: str, pooled: Any) -> Iterator[Any]:
+        """Decode a streamed array; its latency counts once the whole body has arrived"""
         try:
-            with urllib.request.urlopen(req, timeout=self.timeout, context=self.ssl_context) as response:
-                response_data = response.read().decode('utf-8')
-                try:
-                    return response.status, json.loads(response_data) if response_data else {}
-                except json.JSONDecodeError:
-                    return response.status, response_data
-        except urllib.error.HTTPError as e:
-            try:
-                error_body = e.read().decode('utf-8')
-                return e.code, json.loads(error_body) if error_body else {}
-            except:
-                return e.code, str(e)
-        except urllib.error.URLError as e:
-            return 0, str(e.reason)
-        except Exception as e:
-            return 0, str(e)
+            yield from iter_json_array(iter_stream_text(pooled))
+        except socket.timeout:
+            get_latency_stats().record_timeout(self.base_url, endpoint, "read", self.timeout)
+            raise
+        elapsed = time.monotonic() - pooled.started
+        get_latency_stats().record(self.base_url, endpoint, pooled.connect_latency, elapsed)
+        get_latency_histograms().observe(self.base_url, endpoint, elapsed)
 
-    def get(self, endpoint: str) -> Tuple[int, Any]:
-        return self._request('GET', endpoint)
+    def get(self, endpoint: str, use_cache: bool = True) -> Tuple[int, Any]:
+        return self._request('GET', endpoint, use_cache=use_cache)
 
     def post(self, endpoint: str, data: dict) -> Tuple[int, Any]:
         return self._request('POST', endpoint, data)
@@ -246,12 +1454,286 @@ class APIClient:
     def delete(self, endpoint: str) -> Tuple[int, Any]:
         return self._request('DELETE', endpoint)
 
+_clients: Dict[Tuple[str, str], APIClient] = {}
+_clients_lock = threading.Lock()
+
+def get_client(base_url: str, api_key: str = "") -> APIClient:
+    """Return the shared APIClient for a service, so every step reuses its connections"""
+    key = (base_url.rstrip('/'), api_key)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = APIClient(base_url, api_key)
+        return _clients[key]
+
+# ============================================================================
+# Docker Engine API
+# ============================================================================
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that talks to a unix domain socket"""
+
+    def __init__(self, socket_path: str, timeout: float = DEFAULT_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+def docker_socket_path() -> str:
+    """Resolve the Docker socket path, honouring DOCKER_HOST=unix://..."""
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    return DOCKER_SOCKET
+
+def parse_label_string(labels: str) -> Dict[str, str]:
+    """Parse the 'k=v,k=v' label format printed by docker ps"""
+    result = {}
+    for item in labels.split(","):
+        key, sep, value = item.partition("=")
+        if sep:
+            result[key.strip()] = value
+    return result
+
+class DockerAPIError(OSError):
+    """The Docker API answered with an unexpected HTTP status"""
+
+# DockerClient._api result when the API can't answer and the CLI should be used instead
+DOCKER_UNAVAILABLE = object()
+
+class DockerClient:
+    """Docker Engine API client over the unix socket, falling back to the docker CLI.
+
+    Container listings and inspect results are cached for the lifetime of the
+    client so one discovery run costs one listing plus one inspect per container.
+    """
+
+    def __init__(self, socket_path: str = None, timeout: float = DEFAULT_TIMEOUT):
+        self.socket_path = socket_path or docker_socket_path()
+        self.timeout = timeout
+        self.api_available = get_transport().offline or os.path.exists(self.socket_path)
+        self.cli_available = not get_transport().offline
+        self._containers: Dict[str, List[Dict[str, Any]]] = {}
+        self._inspect_cache: Dict[str, Optional[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _api_get(self, path: str) -> Any:
+        """GET a Docker API path and return decoded JSON (raises on failure)"""
+        with get_tracer().span(f"docker GET {path.split('?', 1)[0]}", "docker"):
+            return get_transport().call(f"docker GET {path}", lambda: self._socket_get(path))
+
+    def _socket_get(self, path: str) -> Any:
+        conn = UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            conn.request("GET", path, headers={"Host": "docker"})
+            response = conn.getresponse()
+            body = response.read()
+            if response.status == 404:
+                return None  # e.g. a container removed between listing and inspect
+            if response.status != 200:
+                raise DockerAPIError(f"Docker API {path} returned HTTP {response.status}")
+            return json.loads(body.decode("utf-8"))
+        finally:
+            conn.close()
+
+    def _api(self, path: str) -> Any:
+        """Call the API if it is reachable.
+
+        Returns the decoded JSON, None for a 404, or DOCKER_UNAVAILABLE when the
+        caller should fall back to the CLI.
+        """
+        if not self.api_available:
+            return DOCKER_UNAVAILABLE
+        try:
+            return self._api_get(path)
+        except (DockerAPIError, ValueError, socket.timeout):
+            # Docker answered (or is just slow) - only this call falls back
+            return DOCKER_UNAVAILABLE
+        except (OSError, LookupError, http.client.HTTPException):
+            # Socket missing, refused or not speaking HTTP - stop trying for the rest of the run
+            self.api_available = False
+            return DOCKER_UNAVAILABLE
+
+    @staticmethod
+    def _normalize_summary(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a /containers/json entry like a `docker ps --format json` line"""
+        return {
+            "ID": item.get("Id", "")[:12],
+            "Names": ",".join(name.lstrip("/") for name in item.get("Names") or []),
+            "Image": item.get("Image", ""),
+            "State": item.get("State", ""),
+            "Status": item.get("Status", ""),
+            "Labels": item.get("Labels") or {},
+        }
+
+    def containers(self, filters: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+        """List running containers, optionally with server-side filters (cached)"""
+        cache_key = json.dumps(filters or {}, sort_keys=True)
+        with self._lock:
+            if cache_key in self._containers:
+                return self._containers[cache_key]
+
+        path = "/containers/json"
+        if filters:
+            path += "?filters=" + quote(json.dumps(filters))
+        data = self._api(path)
+        if data is not DOCKER_UNAVAILABLE:
+            containers = [self._normalize_summary(item) for item in data or []]
+        else:
+            containers = self._cli_containers(filters)
+
+        with self._lock:
+            self._containers[cache_key] = containers
+        return containers
+
+    def _cli_containers(self, filters: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+        if not self.cli_available:
+            return []
+        command = ["docker", "ps", "--format", "{{json .}}"]
+        for name, values in (filters or {}).items():
+            for value in values:
+                command += ["--filter", f"{name}={value}"]
+        try:
+            with get_tracer().span("docker ps", "docker"):
+                result = subprocess.run(command, capture_output=True, text=True, timeout=10)
+            if result.returncode != 0:
+                return []
+
+            containers = []
+            for line in result.stdout.strip().split('\n'):
+                if line:
+                    try:
+                        container = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    container["Labels"] = parse_label_string(container.get("Labels") or "")
+                    containers.append(container)
+            return containers
+        except FileNotFoundError as e:
+            self.cli_available = False
+            print_warning(f"Failed to get Docker containers: {e}")
+            return []
+        except Exception as e:
+            print_warning(f"Failed to get Docker containers: {e}")
+            return []
+
+    def inspect(self, container_id: str) -> Optional[Dict]:
+        """Inspect a container (cached per client)"""
+        with self._lock:
+            if container_id in self._inspect_cache:
+                return self._inspect_cache[container_id]
+
+        info = self._api(f"/containers/{quote(container_id)}/json")
+        if info is DOCKER_UNAVAILABLE:
+            info = self._cli_inspect(container_id)
+
+        with self._lock:
+            self._inspect_cache[container_id] = info
+        return info
+
+    def _cli_inspect(self, container_id: str) -> Optional[Dict]:
+        try:
+            with get_tracer().span("docker inspect", "docker"):
+                result = subprocess.run(
+                    ["docker", "inspect", container_id],
+                    capture_output=True, text=True, timeout=10
+                )
+            if result.returncode == 0:
+                data = json.loads(result.stdout)
+                return data[0] if data else None
+        except:
+            pass
+        return None
+
+    def network(self, name: str) -> Optional[Dict]:
+        """Inspect a Docker network"""
+        info = self._api(f"/networks/{quote(name)}")
+        if info is not DOCKER_UNAVAILABLE:
+            return info
+        try:
+            with get_tracer().span("docker network inspect", "docker"):
+                result = subprocess.run(
+                    ["docker", "network", "inspect", name],
+                    capture_output=True, text=True, timeout=5
+                )
+            if result.returncode == 0:
+                data = json.loads(result.stdout)
+                return data[0] if data else None
+        except:
+            pass
+        return None
+
+    def events(self, filters: Dict[str, List[str]]) -> Iterator[Dict[str, Any]]:
+        """Stream Docker events as dicts until the stream ends (raises OSError on failure)"""
+        if self.api_available:
+            conn = UnixHTTPConnection(self.socket_path, timeout=None)
+            try:
+                conn.request("GET", "/events?filters=" + quote(json.dumps(filters)), headers={"Host": "docker"})
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise OSError(f"Docker API /events returned HTTP {response.status}")
+                for line in iter(response.readline, b""):
+                    if line.strip():
+                        yield json.loads(line)
+            except (ValueError, http.client.HTTPException) as e:
+                raise OSError(f"Docker event stream failed: {e}")
+            finally:
+                conn.close()
+            return
+
+        command = ["docker", "events", "--format", "{{json .}}"]
+        for name, values in filters.items():
+            for value in values:
+                command += ["--filter", f"{name}={value}"]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        try:
+            for line in process.stdout:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        finally:
+            process.kill()
+            process.wait()
+
+    def forget_listings(self):
+        """Drop cached container listings but keep inspect results"""
+        with self._lock:
+            self._containers.clear()
+
+    def invalidate(self, container_id: str = None):
+        """Drop cached listings, and one container's (or every) inspect result"""
+        with self._lock:
+            self._containers.clear()
+            if container_id is None:
+                self._inspect_cache.clear()
+            else:
+                self._inspect_cache.pop(container_id, None)
+
+_docker_client: Optional[DockerClient] = None
+
+def get_docker_client() -> DockerClient:
+    """Return the process-wide Docker client"""
+    global _docker_client
+    if _docker_client is None:
+        _docker_client = DockerClient()
+    return _docker_client
+
 # ============================================================================
 # Service Discovery
 # ============================================================================
 
-def check_port(host: str, port: int, timeout: float = 2.0) -> bool:
+def check_port(host: str, port: int, timeout: float = PROBE_TIMEOUT) -> bool:
     """Check if a port is open on a host"""
+    with get_tracer().span(f"probe {host}:{port}", "probe") as span:
+        span["open"] = get_transport().call(f"probe {host}:{port}", lambda: _connect_probe(host, port, timeout), default=False)
+        return span["open"]
+
+def _connect_probe(host: str, port: int, timeout: float) -> bool:
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
@@ -261,42 +1743,112 @@ def check_port(host: str, port: int, timeout: float = 2.0) -> bool:
     except:
         return False
 
-def get_docker_containers() -> List[Dict[str, Any]]:
-    """Get list of running Docker containers with their details"""
-    try:
-        result = subprocess.run(
-            ["docker", "ps", "--format", "{{json .}}"],
-            capture_output=True, text=True, timeout=10
-        )
-        if result.returncode != 0:
-            return []
+def race_endpoints(candidates: List[Tuple[str, int]], timeout: float = PROBE_TIMEOUT) -> Optional[Tuple[str, int]]:
+    """Probe candidate endpoints in parallel and return the first that accepts a connection"""
+    candidates = list(dict.fromkeys(candidates))
+    if not candidates:
+        return None
 
-        containers = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                try:
-                    containers.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-        return containers
-    except Exception as e:
-        print_warning(f"Failed to get Docker containers: {e}")
-        return []
+    results = queue.Queue()
 
-def inspect_container(container_id: str) -> Optional[Dict]:
-    """Get detailed container information via docker inspect"""
-    try:
-        result = subprocess.run(
-            ["docker", "inspect", container_id],
-            capture_output=True, text=True, timeout=10
-        )
-        if result.returncode == 0:
-            data = json.loads(result.stdout)
-            return data[0] if data else None
-    except:
-        pass
+    def probe(host: str, port: int):
+        results.put((host, port) if check_port(host, port, timeout) else None)
+
+    for host, port in candidates:
+        threading.Thread(target=probe, args=(host, port), daemon=True).start()
+
+    # Losing probes finish on their own; we only wait until one connects or all fail
+    for _ in candidates:
+        winner = results.get()
+        if winner:
+            return winner
     return None
 
+def get_docker_containers(filters: Dict[str, List[str]] = None) -> List[Dict[str, Any]]:
+    """Get list of running Docker containers with their details"""
+    return get_docker_client().containers(filters)
+
+def inspect_container(container_id: str) -> Optional[Dict]:
+    """Get detailed container information (cached per run)"""
+    return get_docker_client().inspect(container_id)
+
+def container_fingerprint(container_id: str) -> Optional[str]:
+    """Hash the container ID, image, start time and port bindings"""
+    info = inspect_container(container_id)
+    if not info:
+        return None
+    identity = {
+        "id": info.get("Id", container_id),
+        "image": info.get("Image", ""),
+        "started_at": (info.get("State") or {}).get("StartedAt", ""),
+        "ports": (info.get("NetworkSettings") or {}).get("Ports") or {},
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+class DiscoveryCache:
+    """Persisted container endpoint cache, keyed by container ID and fingerprint"""
+
+    def __init__(self, path: Path = None):
+        self.path = path or DISCOVERY_CACHE_FILE
+        self.refresh = False
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._seen: set = set()
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f).get("containers", {})
+        except (OSError, ValueError, AttributeError):
+            self._entries = {}
+
+    def get(self, container_id: str, service: str, fingerprint: str) -> Optional[str]:
+        """Return the cached URL if the container is unchanged (ignored with --refresh)"""
+        with self._lock:
+            self._seen.add(container_id)
+            entry = self._entries.get(container_id)
+        if self.refresh or not entry or not fingerprint:
+            return None
+        if entry.get("fingerprint") == fingerprint and entry.get("service") == service:
+            return entry.get("url")
+        return None
+
+    def put(self, container_id: str, service: str, fingerprint: str, url: str):
+        if not fingerprint:
+            return
+        entry = {"fingerprint": fingerprint, "service": service, "url": url}
+        with self._lock:
+            self._seen.add(container_id)
+            if self._entries.get(container_id) != entry:
+                self._entries[container_id] = entry
+                self._dirty = True
+
+    def save(self):
+        """Write the cache, dropping containers that no longer exist"""
+        if not persistence_enabled():
+            return
+        with self._lock:
+            if self._seen:
+                for container_id in set(self._entries) - self._seen:
+                    del self._entries[container_id]
+                    self._dirty = True
+            if not self._dirty:
+                return
+            data = {"version": 1, "containers": self._entries}
+            self._dirty = False
+        try:
+            write_if_changed(self.path, json.dumps(data, indent=2).encode("utf-8"))
+        except OSError as e:
+            print_warning(f"Failed to save discovery cache: {e}")
+
+_discovery_cache: Optional[DiscoveryCache] = None
+
+def get_discovery_cache() -> DiscoveryCache:
+    """Return the process-wide discovery cache"""
+    global _discovery_cache
+    if _discovery_cache is None:
+        _discovery_cache = DiscoveryCache()
+    return _discovery_cache
+
 def get_container_ip(container_id: str) -> Optional[str]:
     """Get container IP address"""
     info = inspect_container(container_id)
@@ -318,8 +1870,8 @@ def get_container_port_mapping(container_id: str, internal_port: int) -> Optiona
             return int(ports[port_key][0].get("HostPort", internal_port))
     return None
 
-def extract_api_key_from_config(appdata_path: str, service: str) -> Optional[str]:
-    """Extract API key from service config file in appdata"""
+def extract_api_key_from_config(appdata_path: str, service: str, service_dir: str = None) -> Optional[str]:
+    """Extract API key from service config file in appdata (or a known config dir)"""
 
     # Common config file locations
     config_paths = {
@@ -335,6 +1887,10 @@ def extract_api_key_from_config(appdata_path: str, service: str) -> Optional[str
     for config_file in paths_to_try:
         full_path = Path(appdata_path) / service / config_file
 
+        # Prefer the container's own config dir (e.g. from its dockerMan template)
+        if service_dir and (Path(service_dir) / config_file).exists():
+            full_path = Path(service_dir) / config_file
+
         # Also try with capitalized service name
         if not full_path.exists():
             full_path = Path(appdata_path) / service.capitalize() / config_file
@@ -365,121 +1921,518 @@ def extract_api_key_from_config(appdata_path: str, service: str) -> Optional[str
 
     return None
 
-def discover_from_docker() -> Dict[str, Dict[str, Any]]:
-    """Discover services from running Docker containers (Unraid-optimized)"""
+def resolve_container_endpoint(container_id: str, service: str) -> Optional[str]:
+    """Race the host-mapped port, container IP and localhost for a container's service URL"""
+    port = DEFAULT_PORTS.get(service, 80)
+    ip = get_container_ip(container_id)
+    host_port = get_container_port_mapping(container_id, port)
+
+    # Every candidate reaches the same service, so they are probed at once and the
+    # first to connect wins - list order is only the order probes are started in
+    candidates = []
+    if host_port:
+        candidates.append(("localhost", host_port))
+    if ip:
+        candidates.append((ip, port))
+    candidates.append(("localhost", port))
+
+    winner = race_endpoints(candidates)
+    if winner:
+        return f"http://{winner[0]}:{winner[1]}"
+    return None
 
-    discovered = {}
-    containers = get_docker_containers()
+def match_service_name(container_name: str) -> Optional[str]:
+    """Match a container name against CONTAINER_PATTERNS"""
+    container_name = container_name.lower()
+    for service, patterns in CONTAINER_PATTERNS.items():
+        if any(pattern in container_name for pattern in patterns):
+            return service
+    return None
 
-    if not containers:
-        print_warning("No Docker containers found or Docker not accessible")
-        return discovered
+def parse_dockerman_template(path: Path) -> Optional[Dict[str, Any]]:
+    """Stream-parse one dockerMan template into name, network, IP, ports and paths"""
+    template = {"name": "", "network": "", "ip": "", "ports": {}, "paths": {}}
+    try:
+        for _, elem in ET.iterparse(str(path), events=("end",)):
+            tag, text = elem.tag, (elem.text or "").strip()
+            if tag == "Name" and not template["name"]:
+                template["name"] = text
+            elif tag in ("Network", "Mode") and not template["network"]:
+                template["network"] = text
+            elif tag == "MyIP":
+                template["ip"] = text.split()[0] if text else ""
+            elif tag == "Config":
+                # Version 2 templates: <Config Type="Port" Target="8989">8989</Config>
+                target = elem.get("Target", "")
+                value = text or elem.get("Default", "")
+                if elem.get("Type") == "Port" and target.isdigit() and value.isdigit():
+                    template["ports"][int(target)] = int(value)
+                elif elem.get("Type") == "Path" and target and value:
+                    template["paths"][target] = value
+            elif tag == "Port":
+                # Version 1 templates: <Port><HostPort/><ContainerPort/></Port>
+                host_port, container_port = elem.findtext("HostPort", ""), elem.findtext("ContainerPort", "")
+                if host_port.strip().isdigit() and container_port.strip().isdigit():
+                    template["ports"][int(container_port)] = int(host_port)
+            elif tag == "Volume":
+                host_dir, container_dir = elem.findtext("HostDir", ""), elem.findtext("ContainerDir", "")
+                if host_dir and container_dir:
+                    template["paths"][container_dir.strip()] = host_dir.strip()
+            else:
+                continue
+            elem.clear()
+    except (ET.ParseError, OSError):
+        return None
+    return template if template["name"] else None
 
-    print_info(f"Found {len(containers)} running containers, scanning...")
+def discover_from_templates(template_dir: Path = None) -> Dict[str, Dict[str, Any]]:
+    """Build the service map from Unraid dockerMan templates (no Docker, no probing)"""
 
-    for container in containers:
-        container_name = container.get("Names", "").lower()
-        container_id = container.get("ID", "")
+    discovered = {}
+    template_dir = template_dir or DOCKERMAN_TEMPLATES
+    if not template_dir.is_dir():
+        return discovered
 
-        for service, patterns in CONTAINER_PATTERNS.items():
-            if any(pattern in container_name for pattern in patterns):
-                # Get container IP
-                ip = get_container_ip(container_id)
-                port = DEFAULT_PORTS.get(service, 80)
-
-                # Try localhost with mapped port first (more reliable for Unraid)
-                host_port = get_container_port_mapping(container_id, port)
-                if host_port and check_port("localhost", host_port):
-                    url = f"http://localhost:{host_port}"
-                elif ip and check_port(ip, port):
-                    url = f"http://{ip}:{port}"
-                elif check_port("localhost", port):
-                    url = f"http://localhost:{port}"
-                else:
-                    continue
+    for path in sorted(template_dir.glob("*.xml")):
+        template = parse_dockerman_template(path)
+        if not template:
+            continue
+        service = match_service_name(template["name"])
+        if not service or service in discovered:
+            continue
 
-                discovered[service] = {
-                    "url": url,
-                    "container_id": container_id,
-                    "container_name": container_name,
-                }
-                print_success(f"Found {service} at {url} (container: {container_name})")
-                break
+        port = DEFAULT_PORTS.get(service, 80)
+        network = template["network"].lower()
+        if template["ip"] and network not in ("", "bridge", "host"):
+            # Custom br0/macvlan network: the container answers on its own IP
+            url = f"http://{template['ip']}:{port}"
+        elif network == "host":
+            url = f"http://localhost:{port}"
+        else:
+            url = f"http://localhost:{template['ports'].get(port, port)}"
 
-    return discovered
+        discovered[service] = {
+            "url": url,
+            "container_name": template["name"].lower(),
+            "appdata": template["paths"].get("/config", ""),
+            "source": "template",
+        }
 
-def discover_services(hosts: List[str] = None) -> Dict[str, str]:
-    """Discover available services by scanning Docker containers and common ports"""
+    return discovered
 
-    # First try Docker container discovery (preferred for Unraid)
-    docker_discovered = discover_from_docker()
-    discovered = {k: v["url"] for k, v in docker_discovered.items()}
+def confirm_endpoints(discovered: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Keep only the discovered services whose URL accepts a connection"""
+    endpoints = {}
+    for service, info in discovered.items():
+        parts = urlsplit(info["url"])
+        if parts.hostname:
+            endpoints[service] = (parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+
+    host_ips = resolve_hosts(list({host for host, _ in endpoints.values()}))
+    targets = [(host_ips[host], port) for host, port in endpoints.values() if host in host_ips]
+    open_endpoints = set(scan_endpoints(targets, deadline=PROBE_TIMEOUT))
+
+    return {
+        service: discovered[service]
+        for service, (host, port) in endpoints.items()
+        if (host_ips.get(host), port) in open_endpoints
+    }
 
-    # Fall back to port scanning for any missing services
-    if hosts is None:
-        hosts = ["localhost", "127.0.0.1"]
-        # Try to get Docker network IPs
-        try:
-            result = subprocess.run(
-                ["docker", "network", "inspect", "bridge", "-f", "{{range .IPAM.Config}}{{.Gateway}}{{end}}"],
-                capture_output=True, text=True, timeout=5
-            )
-            if result.returncode == 0 and result.stdout.strip():
-                gateway = result.stdout.strip()
-                # Scan common docker IP range
-                base = '.'.join(gateway.split('.')[:3])
-                hosts.extend([f"{base}.{i}" for i in range(2, 20)])
-        except:
-            pass
+def discover_containers(offline: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Discover services from dockerMan templates, then Docker for anything unconfirmed"""
 
-    print_info("Scanning ports for additional services...")
+    templated = discover_from_templates()
+    if templated:
+        print_info(f"Read {len(templated)} services from dockerMan templates")
 
-    for service, port in DEFAULT_PORTS.items():
-        if service in discovered:
-            continue
+    if offline:
+        for service, info in templated.items():
+            print_success(f"Found {service} at {info['url']} (template: {info['container_name']})")
+        return templated
 
-        for host in hosts:
-            if check_port(host, port):
-                url = f"http://{host}:{port}"
-                discovered[service] = url
-                print_success(f"Found {service} at {url}")
-                break
+    # Templates give the full picture instantly; live probing only confirms it
+    discovered = confirm_endpoints(templated) if templated else {}
+    for service, info in discovered.items():
+        print_success(f"Found {service} at {info['url']} (template: {info['container_name']})")
 
-    # Also try Docker hostnames
-    for service, port in DEFAULT_PORTS.items():
-        if service not in discovered:
-            if check_port(service, port):
-                url = f"http://{service}:{port}"
-                discovered[service] = url
-                print_success(f"Found {service} at {url}")
+    for service, info in discover_from_docker(exclude=set(discovered)).items():
+        if service in templated and not info.get("appdata"):
+            info["appdata"] = templated[service].get("appdata", "")
+        discovered[service] = info
 
     return discovered
 
-def auto_discover_with_keys(appdata_path: str = None) -> Dict[str, Dict[str, str]]:
-    """Discover services AND extract their API keys from config files"""
+def normalize_service_name(name: str) -> Optional[str]:
+    """Map a label value such as 'Rdt_Client' onto a known service key"""
+    name = name.strip().lower().replace("_", "-")
+    return name if name in DEFAULT_PORTS else None
+
+def resolve_labeled_endpoint(container: Dict[str, Any], service: str) -> Optional[str]:
+    """Resolve a labeled container's URL from its labels, probing only when they don't say"""
+    labels = container.get("Labels") or {}
+    if labels.get(LABEL_URL):
+        return labels[LABEL_URL].rstrip("/")
+    if labels.get(LABEL_PORT, "").isdigit():
+        return f"http://localhost:{labels[LABEL_PORT]}"
+    return resolve_container_endpoint(container.get("ID", ""), service)
+
+def discover_from_docker(exclude: set = None) -> Dict[str, Dict[str, Any]]:
+    """Discover services from running Docker containers (Unraid-optimized)"""
 
-    if appdata_path is None:
-        appdata_path = UNRAID_PATHS.get("appdata", "/mnt/user/appdata")
+    discovered = {}
+    exclude = exclude or set()
+    if exclude >= set(CONTAINER_PATTERNS):
+        return discovered
 
-    discovered = discover_from_docker()
+    # Fast path: containers that declare their service via com.chimera.* labels
+    matches = []
+    for container in get_docker_containers({"label": [LABEL_SERVICE]}):
+        service = normalize_service_name(container.get("Labels", {}).get(LABEL_SERVICE, ""))
+        if service and service not in exclude:
+            matches.append((service, container))
 
-    print_info(f"Extracting API keys from {appdata_path}...")
+    labeled = {service for service, _ in matches}
+    labeled_ids = {container.get("ID") for _, container in matches}
 
-    for service, info in discovered.items():
-        api_key = extract_api_key_from_config(appdata_path, service)
-        if api_key:
-            info["api_key"] = api_key
-            print_success(f"Extracted API key for {service}")
-        else:
-            print_warning(f"Could not extract API key for {service}")
+    # Fallback: name matching for unlabeled containers, only if services are still missing
+    if labeled | exclude != set(CONTAINER_PATTERNS):
+        containers = get_docker_containers()
 
-    return discovered
+        if not containers and not matches:
+            print_warning("No Docker containers found or Docker not accessible")
+            return discovered
 
-def verify_service(name: str, url: str, api_key: str = "") -> Tuple[bool, str]:
-    """Verify a service is accessible and get its version"""
-    client = APIClient(url, api_key)
+        print_info(f"Found {len(containers)} running containers, scanning...")
 
-    # Different endpoints for different services
+        for container in containers:
+            if container.get("ID") in labeled_ids or LABEL_SERVICE in (container.get("Labels") or {}):
+                continue
+            container_name = container.get("Names", "").lower()
+
+            for service, patterns in CONTAINER_PATTERNS.items():
+                if service in labeled or service in exclude:
+                    continue
+                if any(pattern in container_name for pattern in patterns):
+                    matches.append((service, container))
+                    break
+    else:
+        print_info(f"Found {len(matches)} labeled containers")
+
+    return resolve_matches(matches)
+
+def discover_container_ids(container_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Discover services from just these containers (e.g. the ones a Docker event named)"""
+    ids = {container_id[:12] for container_id in container_ids}
+    matches = []
+    for container in get_docker_containers({"id": sorted(ids)}):
+        if container.get("ID", "")[:12] not in ids:
+            continue
+        labels = container.get("Labels") or {}
+        service = (normalize_service_name(labels.get(LABEL_SERVICE, "")) or
+                   match_service_name(container.get("Names", "").lower()))
+        if service:
+            matches.append((service, container))
+    return resolve_matches(matches)
+
+def resolve_matches(matches: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Resolve (service, container) matches to URLs, reusing cached endpoints of unchanged containers"""
+    discovered = {}
+    if not matches:
+        return discovered
+
+    cache = get_discovery_cache()
+
+    def resolve(match: Tuple[str, Dict[str, Any]]) -> Optional[str]:
+        service, container = match
+        with get_tracer().span(f"resolve {service}", "discovery") as span:
+            span["url"] = url = resolve_match(service, container)
+        return url
+
+    def resolve_match(service: str, container: Dict[str, Any]) -> Optional[str]:
+        container_id = container.get("ID", "")
+
+        # Unchanged containers reuse their last endpoint without probing
+        fingerprint = container_fingerprint(container_id)
+        url = cache.get(container_id, service, fingerprint)
+        if url:
+            return url
+
+        if LABEL_SERVICE in (container.get("Labels") or {}):
+            url = resolve_labeled_endpoint(container, service)
+        else:
+            url = resolve_container_endpoint(container_id, service)
+        if url:
+            cache.put(container_id, service, fingerprint, url)
+        return url
+
+    # Resolve every matching container concurrently; wall time is bounded by
+    # the slowest single probe rather than the sum of all of them
+    with ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(matches))) as executor:
+        urls = list(executor.map(resolve, matches))
+    cache.save()
+
+    for (service, container), url in zip(matches, urls):
+        if not url:
+            continue
+
+        container_name = container.get("Names", "").lower()
+        discovered[service] = {
+            "url": url,
+            "container_id": container.get("ID", ""),
+            "container_name": container_name,
+        }
+        print_success(f"Found {service} at {url} (container: {container_name})")
+
+    return discovered
+
+def scan_endpoints(
+    targets: List[Tuple[str, int]],
+    rate: float = SCAN_RATE,
+    concurrency: int = SCAN_CONCURRENCY,
+    connect_timeout: float = SCAN_CONNECT_TIMEOUT,
+    deadline: float = SCAN_DEADLINE
+) -> List[Tuple[str, int]]:
+    """Scan (ip, port) pairs with non-blocking connects and return the open ones"""
+    key = "scan " + hashlib.sha256(json.dumps(sorted(targets)).encode("utf-8")).hexdigest()
+    with get_tracer().span("port scan", "probe", targets=len(targets)) as span:
+        found = get_transport().call(
+            key, lambda: _scan(targets, rate, concurrency, connect_timeout, deadline), default=[]
+        )
+        span["open"] = len(found)
+    return [tuple(target) for target in found]
+
+def scan_concurrency(concurrency: int) -> int:
+    """Cap connects in flight so the scan can't use up the process's file descriptors"""
+    if resource is None:
+        return concurrency
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (OSError, ValueError):
+        return concurrency
+    if soft == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, soft - SCAN_FD_HEADROOM))
+
+def _scan(targets: List[Tuple[str, int]], rate: float, concurrency: int,
+          connect_timeout: float, deadline: float) -> List[Tuple[str, int]]:
+    found = []
+    pending = iter(targets)
+    deferred = None
+    exhausted = False
+    concurrency = scan_concurrency(concurrency)
+    launched = 0
+    start = time.monotonic()
+    stop_at = start + deadline
+    sel = selectors.DefaultSelector()
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+
+            # Launch new connects, bounded by the rate limit and in-flight cap
+            budget = int((now - start) * rate) + 1 - launched
+            while not exhausted and budget > 0 and len(sel.get_map()) < concurrency:
+                if deferred is not None:
+                    target, deferred = deferred, None
+                else:
+                    try:
+                        target = next(pending)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                try:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                except OSError as e:
+                    if e.errno in SCAN_RETRY_ERRNOS:
+                        # Out of descriptors/buffers - retry once in-flight connects free some
+                        deferred = target
+                        break
+                    sock = None
+                launched += 1
+                budget -= 1
+                if sock is None:
+                    continue
+                try:
+                    sock.setblocking(False)
+                    err = sock.connect_ex(target)
+                except OSError:
+                    # e.g. EADDRNOTAVAIL when local ports run out - count the target as closed
+                    sock.close()
+                    continue
+                if err == 0:
+                    found.append(target)
+                    sock.close()
+                elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                    sel.register(sock, selectors.EVENT_WRITE, (target, now))
+                else:
+                    sock.close()
+
+            if exhausted and not sel.get_map():
+                break
+
+            for key, _ in sel.select(timeout=max(0.0, min(0.05, stop_at - now))):
+                sel.unregister(key.fileobj)
+                if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    found.append(key.data[0])
+                key.fileobj.close()
+
+            # Drop connects that exceeded their own timeout
+            now = time.monotonic()
+            for key in list(sel.get_map().values()):
+                if now - key.data[1] >= connect_timeout:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+
+    return found
+
+def get_bridge_network() -> Optional[str]:
+    """Get the Docker bridge network CIDR, narrowed to the gateway's /24"""
+    info = get_docker_client().network("bridge")
+    if not info:
+        return None
+    try:
+        for ipam in (info.get("IPAM") or {}).get("Config") or []:
+            subnet, gateway = ipam.get("Subnet"), ipam.get("Gateway")
+            if not subnet:
+                continue
+            network = ipaddress.ip_network(subnet, strict=False)
+            if network.version != 4:
+                continue
+            if network.prefixlen < SCAN_MAX_PREFIX and gateway:
+                network = ipaddress.ip_network(f"{gateway}/{SCAN_MAX_PREFIX}", strict=False)
+            return str(network)
+    except ValueError:
+        pass
+    return None
+
+def resolve_hosts(names: List[str]) -> Dict[str, str]:
+    """Resolve hostnames to IPv4 addresses in parallel, skipping failures"""
+    def resolve(name: str) -> Optional[str]:
+        with get_tracer().span(f"dns {name}", "dns"):
+            try:
+                return socket.gethostbyname(name)
+            except (socket.error, UnicodeError):
+                return None
+
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(DISCOVERY_WORKERS, len(names))) as executor:
+        addresses = list(executor.map(resolve, names))
+    return {name: ip for name, ip in zip(names, addresses) if ip}
+
+def discover_services(
+    hosts: List[str] = None,
+    cidrs: List[str] = None,
+    rate: float = SCAN_RATE,
+    deadline: float = SCAN_DEADLINE,
+    offline: bool = False
+) -> Dict[str, str]:
+    """Discover available services by scanning Docker containers and common ports"""
+
+    # First try templates and Docker container discovery (preferred for Unraid)
+    container_discovered = discover_containers(offline)
+    discovered = {k: v["url"] for k, v in container_discovered.items()}
+    if offline:
+        return discovered
+
+    missing = {service: port for service, port in DEFAULT_PORTS.items() if service not in discovered}
+    if not missing:
+        return discovered
+
+    # Fall back to port scanning for any missing services
+    if hosts is None:
+        hosts = ["localhost", "127.0.0.1"]
+    hosts = list(hosts)
+
+    if cidrs is None:
+        bridge = get_bridge_network()
+        cidrs = [bridge] if bridge else []
+
+    for cidr in cidrs:
+        try:
+            hosts.extend(str(ip) for ip in ipaddress.ip_network(cidr, strict=False).hosts())
+        except ValueError as e:
+            print_warning(f"Ignoring invalid network {cidr}: {e}")
+
+    # Docker hostnames (service name == container name) are only probed on their own port
+    host_ips = resolve_hosts(list(dict.fromkeys(hosts + list(missing))))
+
+    targets = []
+    for service, port in missing.items():
+        for host in hosts:
+            if host in host_ips:
+                targets.append((host_ips[host], port))
+        if service in host_ips:
+            targets.append((host_ips[service], port))
+
+    print_info(f"Scanning {len(set(targets))} endpoints for additional services...")
+    open_endpoints = set(scan_endpoints(list(dict.fromkeys(targets)), rate=rate, deadline=deadline))
+
+    # Keep the original preference order: listed hosts first, then Docker hostnames
+    for service, port in missing.items():
+        for host in hosts + [service]:
+            ip = host_ips.get(host)
+            if ip and (ip, port) in open_endpoints:
+                url = f"http://{host}:{port}"
+                discovered[service] = url
+                print_success(f"Found {service} at {url}")
+                break
+
+    return discovered
+
+def auto_discover_with_keys(appdata_path: str = None, offline: bool = False) -> Dict[str, Dict[str, str]]:
+    """Discover services AND extract their API keys from config files"""
+
+    if appdata_path is None:
+        appdata_path = UNRAID_PATHS.get("appdata", "/mnt/user/appdata")
+
+    discovered = discover_containers(offline)
+
+    print_info(f"Extracting API keys from {appdata_path}...")
+
+    for service, info in discovered.items():
+        api_key = extract_api_key_from_config(appdata_path, service, info.get("appdata"))
+        if api_key:
+            info["api_key"] = api_key
+            print_success(f"Extracted API key for {service}")
+        else:
+            print_warning(f"Could not extract API key for {service}")
+
+    return discovered
+
+INVALID_API_KEY = "Invalid API key"
+
+def verify_service(name: str, url: str, api_key: str = "") -> Tuple[bool, str]:
+    """Verify a service is accessible and get its version (every check goes into the latency history)"""
+    with get_tracer().span(f"verify {name}", "verify", url=url):
+        started = time.monotonic()
+        status, response = check_service(name, url, api_key)
+        latency = time.monotonic() - started
+
+    if status == 200:
+        version = ""
+        if isinstance(response, dict):
+            version = response.get('version', response.get('Version', ''))
+        get_latency_history().record(name, latency, status, str(version))
+        return True, version
+
+    get_latency_history().record(name, latency, status)
+    if status == 401:
+        return False, INVALID_API_KEY
+    elif status == 0:
+        return False, f"Connection failed: {response}"
+    else:
+        return False, f"HTTP {status}"
+
+def check_service(name: str, url: str, api_key: str = "") -> Tuple[int, Any]:
+    """Request a service's status endpoint and return (status_code, response_data)"""
+    # Different endpoints for different services
     endpoints = {
         "sonarr": "/api/v3/system/status",
         "radarr": "/api/v3/system/status",
@@ -496,50 +2449,180 @@ def verify_service(name: str, url: str, api_key: str = "") -> Tuple[bool, str]:
     # For Plex, use X-Plex-Token instead
     if name == "plex" and api_key:
         endpoint = f"/identity?X-Plex-Token={api_key}"
-        client.api_key = ""
-
-    status, response = client.get(endpoint)
+        api_key = ""
 
-    if status == 200:
-        version = ""
-        if isinstance(response, dict):
-            version = response.get('version', response.get('Version', ''))
-        return True, version
-    elif status == 401:
-        return False, "Invalid API key"
-    elif status == 0:
-        return False, f"Connection failed: {response}"
-    else:
-        return False, f"HTTP {status}"
+    client = get_client(url, api_key)
+
+    # Liveness checks always go to the wire, never to the response cache
+    return client.get(endpoint, use_cache=False)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide worker pool used for API fan-out"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="verify")
+        return _executor
+
+def host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """Return the concurrency limiter for a URL's host:port"""
+    netloc = urlsplit(url).netloc.lower()
+    with _executor_lock:
+        if netloc not in _host_semaphores:
+            _host_semaphores[netloc] = threading.BoundedSemaphore(VERIFY_PER_HOST)
+        return _host_semaphores[netloc]
+
+def verify_services(checks: List[Tuple[str, str, str]]) -> List[Tuple[bool, str]]:
+    """Verify (name, url, api_key) checks concurrently; results keep the input order"""
+    def run(check: Tuple[str, str, str]) -> Tuple[bool, str]:
+        name, url, api_key = check
+        with host_semaphore(url):
+            return verify_service(name, url, api_key)
+
+    return list(get_executor().map(run, checks))
+
+def wait_for_service(name: str, url: str, api_key: str, deadline: float) -> Tuple[bool, str, float]:
+    """Poll a service until its status endpoint answers or the deadline (time.monotonic()) passes.
+
+    Each attempt is a cheap TCP probe, then - once the port is open - the status
+    check. Retries back off exponentially with jitter. A rejected API key ends the
+    wait early, since waiting won't fix it. Returns (ready, version or last error, seconds waited).
+    """
+    started = time.monotonic()
+    parts = urlsplit(url)
+    host = parts.hostname or "localhost"
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    delay = READY_BACKOFF
+    reason = "not checked"
+
+    with get_tracer().span(f"wait {name}", "ready", url=url) as span:
+        while True:
+            span["attempts"] = span.get("attempts", 0) + 1
+            if not check_port(host, port, READY_PROBE_TIMEOUT):
+                reason = f"{host}:{port} not accepting connections"
+            else:
+                # The port answers, so don't let a breaker opened by an earlier attempt short-circuit
+                get_circuit(get_client(url, api_key).base_url).record_success()
+                verified, reason = verify_service(name, url, api_key)
+                if verified or reason == INVALID_API_KEY:
+                    return verified, reason, time.monotonic() - started
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False, f"not ready before the deadline ({reason})", time.monotonic() - started
+            time.sleep(min(remaining, delay * random.uniform(0.5, 1.0)))
+            delay = min(delay * 2, READY_BACKOFF_MAX)
 
 # ============================================================================
 # Configuration Functions
 # ============================================================================
 
+class AppliedLedger:
+    """Record of wiring applied by configure, keyed by a hash of each item's inputs.
+
+    An item (download client, root folder, Prowlarr app, ...) whose inputs are
+    unchanged since it was applied is skipped once a single lookup confirms the
+    remote object still exists. With persist=False the ledger starts empty and
+    is never saved (record/replay, where every run must make the same requests).
+    """
+
+    def __init__(self, path: Path = None, persist: bool = True):
+        self.path = path or APPLIED_LEDGER_FILE
+        self.persist = persist
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if not persist:
+            return
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f).get("items", {})
+        except (OSError, ValueError, AttributeError):
+            self._entries = {}
+
+    @staticmethod
+    def digest(*inputs: Any) -> str:
+        """Hash the URLs, API keys, paths and payload an item is built from"""
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def confirm(self, key: str, digest: str, client: APIClient, check: str,
+                exists: Callable[[Any, Any], bool] = None) -> bool:
+        """True if key was applied with these inputs and the remote object is still there.
+
+        check is the lookup endpoint ({id} is replaced with the recorded remote
+        ID); exists(response, remote_id) can inspect the response further.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if not entry or entry.get("inputs") != digest:
+            return False
+        remote_id = entry.get("id")
+        # Always ask the service: a cached answer may predate a container recreate
+        status, response = client.get(check.format(id=remote_id), use_cache=False)
+        if status != 200:
+            return False
+        return exists is None or exists(response, remote_id)
+
+    def record(self, key: str, digest: str, remote_id: Any = None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.get("inputs") == digest and entry.get("id") == remote_id:
+                return
+            self._entries[key] = {"inputs": digest, "id": remote_id, "applied_at": int(time.time())}
+            self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self._entries = {}
+                self._dirty = True
+
+    def save(self):
+        if not self.persist or not persistence_enabled():
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": 1, "items": self._entries}
+            self._dirty = False
+        try:
+            write_if_changed(self.path, json.dumps(data, indent=2, sort_keys=True).encode("utf-8"))
+        except OSError as e:
+            print_warning(f"Failed to save applied ledger: {e}")
+
+_applied_ledger: Optional[AppliedLedger] = None
+
+def get_applied_ledger() -> AppliedLedger:
+    """Return the process-wide applied-state ledger"""
+    global _applied_ledger
+    if _applied_ledger is None:
+        _applied_ledger = AppliedLedger()
+    return _applied_ledger
+
+def set_applied_ledger(ledger: AppliedLedger):
+    """Replace the process-wide ledger (e.g. an in-memory one for record/replay)"""
+    global _applied_ledger
+    _applied_ledger = ledger
+
+def response_id(response: Any) -> Any:
+    """ID of the object a create call returned, if any"""
+    return response.get("id") if isinstance(response, dict) else None
+
 def get_existing_items(client: APIClient, endpoint: str, name_field: str = "name") -> Dict[str, dict]:
-    """Get existing items from an API endpoint, keyed by name"""
+    """Get existing items from an API endpoint (via the response cache), keyed by name"""
     status, response = client.get(endpoint)
     if status == 200 and isinstance(response, list):
         return {item.get(name_field, ""): item for item in response}
     return {}
 
-def add_download_client_to_arr(
-    arr_client: APIClient,
-    arr_name: str,
-    rdt_host: str,
-    rdt_port: int = 6500,
-    dry_run: bool = False
-) -> bool:
-    """Add Rdt-Client as download client to Sonarr/Radarr"""
-
-    # Check if already exists
-    existing = get_existing_items(arr_client, "/api/v3/downloadclient")
-    if "Chimera-Debrid" in existing:
-        print_info(f"Download client already exists in {arr_name}")
-        return True
-
+def download_client_payload(arr_name: str, rdt_host: str, rdt_port: int) -> dict:
+    """Sonarr/Radarr download client definition for Rdt-Client"""
     # Rdt-Client pretends to be qBittorrent
-    payload = {
+    return {
         "enable": True,
         "protocol": "torrent",
         "priority": 1,
@@ -564,6 +2647,87 @@ def add_download_client_to_arr(
         "tags": [],
     }
 
+def prowlarr_app_payload(arr_name: str, arr_config: ServiceConfig) -> dict:
+    """Prowlarr application definition for Sonarr/Radarr"""
+    categories = {
+        "Sonarr": [5000, 5010, 5020, 5030, 5040, 5045, 5050],
+        "Radarr": [2000, 2010, 2020, 2030, 2040, 2045, 2050, 2060],
+    }
+    return {
+        "name": arr_name,
+        "syncLevel": "fullSync",
+        "implementation": arr_name,
+        "configContract": f"{arr_name}Settings",
+        "fields": [
+            {"name": "prowlarrUrl", "value": "http://prowlarr:9696"},
+            {"name": "baseUrl", "value": arr_config.url},
+            {"name": "apiKey", "value": arr_config.api_key},
+            {"name": "syncCategories", "value": categories[arr_name]},
+        ],
+        "tags": [],
+    }
+
+def bazarr_connection(arr_key: str, arr_config: ServiceConfig) -> dict:
+    """Bazarr settings section ("sonarr"/"radarr") pointing at an arr"""
+    section = {
+        "ip": arr_config.url.replace("http://", "").replace("https://", ""),
+        "port": 8989 if arr_key == "sonarr" else 7878,
+        "apikey": arr_config.api_key,
+        "ssl": False,
+        "base_url": "",
+        "only_monitored": False,
+    }
+    if arr_key == "sonarr":
+        section.update({"series_sync": 60, "episodes_sync": 60})
+    else:
+        section["movies_sync"] = 60
+    return section
+
+def overseerr_server_payload(arr_name: str, arr_config: ServiceConfig) -> dict:
+    """Overseerr Sonarr/Radarr server definition"""
+    payload = {
+        "name": arr_name,
+        "hostname": arr_config.url.replace("http://", "").replace("https://", "").split(":")[0],
+        "port": 8989 if arr_name == "Sonarr" else 7878,
+        "apiKey": arr_config.api_key,
+        "useSsl": False,
+        "activeProfileId": 1,
+        "activeDirectory": "/data/media/tv" if arr_name == "Sonarr" else "/data/media/movies",
+        "is4k": False,
+        "isDefault": True,
+        "externalUrl": arr_config.url,
+    }
+    if arr_name == "Sonarr":
+        payload["activeLanguageProfileId"] = 1
+    else:
+        payload["minimumAvailability"] = "released"
+    return payload
+
+def add_download_client_to_arr(
+    arr_client: APIClient,
+    arr_name: str,
+    rdt_host: str,
+    rdt_port: int = 6500,
+    dry_run: bool = False
+) -> bool:
+    """Add Rdt-Client as download client to Sonarr/Radarr"""
+
+    payload = download_client_payload(arr_name, rdt_host, rdt_port)
+
+    ledger = get_applied_ledger()
+    key = f"download_client {arr_client.base_url} {arr_name}"
+    inputs = ledger.digest(arr_client.base_url, arr_client.api_key, payload)
+    if ledger.confirm(key, inputs, arr_client, "/api/v3/downloadclient/{id}"):
+        print_info(f"Download client already exists in {arr_name}")
+        return True
+
+    # Check if already exists
+    existing = get_existing_items(arr_client, "/api/v3/downloadclient")
+    if "Chimera-Debrid" in existing:
+        print_info(f"Download client already exists in {arr_name}")
+        ledger.record(key, inputs, existing["Chimera-Debrid"].get("id"))
+        return True
+
     if dry_run:
         print_info(f"[DRY-RUN] Would add Chimera-Debrid to {arr_name}")
         return True
@@ -571,6 +2735,7 @@ def add_download_client_to_arr(
     status, response = arr_client.post("/api/v3/downloadclient", payload)
 
     if status in [200, 201]:
+        ledger.record(key, inputs, response_id(response))
         print_success(f"Added Chimera-Debrid download client to {arr_name}")
         return True
     else:
@@ -585,12 +2750,20 @@ def add_root_folder_to_arr(
 ) -> bool:
     """Add root folder to Sonarr/Radarr"""
 
+    ledger = get_applied_ledger()
+    key = f"root_folder {arr_client.base_url} {path}"
+    inputs = ledger.digest(arr_client.base_url, arr_client.api_key, path)
+    if ledger.confirm(key, inputs, arr_client, "/api/v3/rootfolder/{id}"):
+        print_info(f"Root folder {path} already exists in {arr_name}")
+        return True
+
     # Check if already exists
     status, existing = arr_client.get("/api/v3/rootfolder")
     if status == 200 and isinstance(existing, list):
         for folder in existing:
             if folder.get("path") == path:
                 print_info(f"Root folder {path} already exists in {arr_name}")
+                ledger.record(key, inputs, folder.get("id"))
                 return True
 
     payload = {"path": path}
@@ -599,238 +2772,1252 @@ def add_root_folder_to_arr(
         print_info(f"[DRY-RUN] Would add root folder {path} to {arr_name}")
         return True
 
-    status, response = arr_client.post("/api/v3/rootfolder", payload)
+    status, response = arr_client.post("/api/v3/rootfolder", payload)
+
+    if status in [200, 201]:
+        ledger.record(key, inputs, response_id(response))
+        print_success(f"Added root folder {path} to {arr_name}")
+        return True
+    else:
+        print_error(f"Failed to add root folder to {arr_name}: {response}")
+        return False
+
+def sync_prowlarr_to_arrs(
+    prowlarr_client: APIClient,
+    sonarr_config: Optional[ServiceConfig],
+    radarr_config: Optional[ServiceConfig],
+    dry_run: bool = False
+) -> bool:
+    """Sync Prowlarr indexers to Sonarr/Radarr"""
+
+    success = True
+    ledger = get_applied_ledger()
+
+    wanted = []
+
+    for arr_name, arr_config in (("Sonarr", sonarr_config), ("Radarr", radarr_config)):
+        if arr_config and arr_config.verified:
+            wanted.append(prowlarr_app_payload(arr_name, arr_config))
+
+    # Existing applications are only listed if the ledger can't vouch for every app
+    existing_apps = None
+    apps_to_add = []
+
+    for app in wanted:
+        key = f"prowlarr_app {prowlarr_client.base_url} {app['name']}"
+        inputs = ledger.digest(prowlarr_client.base_url, prowlarr_client.api_key, app)
+        if ledger.confirm(key, inputs, prowlarr_client, "/api/v1/applications/{id}"):
+            print_info(f"{app['name']} already configured in Prowlarr")
+            continue
+        if existing_apps is None:
+            existing_apps = get_existing_items(prowlarr_client, "/api/v1/applications")
+        if app["name"] in existing_apps:
+            print_info(f"{app['name']} already configured in Prowlarr")
+            ledger.record(key, inputs, existing_apps[app["name"]].get("id"))
+        else:
+            apps_to_add.append((key, inputs, app))
+
+    for key, inputs, app in apps_to_add:
+        if dry_run:
+            print_info(f"[DRY-RUN] Would add {app['name']} to Prowlarr")
+            continue
+
+        status, response = prowlarr_client.post("/api/v1/applications", app)
+        if status in [200, 201]:
+            ledger.record(key, inputs, response_id(response))
+            print_success(f"Added {app['name']} to Prowlarr")
+        else:
+            print_error(f"Failed to add {app['name']} to Prowlarr: {response}")
+            success = False
+
+    # Trigger sync
+    if not dry_run and apps_to_add:
+        print_info("Triggering Prowlarr sync...")
+        prowlarr_client.post("/api/v1/command", {"name": "ApplicationIndexerSync"})
+
+    return success
+
+def configure_bazarr(
+    bazarr_client: APIClient,
+    sonarr_config: Optional[ServiceConfig],
+    radarr_config: Optional[ServiceConfig],
+    dry_run: bool = False
+) -> bool:
+    """Configure Bazarr to connect to Sonarr/Radarr"""
+
+    ledger = get_applied_ledger()
+    wired = [(name, svc) for name, svc in (("sonarr", sonarr_config), ("radarr", radarr_config))
+             if svc and svc.verified]
+    key = f"bazarr {bazarr_client.base_url}"
+    inputs = ledger.digest(bazarr_client.base_url, bazarr_client.api_key,
+                           [(name, svc.url, svc.api_key) for name, svc in wired])
+
+    def still_wired(settings: Any, _) -> bool:
+        return isinstance(settings, dict) and all(
+            (settings.get(name) or {}).get("apikey") == svc.api_key for name, svc in wired
+        )
+
+    if ledger.confirm(key, inputs, bazarr_client, "/api/system/settings", still_wired):
+        print_info("Bazarr already configured")
+        return True
+
+    # Get current settings
+    status, settings = bazarr_client.get("/api/system/settings")
+    if status != 200:
+        print_error(f"Failed to get Bazarr settings: {settings}")
+        return False
+
+    if not isinstance(settings, dict):
+        print_error("Unexpected Bazarr settings format")
+        return False
+
+    updated = False
+
+    # Configure Sonarr/Radarr connections
+    for arr_key, arr_config in wired:
+        current = settings.get(arr_key, {})
+        if not current.get("ip") or current.get("apikey") != arr_config.api_key:
+            settings[arr_key] = bazarr_connection(arr_key, arr_config)
+            updated = True
+            print_info(f"Configured {arr_config.name} connection in Bazarr")
+
+    if not updated:
+        print_info("Bazarr already configured")
+        ledger.record(key, inputs)
+        return True
+
+    if dry_run:
+        print_info("[DRY-RUN] Would update Bazarr settings")
+        return True
+
+    status, response = bazarr_client.post("/api/system/settings", settings)
+    if status in [200, 201, 204]:
+        ledger.record(key, inputs)
+        print_success("Updated Bazarr settings")
+        return True
+    else:
+        print_error(f"Failed to update Bazarr settings: {response}")
+        return False
+
+def add_overseerr_server(overseerr_client: APIClient, name: str, payload: dict, dry_run: bool = False) -> bool:
+    """Add a Sonarr/Radarr server to Overseerr unless one with the same name exists"""
+    endpoint = f"/api/v1/settings/{name.lower()}"
+    ledger = get_applied_ledger()
+    key = f"overseerr_{name.lower()} {overseerr_client.base_url}"
+    inputs = ledger.digest(overseerr_client.base_url, overseerr_client.api_key, payload)
+
+    def listed(servers: Any, remote_id: Any) -> bool:
+        return isinstance(servers, list) and any(s.get("id") == remote_id for s in servers)
+
+    if ledger.confirm(key, inputs, overseerr_client, endpoint, listed):
+        print_info(f"{name} already configured in Overseerr")
+        return True
+
+    status, existing = overseerr_client.get(endpoint)
+    if status != 200:
+        return True
+
+    current = None
+    if isinstance(existing, list):
+        current = next((s for s in existing if s.get("name") == name), None)
+
+    if current is not None:
+        print_info(f"{name} already configured in Overseerr")
+        ledger.record(key, inputs, current.get("id"))
+        return True
+
+    if dry_run:
+        print_info(f"[DRY-RUN] Would add {name} to Overseerr")
+        return True
+
+    status, response = overseerr_client.post(endpoint, payload)
+    if status in [200, 201]:
+        ledger.record(key, inputs, response_id(response))
+        print_success(f"Added {name} to Overseerr")
+        return True
+    print_error(f"Failed to add {name} to Overseerr: {response}")
+    return False
+
+def configure_overseerr(
+    overseerr_client: APIClient,
+    sonarr_config: Optional[ServiceConfig],
+    radarr_config: Optional[ServiceConfig],
+    plex_config: Optional[ServiceConfig],
+    dry_run: bool = False
+) -> bool:
+    """Configure Overseerr to connect to Sonarr/Radarr/Plex"""
+
+    success = True
+
+    for arr_name, arr_config in (("Radarr", radarr_config), ("Sonarr", sonarr_config)):
+        if arr_config and arr_config.verified:
+            payload = overseerr_server_payload(arr_name, arr_config)
+            success = add_overseerr_server(overseerr_client, arr_name, payload, dry_run) and success
+
+    return success
+
+# ============================================================================
+# Configuration Steps
+# ============================================================================
+
+# Services that must be reachable before wiring (config keys)
+VERIFY_BEFORE_CONFIGURE = ['sonarr', 'radarr', 'prowlarr', 'rdt_client']
+
+def verify_config_services(config: Config, keys: List[str]) -> bool:
+    """Verify the given configured services, updating their verified flags"""
+    services_ok = True
+    services = [(key, getattr(config, key)) for key in keys]
+    services = [(key, svc) for key, svc in services if svc and svc.enabled]
+    results = verify_services([(key.replace('_', '-'), svc.url, svc.api_key) for key, svc in services])
+
+    for (key, svc), (verified, version) in zip(services, results):
+        services_ok = report_verification(svc, verified, version) and services_ok
+    return services_ok
+
+def report_verification(svc: ServiceConfig, verified: bool, version: str) -> bool:
+    """Print a verification result and update the service's verified flag"""
+    svc.verified = verified
+    if verified:
+        print_success(f"{svc.name} is accessible")
+    else:
+        print_error(f"{svc.name} is not accessible: {version}")
+    return verified
+
+def rdt_endpoint(config: Config) -> Tuple[str, int]:
+    """(host, port) the arrs should use to reach Rdt-Client"""
+    rdt_host = config.rdt_client.url.replace("http://", "").replace("https://", "").split(":")[0]
+    rdt_port = int(config.rdt_client.url.split(":")[-1]) if ":" in config.rdt_client.url.split("/")[-1] else 6500
+    return rdt_host, rdt_port
+
+ARR_NAMES = {"sonarr": "Sonarr", "radarr": "Radarr"}
+STEP_SERVICE_NAMES = dict(ARR_NAMES, prowlarr="Prowlarr", rdt_client="Rdt-Client", bazarr="Bazarr", overseerr="Overseerr")
+
+# Services configure --wait holds each dependent step for
+READY_SERVICES = VERIFY_BEFORE_CONFIGURE + ['bazarr', 'overseerr']
+
+def step_verify(config: Config, dry_run: bool = False, key: str = ""):
+    """Verify one configured service"""
+    svc = getattr(config, key)
+    if svc and svc.enabled:
+        report_verification(svc, *verify_service(key.replace('_', '-'), svc.url, svc.api_key))
+
+def step_wait_ready(config: Config, dry_run: bool = False, key: str = "", deadline: float = 0.0):
+    """Wait for one configured service to come up, then mark it verified"""
+    svc = getattr(config, key)
+    if svc and svc.enabled:
+        ready, version, waited = wait_for_service(key.replace('_', '-'), svc.url, svc.api_key, deadline)
+        if ready and waited >= READY_BACKOFF:
+            print_info(f"{svc.name} became ready after {waited:.1f}s")
+        report_verification(svc, ready, version)
+
+def step_download_client(config: Config, dry_run: bool = False, arr_key: str = "sonarr"):
+    """Add Rdt-Client as download client to Sonarr or Radarr"""
+    arr = getattr(config, arr_key)
+    if not (config.rdt_client and config.rdt_client.verified):
+        print_warning("Rdt-Client not configured, skipping download client setup")
+    elif arr and arr.verified:
+        rdt_host, rdt_port = rdt_endpoint(config)
+        add_download_client_to_arr(get_client(arr.url, arr.api_key), ARR_NAMES[arr_key], rdt_host, rdt_port, dry_run)
+
+def step_root_folder(config: Config, dry_run: bool = False, arr_key: str = "sonarr"):
+    """Add the media root folder to Sonarr or Radarr"""
+    arr = getattr(config, arr_key)
+    if arr and arr.verified:
+        path = config.tv_path if arr_key == "sonarr" else config.movies_path
+        add_root_folder_to_arr(get_client(arr.url, arr.api_key), ARR_NAMES[arr_key], path, dry_run)
+
+def step_prowlarr_sync(config: Config, dry_run: bool = False):
+    """Register Sonarr/Radarr as Prowlarr applications"""
+    if config.prowlarr and config.prowlarr.verified:
+        prowlarr_client = get_client(config.prowlarr.url, config.prowlarr.api_key)
+        sync_prowlarr_to_arrs(prowlarr_client, config.sonarr, config.radarr, dry_run)
+    else:
+        print_warning("Prowlarr not configured, skipping indexer sync")
+
+def step_bazarr(config: Config, dry_run: bool = False):
+    """Connect Bazarr to Sonarr/Radarr"""
+    if config.bazarr and config.bazarr.verified:
+        bazarr_client = get_client(config.bazarr.url, config.bazarr.api_key)
+        configure_bazarr(bazarr_client, config.sonarr, config.radarr, dry_run)
+
+def step_overseerr(config: Config, dry_run: bool = False):
+    """Connect Overseerr to Sonarr/Radarr/Plex"""
+    if config.overseerr and config.overseerr.verified:
+        overseerr_client = get_client(config.overseerr.url, config.overseerr.api_key)
+        configure_overseerr(overseerr_client, config.sonarr, config.radarr, config.plex, dry_run)
+
+@dataclass
+class StepNode:
+    """A configure step and the nodes it has to wait for"""
+    name: str
+    title: str
+    run: Callable[..., Any]                     # run(config, dry_run)
+    after: Tuple[str, ...] = ()
+    reads: frozenset = frozenset()              # config keys - watch reruns nodes whose inputs changed
+
+def configure_graph(verify: bool = True, deadline: float = None) -> List[StepNode]:
+    """The configure pipeline as a dependency graph, in display order.
+
+    Without verify the verification nodes are left out and dependencies on
+    them count as met (watch verifies the changed services itself). With a
+    deadline (time.monotonic()) they wait for READY_SERVICES to come up instead,
+    so each service's steps start the moment it is ready.
+    """
+    nodes = []
+    if verify and deadline is not None:
+        for key in READY_SERVICES:
+            nodes.append(StepNode(f"verify:{key}", f"Waiting for {STEP_SERVICE_NAMES[key]}...",
+                                  partial(step_wait_ready, key=key, deadline=deadline), reads=frozenset({key})))
+    elif verify:
+        for key in VERIFY_BEFORE_CONFIGURE:
+            nodes.append(StepNode(f"verify:{key}", f"Verifying {STEP_SERVICE_NAMES[key]}...",
+                                  partial(step_verify, key=key), reads=frozenset({key})))
+
+    for arr_key, arr_name in ARR_NAMES.items():
+        nodes.append(StepNode(f"download_client:{arr_key}", f"Configuring {arr_name} download client...",
+                              partial(step_download_client, arr_key=arr_key),
+                              after=(f"verify:{arr_key}", "verify:rdt_client"),
+                              reads=frozenset({arr_key, "rdt_client"})))
+    for arr_key, arr_name in ARR_NAMES.items():
+        nodes.append(StepNode(f"root_folder:{arr_key}", f"Configuring {arr_name} root folder...",
+                              partial(step_root_folder, arr_key=arr_key),
+                              after=(f"verify:{arr_key}",), reads=frozenset({arr_key})))
+
+    arrs = ("verify:sonarr", "verify:radarr")
+    nodes.append(StepNode("prowlarr", "Configuring Prowlarr sync...", step_prowlarr_sync,
+                          after=arrs + ("verify:prowlarr",), reads=frozenset({"prowlarr", "sonarr", "radarr"})))
+    nodes.append(StepNode("bazarr", "Configuring Bazarr...", step_bazarr,
+                          after=arrs + ("verify:bazarr",), reads=frozenset({"bazarr", "sonarr", "radarr"})))
+    nodes.append(StepNode("overseerr", "Configuring Overseerr...", step_overseerr,
+                          after=arrs + ("verify:overseerr",), reads=frozenset({"overseerr", "sonarr", "radarr", "plex"})))
+    return nodes
+
+def run_step(node: StepNode, config: Config, dry_run: bool):
+    with get_tracer().span(node.title.rstrip("."), "step"):
+        node.run(config, dry_run)
+
+async def execute_graph(nodes: List[StepNode], config: Config, dry_run: bool = False):
+    loop = asyncio.get_running_loop()
+    finished = {node.name: loop.create_future() for node in nodes}
+    outputs: Dict[str, List[str]] = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, len(nodes)), thread_name_prefix="step")
+
+    async def run(node: StepNode):
+        for dependency in node.after:
+            if dependency in finished:
+                await finished[dependency]
+        outputs[node.name] = await loop.run_in_executor(executor, capture_output, run_step, node, config, dry_run)
+        finished[node.name].set_result(True)
+
+    tasks = [asyncio.ensure_future(run(node)) for node in nodes]
+    try:
+        # Print each node once it and every node before it are done
+        for index, (node, task) in enumerate(zip(nodes, tasks), start=1):
+            await task
+            print_step(index, len(nodes), node.title)
+            for line in outputs[node.name]:
+                emit(line)
+    finally:
+        executor.shutdown(wait=True)
+
+def run_graph(nodes: List[StepNode], config: Config, dry_run: bool = False):
+    """Run step nodes concurrently, each as soon as its dependencies finish.
+
+    Output is buffered per node and printed in node order, so the log reads
+    as if the steps ran one after another. Total time is the critical path.
+    """
+    asyncio.run(execute_graph(nodes, config, dry_run))
+
+# ============================================================================
+# Reconciliation (plan / apply)
+# ============================================================================
+
+# Services read by the plan (verified first so unreachable ones are left out)
+RECONCILE_SERVICES = VERIFY_BEFORE_CONFIGURE + ['bazarr', 'overseerr']
+
+# Secret fields come back masked from the arrs, so they can't be diffed
+MASKED_VALUE = "********"
+SENSITIVE_KEYS = ("apikey", "password", "token")
+
+@dataclass
+class DesiredItem:
+    """An object configure expects to find on a service"""
+    key: str                                    # ledger key (shared with the configure steps)
+    label: str                                  # e.g. 'Sonarr: download client "Chimera-Debrid"'
+    client: APIClient
+    collection: str                             # GET endpoint holding the live object
+    find: Callable[[Any], Optional[dict]]       # picks the live object out of the collection
+    payload: dict
+    inputs: str                                 # ledger digest of the payload inputs
+    compare: List[str] = field(default_factory=list)   # flattened keys that must match
+    create: Optional[str] = None                # POST endpoint, None if it can't be created
+    update: Optional[str] = None                # endpoint with {id}, None if never updated
+    update_method: str = "PUT"
+    build: Optional[Callable[[dict, list], dict]] = None   # custom update body
+    followup: Optional[Tuple[str, dict]] = None # POSTed once after any change
+
+@dataclass
+class Operation:
+    item: DesiredItem
+    action: str                                 # "create" or "update"
+    method: str
+    endpoint: str
+    body: dict
+    remote_id: Any = None
+    changes: List[Tuple[str, Any, Any]] = field(default_factory=list)
+
+@dataclass
+class Plan:
+    operations: List[Operation] = field(default_factory=list)
+    unchanged: List[DesiredItem] = field(default_factory=list)
+    errors: List[Tuple[DesiredItem, str]] = field(default_factory=list)
+
+def find_by(key: str, value: Any) -> Callable[[Any], Optional[dict]]:
+    """Finder for the list item whose key equals value"""
+    def find(items: Any) -> Optional[dict]:
+        if isinstance(items, list):
+            return next((item for item in items if isinstance(item, dict) and item.get(key) == value), None)
+        return None
+    return find
+
+def flatten(obj: Any, prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested settings to dotted keys; arr "fields" lists are keyed by field name"""
+    flat = {}
+    if not isinstance(obj, dict):
+        return flat
+    for key, value in obj.items():
+        path = f"{prefix}{key}"
+        if key == "fields" and isinstance(value, list):
+            for entry in value:
+                if isinstance(entry, dict) and "name" in entry:
+                    flat[f"{path}.{entry['name']}"] = entry.get("value")
+        elif isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        else:
+            flat[path] = value
+    return flat
+
+def set_flat(obj: dict, key: str, value: Any):
+    """Inverse of flatten() for a single key"""
+    head, _, rest = key.partition(".")
+    if not rest:
+        obj[head] = value
+    elif head == "fields" and isinstance(obj.get("fields"), list):
+        for entry in obj["fields"]:
+            if entry.get("name") == rest:
+                entry["value"] = value
+                return
+        obj["fields"].append({"name": rest, "value": value})
+    else:
+        if not isinstance(obj.get(head), dict):
+            obj[head] = {}
+        set_flat(obj[head], rest, value)
+
+def diff_item(live: dict, desired: dict, keys: List[str]) -> List[Tuple[str, Any, Any]]:
+    """(key, live value, desired value) for every compared key that differs"""
+    have, want = flatten(live), flatten(desired)
+    changes = []
+    for key in keys:
+        if key not in want or have.get(key) == MASKED_VALUE:
+            continue
+        if have.get(key) != want[key]:
+            changes.append((key, have.get(key), want[key]))
+    return changes
+
+def apply_changes(live: dict, changes: List[Tuple[str, Any, Any]]) -> dict:
+    """Live object with only the changed keys replaced (other settings are preserved)"""
+    body = copy.deepcopy(live)
+    for key, _, value in changes:
+        set_flat(body, key, value)
+    return body
+
+def desired_state(config: Config) -> List[DesiredItem]:
+    """Everything configure would create, derived from the config"""
+    ledger = get_applied_ledger()
+    items = []
+
+    def ready(svc: Optional[ServiceConfig]) -> bool:
+        return bool(svc and svc.verified)
+
+    arrs = [("Sonarr", "sonarr", config.sonarr, config.tv_path),
+            ("Radarr", "radarr", config.radarr, config.movies_path)]
+
+    for arr_name, arr_key, arr, root in arrs:
+        if not ready(arr):
+            continue
+        client = get_client(arr.url, arr.api_key)
+
+        if ready(config.rdt_client):
+            payload = download_client_payload(arr_name, *rdt_endpoint(config))
+            category = "tvCategory" if arr_key == "sonarr" else "movieCategory"
+            items.append(DesiredItem(
+                key=f"download_client {client.base_url} {arr_name}",
+                label=f'{arr_name}: download client "Chimera-Debrid"',
+                client=client, collection="/api/v3/downloadclient",
+                find=find_by("name", "Chimera-Debrid"), payload=payload,
+                inputs=ledger.digest(client.base_url, client.api_key, payload),
+                compare=["fields.host", "fields.port", f"fields.{category}"],
+                create="/api/v3/downloadclient", update="/api/v3/downloadclient/{id}",
+            ))
+
+        items.append(DesiredItem(
+            key=f"root_folder {client.base_url} {root}",
+            label=f'{arr_name}: root folder "{root}"',
+            client=client, collection="/api/v3/rootfolder",
+            find=find_by("path", root), payload={"path": root},
+            inputs=ledger.digest(client.base_url, client.api_key, root),
+            create="/api/v3/rootfolder",
+        ))
+
+    if ready(config.prowlarr):
+        client = get_client(config.prowlarr.url, config.prowlarr.api_key)
+        for arr_name, _, arr, _ in arrs:
+            if not ready(arr):
+                continue
+            payload = prowlarr_app_payload(arr_name, arr)
+            items.append(DesiredItem(
+                key=f"prowlarr_app {client.base_url} {arr_name}",
+                label=f'Prowlarr: application "{arr_name}"',
+                client=client, collection="/api/v1/applications",
+                find=find_by("name", arr_name), payload=payload,
+                inputs=ledger.digest(client.base_url, client.api_key, payload),
+                compare=["fields.prowlarrUrl", "fields.baseUrl", "fields.apiKey"],
+                create="/api/v1/applications", update="/api/v1/applications/{id}",
+                followup=("/api/v1/command", {"name": "ApplicationIndexerSync"}),
+            ))
+
+    wired = [(arr_key, arr) for _, arr_key, arr, _ in arrs if ready(arr)]
+    if ready(config.bazarr) and wired:
+        client = get_client(config.bazarr.url, config.bazarr.api_key)
+        payload = {arr_key: bazarr_connection(arr_key, arr) for arr_key, arr in wired}
+
+        def bazarr_body(settings: dict, changes: list, payload: dict = payload) -> dict:
+            # Changed sections are replaced wholesale, as configure does
+            body = copy.deepcopy(settings)
+            for section in {key.split(".", 1)[0] for key, _, _ in changes}:
+                body[section] = payload[section]
+            return body
+
+        items.append(DesiredItem(
+            key=f"bazarr {client.base_url}",
+            label="Bazarr: Sonarr/Radarr connections",
+            client=client, collection="/api/system/settings",
+            find=lambda settings: settings if isinstance(settings, dict) else None,
+            payload=payload,
+            inputs=ledger.digest(client.base_url, client.api_key,
+                                 [(arr_key, arr.url, arr.api_key) for arr_key, arr in wired]),
+            compare=[f"{arr_key}.{key}" for arr_key, _ in wired for key in ("ip", "apikey")],
+            update="/api/system/settings", update_method="POST", build=bazarr_body,
+        ))
+
+    if ready(config.overseerr):
+        client = get_client(config.overseerr.url, config.overseerr.api_key)
+        for arr_name, arr_key, arr, _ in reversed(arrs):
+            if not ready(arr):
+                continue
+            payload = overseerr_server_payload(arr_name, arr)
+            items.append(DesiredItem(
+                key=f"overseerr_{arr_key} {client.base_url}",
+                label=f'Overseerr: {arr_name} server',
+                client=client, collection=f"/api/v1/settings/{arr_key}",
+                find=find_by("name", arr_name), payload=payload,
+                inputs=ledger.digest(client.base_url, client.api_key, payload),
+                compare=["hostname", "port", "apiKey", "useSsl"],
+                create=f"/api/v1/settings/{arr_key}", update=f"/api/v1/settings/{arr_key}/{{id}}",
+            ))
+
+    return items
+
+def gather_live_state(items: List[DesiredItem],
+                      executor: ThreadPoolExecutor = None) -> Dict[Tuple[str, str, str], Tuple[int, Any]]:
+    """GET every collection the desired items live in - one concurrent pass, one request each"""
+    collections: Dict[Tuple[str, str, str], APIClient] = {}
+    for item in items:
+        collections.setdefault((item.client.base_url, item.client.api_key, item.collection), item.client)
+
+    def fetch(entry: Tuple[Tuple[str, str, str], APIClient]) -> Tuple[int, Any]:
+        (base_url, _, collection), client = entry
+        with host_semaphore(base_url):
+            return client.get(collection, use_cache=False)
+
+    entries = list(collections.items())
+    return dict(zip([key for key, _ in entries], (executor or get_executor()).map(fetch, entries)))
+
+def build_plan(items: List[DesiredItem], live: Dict[Tuple[str, str, str], Tuple[int, Any]]) -> Plan:
+    """Diff desired items against live state into the minimal set of creates and updates"""
+    ledger = get_applied_ledger()
+    plan = Plan()
+
+    for item in items:
+        status, data = live[(item.client.base_url, item.client.api_key, item.collection)]
+        if status != 200:
+            plan.errors.append((item, f"could not read {item.collection}: {data}"))
+            continue
+
+        current = item.find(data)
+        if current is None:
+            if item.create is None:
+                plan.errors.append((item, f"unexpected response from {item.collection}"))
+            else:
+                plan.operations.append(Operation(item, "create", "POST", item.create, item.payload))
+            continue
+
+        changes = diff_item(current, item.payload, item.compare)
+        if changes and item.update:
+            build = item.build or apply_changes
+            plan.operations.append(Operation(
+                item, "update", item.update_method, item.update.format(id=current.get("id")),
+                build(current, changes), current.get("id"), changes,
+            ))
+        else:
+            plan.unchanged.append(item)
+            ledger.record(item.key, item.inputs, current.get("id"))
+
+    return plan
+
+def display_value(key: str, value: Any) -> str:
+    if value not in (None, "") and any(word in key.lower() for word in SENSITIVE_KEYS):
+        return "(sensitive)"
+    return json.dumps(value)
+
+def print_plan(plan: Plan):
+    """Print the plan as a diff: + create, ~ update, = unchanged"""
+    for item in plan.unchanged:
+        emit(f"  {Colors.DIM}= {item.label}{Colors.RESET}")
+    for op in plan.operations:
+        if op.action == "create":
+            emit(f"  {Colors.GREEN}+{Colors.RESET} {op.item.label}")
+        else:
+            emit(f"  {Colors.YELLOW}~{Colors.RESET} {op.item.label}")
+            for key, old, new in op.changes:
+                emit(f"      {key}: {display_value(key, old)} -> {display_value(key, new)}")
+    for item, error in plan.errors:
+        print_warning(f"{item.label}: {error}")
+
+    creates = sum(1 for op in plan.operations if op.action == "create")
+    updates = len(plan.operations) - creates
+    emit(f"\n{Colors.BOLD}Plan:{Colors.RESET} {creates} to create, {updates} to update, "
+          f"{len(plan.unchanged)} unchanged")
+
+def apply_plan(plan: Plan) -> bool:
+    """Apply the plan's operations, then each service's follow-up (e.g. Prowlarr sync)
+
+    Operations on the same service run in plan order (an arr can reject
+    concurrent writes to its config); different services run concurrently.
+    A service's follow-up only runs when every
+    operation on it succeeded.
+    """
+    ledger = get_applied_ledger()
+
+    groups: Dict[Tuple[str, str], List[Operation]] = {}
+    for op in plan.operations:
+        groups.setdefault((op.item.client.base_url, op.item.client.api_key), []).append(op)
+
+    def run(ops: List[Operation]) -> List[Tuple[int, Any]]:
+        client = ops[0].item.client
+        results = []
+        with host_semaphore(client.base_url):
+            for op in ops:
+                if op.method == "PUT":
+                    results.append(client.put(op.endpoint, op.body))
+                else:
+                    results.append(client.post(op.endpoint, op.body))
+        return results
+
+    success = True
+    for ops, results in zip(groups.values(), get_executor().map(run, groups.values())):
+        followups: Dict[str, dict] = {}
+        failed = False
+        for op, (status, response) in zip(ops, results):
+            verb = "Created" if op.action == "create" else "Updated"
+            if status in (200, 201, 202, 204):
+                ledger.record(op.item.key, op.item.inputs, response_id(response) or op.remote_id)
+                print_success(f"{verb} {op.item.label}")
+                if op.item.followup:
+                    endpoint, body = op.item.followup
+                    followups[endpoint] = body
+            else:
+                print_error(f"Failed to {op.action} {op.item.label}: {response}")
+                failed = True
+
+        client = ops[0].item.client
+        for endpoint, body in followups.items():
+            if failed:
+                print_warning(f"Skipped {endpoint} on {client.base_url}: an earlier change failed")
+                continue
+            status, response = client.post(endpoint, body)
+            if status not in (200, 201, 202, 204):
+                print_warning(f"{endpoint} on {client.base_url} failed: {response}")
+        success = success and not failed
+
+    return success
+
+def reconcile(config: Config) -> Plan:
+    """Verify services, read their live state and plan the changes"""
+    if not verify_config_services(config, RECONCILE_SERVICES):
+        print_warning("Some services are not accessible. The plan leaves them out.")
+    items = desired_state(config)
+    return build_plan(items, gather_live_state(items))
+
+# ============================================================================
+# Docker Event Watcher
+# ============================================================================
+
+WATCH_EVENTS = ["start", "die", "rename"]
+WATCH_DEBOUNCE = 0.5      # quiet period that ends a burst of events
+WATCH_MAX_BATCH = 10.0    # never hold a burst longer than this
+WATCH_RECONNECT = 5.0     # delay before reconnecting a dropped event stream
+WATCH_READY_DEADLINE = 180.0  # how long a (re)started service gets to answer before its steps are skipped
+
+def event_service(event: Dict[str, Any]) -> Optional[str]:
+    """Map a Docker container event onto a known service key"""
+    attributes = (event.get("Actor") or {}).get("Attributes") or {}
+    service = normalize_service_name(attributes.get(LABEL_SERVICE, ""))
+    return service or match_service_name(attributes.get("name", ""))
+
+def stream_events(events: queue.Queue):
+    """Feed container events into a queue, reconnecting when the stream drops"""
+    docker = get_docker_client()
+    filters = {"type": ["container"], "event": WATCH_EVENTS}
+    while True:
+        try:
+            for event in docker.events(filters):
+                events.put(event)
+        except OSError as e:
+            print_warning(f"Docker event stream interrupted: {e}")
+        time.sleep(WATCH_RECONNECT)
+
+def collect_event_batch(events: queue.Queue, debounce: float) -> List[Dict[str, Any]]:
+    """Block for one event, then gather the rest of its burst"""
+    batch = [events.get()]
+    deadline = time.monotonic() + WATCH_MAX_BATCH
+    while True:
+        remaining = min(debounce, deadline - time.monotonic())
+        if remaining <= 0:
+            return batch
+        try:
+            batch.append(events.get(timeout=remaining))
+        except queue.Empty:
+            return batch
+
+def apply_event_batch(config: Config, batch: List[Dict[str, Any]], appdata_path: str, dry_run: bool = False) -> bool:
+    """Rediscover the services touched by a burst of events and rerun their steps"""
+
+    changed = {}
+    for event in batch:
+        service = event_service(event)
+        if service:
+            changed[service] = event.get("Action") or event.get("status", "")
+
+    if not changed:
+        return False
+
+    print_info("Events: " + ", ".join(f"{service} {action}" for service, action in sorted(changed.items())))
+
+    # Like a daemon command, each batch starts with no cached GETs - a recreated
+    # container must be compared against what it has now, not before the recreate
+    get_response_cache().clear()
+
+    # Drop cached inspects for the changed containers only; unchanged ones stay warm
+    docker = get_docker_client()
+    for event in batch:
+        container_id = (event.get("Actor") or {}).get("ID") or event.get("id", "")
+        docker.invalidate(container_id[:12])
+
+    started = {service for service, action in changed.items() if action != "die"}
+    started_ids = [(event.get("Actor") or {}).get("ID") or event.get("id", "") for event in batch
+                   if event_service(event) in started]
+    discovered = discover_container_ids(started_ids) if started else {}
+
+    keys = set()
+    for service in changed:
+        key = service.replace('-', '_')
+        keys.add(key)
+        svc = getattr(config, key)
+        info = discovered.get(service)
+
+        if service not in started or not info:
+            if svc:
+                svc.verified = False
+                print_warning(f"{svc.name} is down")
+            continue
+
+        if not svc:
+            svc = ServiceConfig(name=service.replace("-", " ").title().replace(" ", "-"), url=info["url"])
+            setattr(config, key, svc)
+        svc.url = info["url"]
+        # The container was just (re)started - forget failures from its previous life
+        get_circuit(svc.url.rstrip('/')).record_success()
+        if not svc.api_key:
+            svc.api_key = extract_api_key_from_config(appdata_path, service, info.get("appdata")) or ""
+
+    # 'start' fires when the process starts, well before the service binds its port -
+    # give each started service time to come up instead of a single check
+    deadline = time.monotonic() + WATCH_READY_DEADLINE
+    waiting = [key for key in sorted(keys) if key.replace('_', '-') in started and getattr(config, key)]
+    if waiting:
+        with ThreadPoolExecutor(max_workers=len(waiting)) as executor:
+            outputs = list(executor.map(
+                lambda key: capture_output(step_wait_ready, config, dry_run, key, deadline), waiting))
+        for lines in outputs:
+            for line in lines:
+                emit(line)
+
+    run_graph([node for node in configure_graph(verify=False) if node.reads & keys], config, dry_run)
+
+    return True
+
+# ============================================================================
+# Library Inventory
+# ============================================================================
+
+INVENTORY_KINDS = ["series", "movies", "indexers", "requests"]   # "episodes" is opt-in
+INVENTORY_COLUMNS = [
+    "service", "kind", "id", "parent_id", "title", "year", "season", "episode",
+    "path", "monitored", "has_file", "size_on_disk", "status", "protocol", "date",
+]
+INVENTORY_PAGE_SIZE = 100
+INVENTORY_QUEUE_SIZE = 1000     # records buffered between fetchers and the writer
+INVENTORY_WORKERS = 8           # concurrent per-series episode fetches
+OVERSEERR_REQUEST_STATUS = {1: "pending", 2: "approved", 3: "declined"}
+
+def stream_collection(client: APIClient, endpoint: str) -> Iterator[dict]:
+    """Stream a JSON array endpoint item by item (raises OSError on HTTP failure)"""
+    status, items = client.stream(endpoint)
+    if status != 200:
+        raise OSError(f"{endpoint}: HTTP {status} {items}" if status else f"{endpoint}: {items}")
+    for item in items:
+        if isinstance(item, dict):
+            yield item
+
+def page_overseerr_requests(client: APIClient) -> Iterator[dict]:
+    """Page through Overseerr requests with take/skip"""
+    skip = 0
+    while True:
+        endpoint = f"/api/v1/request?take={INVENTORY_PAGE_SIZE}&skip={skip}&sort=added"
+        status, page = client.get(endpoint, use_cache=False)
+        if status != 200 or not isinstance(page, dict):
+            raise OSError(f"{endpoint}: HTTP {status} {page}" if status else f"{endpoint}: {page}")
+        results = page.get("results") or []
+        yield from results
+        skip += len(results)
+        if not results or skip >= (page.get("pageInfo") or {}).get("results", 0):
+            return
+
+def inventory_series(client: APIClient, emit: Callable[[dict], None], episodes: bool):
+    """Emit Sonarr series, and optionally every series' episodes"""
+    pending = threading.BoundedSemaphore(INVENTORY_WORKERS)
+    errors = []
+
+    def fetch_episodes(series_id: int):
+        try:
+            for ep in stream_collection(client, f"/api/v3/episode?seriesId={series_id}"):
+                emit({
+                    "service": "sonarr", "kind": "episode", "id": ep.get("id"), "parent_id": series_id,
+                    "title": ep.get("title"), "season": ep.get("seasonNumber"), "episode": ep.get("episodeNumber"),
+                    "monitored": ep.get("monitored"), "has_file": ep.get("hasFile"), "date": ep.get("airDateUtc"),
+                })
+        except (OSError, ValueError) as e:
+            errors.append(e)
+        finally:
+            pending.release()
+
+    with ThreadPoolExecutor(max_workers=INVENTORY_WORKERS) as executor:
+        for series in stream_collection(client, "/api/v3/series"):
+            emit({
+                "service": "sonarr", "kind": "series", "id": series.get("id"), "title": series.get("title"),
+                "year": series.get("year"), "path": series.get("path"), "monitored": series.get("monitored"),
+                "size_on_disk": (series.get("statistics") or {}).get("sizeOnDisk"), "status": series.get("status"),
+            })
+            if episodes and series.get("id") is not None:
+                # Bound in-flight episode fetches so memory stays flat for big libraries
+                pending.acquire()
+                executor.submit(fetch_episodes, series["id"])
+
+    if errors:
+        raise OSError(f"{len(errors)} episode fetches failed, first: {errors[0]}")
+
+def inventory_movies(client: APIClient, emit: Callable[[dict], None]):
+    for movie in stream_collection(client, "/api/v3/movie"):
+        emit({
+            "service": "radarr", "kind": "movie", "id": movie.get("id"), "title": movie.get("title"),
+            "year": movie.get("year"), "path": movie.get("path"), "monitored": movie.get("monitored"),
+            "has_file": movie.get("hasFile"), "size_on_disk": movie.get("sizeOnDisk"), "status": movie.get("status"),
+        })
+
+def inventory_indexers(client: APIClient, emit: Callable[[dict], None]):
+    for indexer in stream_collection(client, "/api/v1/indexer"):
+        emit({
+            "service": "prowlarr", "kind": "indexer", "id": indexer.get("id"), "title": indexer.get("name"),
+            "status": "enabled" if indexer.get("enable") else "disabled", "protocol": indexer.get("protocol"),
+        })
+
+def inventory_requests(client: APIClient, emit: Callable[[dict], None]):
+    for request in page_overseerr_requests(client):
+        media = request.get("media") or {}
+        emit({
+            "service": "overseerr", "kind": "request", "id": request.get("id"),
+            "parent_id": media.get("tmdbId"), "title": f"{request.get('type', '')} tmdb:{media.get('tmdbId', '')}",
+            "status": OVERSEERR_REQUEST_STATUS.get(request.get("status"), request.get("status")),
+            "date": request.get("createdAt"),
+        })
+
+def write_inventory(records: queue.Queue, out, fmt: str) -> Dict[Tuple[str, str], int]:
+    """Write records from the queue until a None sentinel; returns counts per (service, kind)"""
+    counts: Dict[Tuple[str, str], int] = {}
+    writer = None
+    error = None
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=INVENTORY_COLUMNS, extrasaction="ignore")
+        try:
+            writer.writeheader()
+        except OSError as e:
+            error = e
+
+    while True:
+        record = records.get()
+        if record is None:
+            break
+        if error:
+            continue  # keep draining so fetchers never block on a full queue
+        key = (record["service"], record["kind"])
+        counts[key] = counts.get(key, 0) + 1
+        try:
+            if writer:
+                writer.writerow(record)
+            else:
+                out.write(json.dumps({k: v for k, v in record.items() if v is not None}) + "\n")
+        except OSError as e:
+            error = e
+
+    if error:
+        raise error
+    out.flush()
+    return counts
+
+# ============================================================================
+# Daemon
+# ============================================================================
 
-    if status in [200, 201]:
-        print_success(f"Added root folder {path} to {arr_name}")
+def parse_daemon_address(address: str) -> Tuple[int, Any]:
+    """(socket family, address) for a unix socket path, "host:port" or a bare port"""
+    if address.isdigit():
+        return socket.AF_INET, ("127.0.0.1", int(address))
+    match = re.fullmatch(r"([\w.\-]*):(\d+)", address)
+    if match:
+        return socket.AF_INET, (match.group(1) or "127.0.0.1", int(match.group(2)))
+    return socket.AF_UNIX, address
+
+def is_loopback_host(host: str) -> bool:
+    """True for localhost and 127.0.0.0/8 / ::1 literals"""
+    if host == "localhost":
         return True
-    else:
-        print_error(f"Failed to add root folder to {arr_name}: {response}")
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
         return False
 
-def sync_prowlarr_to_arrs(
-    prowlarr_client: APIClient,
-    sonarr_config: Optional[ServiceConfig],
-    radarr_config: Optional[ServiceConfig],
-    dry_run: bool = False
-) -> bool:
-    """Sync Prowlarr indexers to Sonarr/Radarr"""
+def daemon_can_run(args: argparse.Namespace) -> bool:
+    """True for DAEMON_COMMANDS, except a configure that would prompt for input"""
+    if args.command == "configure":
+        return not args.interactive and (args.auto or CONFIG_FILE.exists())
+    return args.command in DAEMON_COMMANDS
 
-    success = True
+class ConfiguratorDaemon:
+    """Runs forwarded subcommands in-process, one at a time.
 
-    # Get existing applications in Prowlarr
-    existing_apps = get_existing_items(prowlarr_client, "/api/v1/applications")
+    The connection pool, circuit breakers, latency stats, discovery cache and
+    Docker inspect cache live as long as the daemon. The GET response cache is
+    still per command, and Docker events keep the inspect cache current.
+    """
 
-    apps_to_add = []
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.following_events = False
 
-    if sonarr_config and sonarr_config.verified:
-        if "Sonarr" not in existing_apps:
-            apps_to_add.append({
-                "name": "Sonarr",
-                "syncLevel": "fullSync",
-                "implementation": "Sonarr",
-                "configContract": "SonarrSettings",
-                "fields": [
-                    {"name": "prowlarrUrl", "value": "http://prowlarr:9696"},
-                    {"name": "baseUrl", "value": sonarr_config.url},
-                    {"name": "apiKey", "value": sonarr_config.api_key},
-                    {"name": "syncCategories", "value": [5000, 5010, 5020, 5030, 5040, 5045, 5050]},
-                ],
-                "tags": [],
-            })
-        else:
-            print_info("Sonarr already configured in Prowlarr")
-
-    if radarr_config and radarr_config.verified:
-        if "Radarr" not in existing_apps:
-            apps_to_add.append({
-                "name": "Radarr",
-                "syncLevel": "fullSync",
-                "implementation": "Radarr",
-                "configContract": "RadarrSettings",
-                "fields": [
-                    {"name": "prowlarrUrl", "value": "http://prowlarr:9696"},
-                    {"name": "baseUrl", "value": radarr_config.url},
-                    {"name": "apiKey", "value": radarr_config.api_key},
-                    {"name": "syncCategories", "value": [2000, 2010, 2020, 2030, 2040, 2045, 2050, 2060]},
-                ],
-                "tags": [],
-            })
-        else:
-            print_info("Radarr already configured in Prowlarr")
+    def run(self, argv: List[str]) -> Tuple[int, str]:
+        """Run one command line and return (exit code, captured output).
 
-    for app in apps_to_add:
-        if dry_run:
-            print_info(f"[DRY-RUN] Would add {app['name']} to Prowlarr")
-            continue
+        Output is captured per thread (see emit), so anything the event-following
+        thread prints stays out of the reply.
+        """
+        with self._lock:
+            _output.lines = []
+            try:
+                code = self._run(argv)
+            finally:
+                lines, _output.lines = _output.lines, None
+        return code, "".join(line + "\n" for line in lines)
 
-        status, response = prowlarr_client.post("/api/v1/applications", app)
-        if status in [200, 201]:
-            print_success(f"Added {app['name']} to Prowlarr")
-        else:
-            print_error(f"Failed to add {app['name']} to Prowlarr: {response}")
-            success = False
+    def _run(self, argv: List[str]) -> int:
+        try:
+            args = build_parser().parse_args(argv)
+            if not daemon_can_run(args):
+                print_error(f"'{args.command}' can't run on the daemon")
+                return 2
+
+            get_response_cache().clear()
+            if self.following_events:
+                get_docker_client().forget_listings()
+            else:
+                get_docker_client().invalidate()
+            get_discovery_cache().refresh = bool(getattr(args, 'refresh', False))
+            try:
+                return run_command(args) or 0
+            finally:
+                persist_state()
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 2
+        except Exception as e:
+            print_error(f"Command failed: {e}")
+            return 1
 
-    # Trigger sync
-    if not dry_run and apps_to_add:
-        print_info("Triggering Prowlarr sync...")
-        prowlarr_client.post("/api/v1/command", {"name": "ApplicationIndexerSync"})
+    def follow_docker_events(self):
+        """Invalidate cached inspects as containers start, stop and get recreated.
 
-    return success
+        While the event stream is down every command starts with a cold Docker cache.
+        """
+        docker = get_docker_client()
+        filters = {"type": ["container"], "event": WATCH_EVENTS}
+        while True:
+            self.following_events = True
+            try:
+                for event in docker.events(filters):
+                    container_id = (event.get("Actor") or {}).get("ID") or event.get("id", "")
+                    docker.invalidate(container_id[:12])
+            except FileNotFoundError:
+                self.following_events = False
+                return  # no Docker API socket and no docker CLI
+            except OSError:
+                pass
+            self.following_events = False
+            docker.invalidate()
+            time.sleep(WATCH_RECONNECT)
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """One JSON line in ({"argv": [...]}), one JSON line out ({"code", "output"})"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line.strip():
+            return  # a liveness check (connect and close)
+        try:
+            request = json.loads(line)
+            argv = [str(arg) for arg in request["argv"]]
+        except (ValueError, KeyError, TypeError):
+            reply = {"code": 2, "output": "Malformed request\n"}
+        else:
+            code, output = self.server.daemon.run(argv)
+            reply = {"code": code, "output": output}
+        try:
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+        except OSError:
+            pass  # the CLI went away (e.g. Ctrl+C)
+
+class UnixDaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TCPDaemonServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def connect_daemon(address: str) -> Optional[socket.socket]:
+    """Connect to a 'serve' daemon, or None if nothing is listening there"""
+    family, target = parse_daemon_address(address)
+    if family == socket.AF_UNIX and not os.path.exists(target):
+        return None
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(DAEMON_CONNECT_TIMEOUT)
+        sock.connect(target)
+    except OSError:
+        sock.close()
+        return None
+    return sock
 
-def configure_bazarr(
-    bazarr_client: APIClient,
-    sonarr_config: Optional[ServiceConfig],
-    radarr_config: Optional[ServiceConfig],
-    dry_run: bool = False
-) -> bool:
-    """Configure Bazarr to connect to Sonarr/Radarr"""
+def forward_to_daemon(argv: List[str], address: str = None, timeout: float = DAEMON_TIMEOUT) -> Optional[int]:
+    """Run argv on a running 'serve' daemon and print its output; None if none is listening"""
+    sock = connect_daemon(address or DAEMON_ADDRESS)
+    if sock is None:
+        return None
 
-    # Get current settings
-    status, settings = bazarr_client.get("/api/system/settings")
-    if status != 200:
-        print_error(f"Failed to get Bazarr settings: {settings}")
-        return False
+    # From here on the command may already be running - never rerun it locally
+    with sock:
+        try:
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps({"argv": argv}).encode("utf-8") + b"\n")
+            reply = json.loads(sock.makefile("rb").readline() or b"null")
+            sys.stdout.write(reply["output"])
+            return int(reply["code"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print_error(f"Lost connection to the configurator daemon: {e}")
+            return 1
 
-    if not isinstance(settings, dict):
-        print_error("Unexpected Bazarr settings format")
-        return False
+# ============================================================================
+# Prometheus Exporter
+# ============================================================================
 
-    updated = False
+def metric_labels(**labels: Any) -> str:
+    """Render a Prometheus label set, e.g. {service="sonarr"}"""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+class MetricsExporter:
+    """Keeps a rendered /metrics page current from a background refresh loop.
+
+    Each refresh checks every configured service and reads the wiring through the
+    reconcile plan, at most `concurrency` requests at a time. Scrapes only read the
+    last rendered page, so any number of scrapers costs the services nothing extra.
+    """
+
+    def __init__(self, interval: float = EXPORTER_INTERVAL, concurrency: int = EXPORTER_CONCURRENCY):
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="exporter")
+        self.page = b""
+        self.scrapes = 0
+        self.refresh_errors = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        get_latency_histograms().enabled = True
+
+    def refresh(self):
+        """Check the services and render a new page (a failed refresh keeps the previous one)"""
+        started = time.monotonic()
+        config = load_config()
+        get_response_cache().clear()
 
-    # Configure Sonarr connection
-    if sonarr_config and sonarr_config.verified:
-        sonarr_settings = settings.get("sonarr", {})
-        if not sonarr_settings.get("ip") or sonarr_settings.get("apikey") != sonarr_config.api_key:
-            settings["sonarr"] = {
-                "ip": sonarr_config.url.replace("http://", "").replace("https://", ""),
-                "port": 8989,
-                "apikey": sonarr_config.api_key,
-                "ssl": False,
-                "base_url": "",
-                "only_monitored": False,
-                "series_sync": 60,
-                "episodes_sync": 60,
-            }
-            updated = True
-            print_info("Configured Sonarr connection in Bazarr")
-
-    # Configure Radarr connection
-    if radarr_config and radarr_config.verified:
-        radarr_settings = settings.get("radarr", {})
-        if not radarr_settings.get("ip") or radarr_settings.get("apikey") != radarr_config.api_key:
-            settings["radarr"] = {
-                "ip": radarr_config.url.replace("http://", "").replace("https://", ""),
-                "port": 7878,
-                "apikey": radarr_config.api_key,
-                "ssl": False,
-                "base_url": "",
-                "only_monitored": False,
-                "movies_sync": 60,
-            }
-            updated = True
-            print_info("Configured Radarr connection in Bazarr")
+        services = [(key, getattr(config, key)) for key in CONFIG_SERVICES]
+        services = [(key, svc) for key, svc in services if svc and svc.enabled]
 
-    if not updated:
-        print_info("Bazarr already configured")
-        return True
+        def check(entry: Tuple[str, ServiceConfig]) -> Tuple[bool, str, float]:
+            key, svc = entry
+            check_started = time.monotonic()
+            with host_semaphore(svc.url):
+                verified, version = verify_service(key.replace('_', '-'), svc.url, svc.api_key)
+            return verified, version, time.monotonic() - check_started
 
-    if dry_run:
-        print_info("[DRY-RUN] Would update Bazarr settings")
-        return True
+        results = list(self.executor.map(check, services))
+        for (_, svc), (verified, _, _) in zip(services, results):
+            svc.verified = verified
 
-    status, response = bazarr_client.post("/api/system/settings", settings)
-    if status in [200, 201, 204]:
-        print_success("Updated Bazarr settings")
-        return True
-    else:
-        print_error(f"Failed to update Bazarr settings: {response}")
-        return False
+        items = desired_state(config)
+        plan = build_plan(items, gather_live_state(items, self.executor))
 
-def configure_overseerr(
-    overseerr_client: APIClient,
-    sonarr_config: Optional[ServiceConfig],
-    radarr_config: Optional[ServiceConfig],
-    plex_config: Optional[ServiceConfig],
-    dry_run: bool = False
-) -> bool:
-    """Configure Overseerr to connect to Sonarr/Radarr/Plex"""
+        names = {get_client(svc.url, svc.api_key).base_url: key for key, svc in services}
+        lines = []
 
-    success = True
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
 
-    # Get existing Radarr servers
-    if radarr_config and radarr_config.verified:
-        status, existing = overseerr_client.get("/api/v1/settings/radarr")
-
-        if status == 200:
-            has_radarr = False
-            if isinstance(existing, list):
-                has_radarr = any(s.get("name") == "Radarr" for s in existing)
-
-            if not has_radarr:
-                payload = {
-                    "name": "Radarr",
-                    "hostname": radarr_config.url.replace("http://", "").replace("https://", "").split(":")[0],
-                    "port": 7878,
-                    "apiKey": radarr_config.api_key,
-                    "useSsl": False,
-                    "activeProfileId": 1,
-                    "activeDirectory": "/data/media/movies",
-                    "is4k": False,
-                    "minimumAvailability": "released",
-                    "isDefault": True,
-                    "externalUrl": radarr_config.url,
-                }
+        family("chimera_service_up", "gauge", "1 if the service answered its status endpoint")
+        for (key, svc), (verified, _, _) in zip(services, results):
+            lines.append(f"chimera_service_up{metric_labels(service=key, url=svc.url)} {int(verified)}")
 
-                if dry_run:
-                    print_info("[DRY-RUN] Would add Radarr to Overseerr")
-                else:
-                    status, response = overseerr_client.post("/api/v1/settings/radarr", payload)
-                    if status in [200, 201]:
-                        print_success("Added Radarr to Overseerr")
-                    else:
-                        print_error(f"Failed to add Radarr to Overseerr: {response}")
-                        success = False
-            else:
-                print_info("Radarr already configured in Overseerr")
-
-    # Get existing Sonarr servers
-    if sonarr_config and sonarr_config.verified:
-        status, existing = overseerr_client.get("/api/v1/settings/sonarr")
-
-        if status == 200:
-            has_sonarr = False
-            if isinstance(existing, list):
-                has_sonarr = any(s.get("name") == "Sonarr" for s in existing)
-
-            if not has_sonarr:
-                payload = {
-                    "name": "Sonarr",
-                    "hostname": sonarr_config.url.replace("http://", "").replace("https://", "").split(":")[0],
-                    "port": 8989,
-                    "apiKey": sonarr_config.api_key,
-                    "useSsl": False,
-                    "activeProfileId": 1,
-                    "activeDirectory": "/data/media/tv",
-                    "activeLanguageProfileId": 1,
-                    "is4k": False,
-                    "isDefault": True,
-                    "externalUrl": sonarr_config.url,
-                }
+        family("chimera_service_info", "gauge", "Version reported by each reachable service")
+        for (key, _), (verified, version, _) in zip(services, results):
+            if verified:
+                lines.append(f"chimera_service_info{metric_labels(service=key, version=version)} 1")
+
+        family("chimera_service_check_seconds", "gauge", "Duration of the last status check")
+        for (key, _), (_, _, elapsed) in zip(services, results):
+            lines.append(f"chimera_service_check_seconds{metric_labels(service=key)} {elapsed:.6f}")
+
+        family("chimera_api_request_duration_seconds", "histogram",
+               "Response time of API requests made by the exporter, by endpoint")
+        histograms = get_latency_histograms()
+        for (base_url, endpoint), series in sorted(histograms.snapshot().items()):
+            service = names.get(base_url, base_url)
+            for bound, count in zip(histograms.buckets, series["counts"]):
+                labels = metric_labels(service=service, endpoint=endpoint, le=f"{bound:g}")
+                lines.append(f"chimera_api_request_duration_seconds_bucket{labels} {count}")
+            labels = metric_labels(service=service, endpoint=endpoint, le="+Inf")
+            lines.append(f"chimera_api_request_duration_seconds_bucket{labels} {series['count']}")
+            labels = metric_labels(service=service, endpoint=endpoint)
+            lines.append(f"chimera_api_request_duration_seconds_sum{labels} {series['sum']:.6f}")
+            lines.append(f"chimera_api_request_duration_seconds_count{labels} {series['count']}")
+
+        family("chimera_integration_wired", "gauge",
+               "1 if the integration is configured as 'configure' would set it up, 0 if missing or out of date")
+        wired = [(item, 1) for item in plan.unchanged] + [(op.item, 0) for op in plan.operations]
+        for item, value in wired:
+            labels = metric_labels(service=names.get(item.client.base_url, item.client.base_url), integration=item.label)
+            lines.append(f"chimera_integration_wired{labels} {value}")
+
+        family("chimera_integration_check_errors", "gauge", "Integrations whose live state could not be read")
+        lines.append(f"chimera_integration_check_errors {len(plan.errors)}")
+
+        family("chimera_exporter_refresh_seconds", "gauge", "Duration of the last refresh")
+        lines.append(f"chimera_exporter_refresh_seconds {time.monotonic() - started:.6f}")
+        family("chimera_exporter_last_refresh_timestamp_seconds", "gauge", "Unix time of the last successful refresh")
+        lines.append(f"chimera_exporter_last_refresh_timestamp_seconds {time.time():.3f}")
+
+        with self._lock:
+            self.page = ("\n".join(lines) + "\n").encode("utf-8")
+        get_latency_history().flush()
+
+    def render(self) -> bytes:
+        """The current page plus the exporter's own counters"""
+        with self._lock:
+            self.scrapes += 1
+            return self.page + (
+                "# HELP chimera_exporter_refresh_errors_total Refreshes that failed\n"
+                "# TYPE chimera_exporter_refresh_errors_total counter\n"
+                f"chimera_exporter_refresh_errors_total {self.refresh_errors}\n"
+                "# HELP chimera_exporter_scrapes_total Scrapes answered\n"
+                "# TYPE chimera_exporter_scrapes_total counter\n"
+                f"chimera_exporter_scrapes_total {self.scrapes}\n"
+            ).encode("utf-8")
+
+    def tick(self) -> float:
+        """Refresh once, quietly; on failure count it and log what the refresh printed"""
+        started = time.monotonic()
+        outer = getattr(_output, "lines", None)
+        _output.lines = []
+        try:
+            self.refresh()
+        except Exception as e:
+            lines, _output.lines = _output.lines, outer
+            with self._lock:
+                self.refresh_errors += 1
+            for line in lines:
+                emit(line)
+            print_warning(f"Metrics refresh failed, still serving the previous page: {e}")
+        finally:
+            _output.lines = outer
+        return time.monotonic() - started
+
+    def run(self, elapsed: float = 0.0):
+        """Refresh every interval (measured start to start) until stopped"""
+        while not self._stop.wait(max(0.0, self.interval - elapsed)):
+            elapsed = self.tick()
+
+    def stop(self):
+        self._stop.set()
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] == "/metrics":
+            self.reply(200, "text/plain; version=0.0.4; charset=utf-8", self.server.exporter.render())
+        elif self.path == "/":
+            self.reply(200, "text/html", b'<html><body><a href="/metrics">Metrics</a></body></html>')
+        else:
+            self.reply(404, "text/plain", b"Not found\n")
 
-                if dry_run:
-                    print_info("[DRY-RUN] Would add Sonarr to Overseerr")
-                else:
-                    status, response = overseerr_client.post("/api/v1/settings/sonarr", payload)
-                    if status in [200, 201]:
-                        print_success("Added Sonarr to Overseerr")
-                    else:
-                        print_error(f"Failed to add Sonarr to Overseerr: {response}")
-                        success = False
-            else:
-                print_info("Sonarr already configured in Overseerr")
+    def reply(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-    return success
+    def log_message(self, format, *args):
+        pass  # scrapes every 15 s would flood the log
+
+class MetricsHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
 
 # ============================================================================
 # Main Commands
@@ -847,12 +4034,18 @@ def load_config() -> Config:
     return Config()
 
 def save_config(config: Config):
-    """Save configuration to file"""
-    # Create config directory if it doesn't exist (for Unraid persistence)
-    CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config.to_dict(), f, indent=2)
-    print_info(f"Configuration saved to {CONFIG_FILE}")
+    """Save configuration to file.
+
+    On Unraid this is the USB flash, so the write is staged and happens once at
+    the end of the run (see flush_writes), and only if the content changed.
+    """
+    if not persistence_enabled():
+        print_info("Replay mode - configuration not saved")
+        return
+    if stage_write(CONFIG_FILE, json.dumps(config.to_dict(), indent=2).encode("utf-8")):
+        print_info(f"Configuration saved to {CONFIG_FILE}")
+    else:
+        print_info(f"Configuration unchanged ({CONFIG_FILE})")
 
 def interactive_setup() -> Config:
     """Interactive setup wizard"""
@@ -942,28 +4135,33 @@ def cmd_discover(args):
     """Discover available services"""
     print_header("Service Discovery")
 
-    discovered = discover_services()
+    discovered = discover_services(cidrs=args.cidr, rate=args.scan_rate, deadline=args.scan_deadline, offline=args.offline)
 
     if not discovered:
         print_warning("No services discovered.")
         return 1
 
-    print(f"\n{Colors.BOLD}Discovered {len(discovered)} services:{Colors.RESET}")
-    for service, url in discovered.items():
-        verified, version = verify_service(service, url)
+    emit(f"\n{Colors.BOLD}Discovered {len(discovered)} services:{Colors.RESET}")
+    if args.offline:
+        for service, url in discovered.items():
+            emit(f"  {Colors.DIM}○{Colors.RESET} {service}: {url}")
+        return 0
+
+    results = verify_services([(service, url, "") for service, url in discovered.items()])
+    for (service, url), (verified, version) in zip(discovered.items(), results):
         status = f"{Colors.GREEN}✓{Colors.RESET}" if verified else f"{Colors.RED}✗{Colors.RESET}"
-        print(f"  {status} {service}: {url}")
+        emit(f"  {status} {service}: {url}")
 
     return 0
 
-def auto_configure(appdata_path: str = None) -> Config:
+def auto_configure(appdata_path: str = None, offline: bool = False) -> Config:
     """Automatically discover and configure all services"""
     print_header("Auto-Configuration Mode")
 
     config = Config()
 
     # Auto-discover services with API keys
-    discovered = auto_discover_with_keys(appdata_path)
+    discovered = auto_discover_with_keys(appdata_path, offline)
 
     # Map discovered services to config
     service_mapping = {
@@ -978,30 +4176,32 @@ def auto_configure(appdata_path: str = None) -> Config:
         "zurg": "zurg",
     }
 
-    for service_key, config_key in service_mapping.items():
-        if service_key in discovered:
-            info = discovered[service_key]
-            url = info.get("url", "")
-            api_key = info.get("api_key", "")
-
-            # Verify the service
-            verified, version = verify_service(service_key, url, api_key)
-
-            setattr(config, config_key, ServiceConfig(
-                name=service_key.replace("-", " ").title().replace(" ", "-"),
-                url=url,
-                api_key=api_key,
-                enabled=True,
-                verified=verified,
-                version=version if verified else ""
-            ))
+    present = [(service_key, config_key) for service_key, config_key in service_mapping.items() if service_key in discovered]
+    results = verify_services([
+        (service_key, discovered[service_key].get("url", ""), discovered[service_key].get("api_key", ""))
+        for service_key, _ in present
+    ])
+
+    for (service_key, config_key), (verified, version) in zip(present, results):
+        info = discovered[service_key]
+        url = info.get("url", "")
+        api_key = info.get("api_key", "")
+
+        setattr(config, config_key, ServiceConfig(
+            name=service_key.replace("-", " ").title().replace(" ", "-"),
+            url=url,
+            api_key=api_key,
+            enabled=True,
+            verified=verified,
+            version=version if verified else ""
+        ))
 
-            if verified:
-                print_success(f"{service_key}: Verified (v{version})" if version else f"{service_key}: Verified")
-            elif api_key:
-                print_warning(f"{service_key}: Discovered but verification failed")
-            else:
-                print_warning(f"{service_key}: Discovered but no API key found")
+        if verified:
+            print_success(f"{service_key}: Verified (v{version})" if version else f"{service_key}: Verified")
+        elif api_key:
+            print_warning(f"{service_key}: Discovered but verification failed")
+        else:
+            print_warning(f"{service_key}: Discovered but no API key found")
 
     # Set paths based on Unraid conventions
     if appdata_path:
@@ -1017,7 +4217,7 @@ def cmd_configure(args):
 
     # Auto mode - fully automatic discovery and configuration
     if hasattr(args, 'auto') and args.auto:
-        config = auto_configure(args.appdata if hasattr(args, 'appdata') else None)
+        config = auto_configure(args.appdata if hasattr(args, 'appdata') else None, args.offline)
     # Load or create config
     elif args.interactive or not CONFIG_FILE.exists():
         config = interactive_setup()
@@ -1028,96 +4228,114 @@ def cmd_configure(args):
     if dry_run:
         print_warning("DRY-RUN MODE - No changes will be made")
 
-    total_steps = 5
-    current_step = 0
+    # Verify services and wire them together; each step starts as soon as
+    # the services it needs are verified (or, with --wait, come up)
+    deadline = time.monotonic() + args.deadline if getattr(args, 'wait', False) else None
+    if deadline is not None:
+        print_info(f"Waiting up to {args.deadline:g}s for services to come up")
+    run_graph(configure_graph(deadline=deadline), config, dry_run)
 
-    # Step 1: Verify all services
-    current_step += 1
-    print_step(current_step, total_steps, "Verifying services...")
+    unreachable = [getattr(config, key) for key in VERIFY_BEFORE_CONFIGURE]
+    if any(svc and svc.enabled and not svc.verified for svc in unreachable):
+        print_warning("Some services are not accessible. Configuration may be incomplete.")
 
-    services_ok = True
-    for key in ['sonarr', 'radarr', 'prowlarr', 'rdt_client']:
-        svc = getattr(config, key)
-        if svc and svc.enabled:
-            url_key = key.replace('_', '-')
-            verified, version = verify_service(url_key, svc.url, svc.api_key)
-            if verified:
-                print_success(f"{svc.name} is accessible")
-                svc.verified = True
-            else:
-                print_error(f"{svc.name} is not accessible: {version}")
-                svc.verified = False
-                services_ok = False
+    # Summary
+    print_header("Configuration Complete")
 
-    if not services_ok:
-        print_warning("Some services are not accessible. Configuration may be incomplete.")
+    if dry_run:
+        print_warning("DRY-RUN MODE - No changes were made")
+        print_info("Run without --dry-run to apply changes")
+    else:
+        print_success("Media stack has been configured!")
+        save_config(config)
 
-    # Step 2: Configure download clients
-    current_step += 1
-    print_step(current_step, total_steps, "Configuring download clients...")
+    return 0
 
-    if config.rdt_client and config.rdt_client.verified:
-        rdt_host = config.rdt_client.url.replace("http://", "").replace("https://", "").split(":")[0]
-        rdt_port = int(config.rdt_client.url.split(":")[-1]) if ":" in config.rdt_client.url.split("/")[-1] else 6500
+def cmd_plan(args):
+    """Show what apply would change, without changing anything"""
+    print_header("Media Stack Plan")
 
-        if config.sonarr and config.sonarr.verified:
-            sonarr_client = APIClient(config.sonarr.url, config.sonarr.api_key)
-            add_download_client_to_arr(sonarr_client, "Sonarr", rdt_host, rdt_port, dry_run)
+    if not CONFIG_FILE.exists():
+        print_error("No configuration found. Run 'configure' first.")
+        return 1
 
-        if config.radarr and config.radarr.verified:
-            radarr_client = APIClient(config.radarr.url, config.radarr.api_key)
-            add_download_client_to_arr(radarr_client, "Radarr", rdt_host, rdt_port, dry_run)
-    else:
-        print_warning("Rdt-Client not configured, skipping download client setup")
+    config = load_config()
+    print_step(1, 2, "Reading live state...")
+    plan = reconcile(config)
 
-    # Step 3: Configure root folders
-    current_step += 1
-    print_step(current_step, total_steps, "Configuring root folders...")
+    print_step(2, 2, "Planned changes")
+    print_plan(plan)
+    return 0
 
-    if config.sonarr and config.sonarr.verified:
-        sonarr_client = APIClient(config.sonarr.url, config.sonarr.api_key)
-        add_root_folder_to_arr(sonarr_client, "Sonarr", config.tv_path, dry_run)
+def cmd_apply(args):
+    """Apply only the changes the plan found"""
+    print_header("Media Stack Apply")
 
-    if config.radarr and config.radarr.verified:
-        radarr_client = APIClient(config.radarr.url, config.radarr.api_key)
-        add_root_folder_to_arr(radarr_client, "Radarr", config.movies_path, dry_run)
+    if not CONFIG_FILE.exists():
+        print_error("No configuration found. Run 'configure' first.")
+        return 1
 
-    # Step 4: Configure Prowlarr sync
-    current_step += 1
-    print_step(current_step, total_steps, "Configuring Prowlarr sync...")
+    config = load_config()
+    print_step(1, 3, "Reading live state...")
+    plan = reconcile(config)
 
-    if config.prowlarr and config.prowlarr.verified:
-        prowlarr_client = APIClient(config.prowlarr.url, config.prowlarr.api_key)
-        sync_prowlarr_to_arrs(prowlarr_client, config.sonarr, config.radarr, dry_run)
-    else:
-        print_warning("Prowlarr not configured, skipping indexer sync")
+    print_step(2, 3, "Planned changes")
+    print_plan(plan)
 
-    # Step 5: Configure Bazarr and Overseerr
-    current_step += 1
-    print_step(current_step, total_steps, "Configuring auxiliary services...")
+    print_step(3, 3, "Applying...")
+    if not plan.operations:
+        print_success("Everything is up to date")
+        return 0
 
-    if config.bazarr and config.bazarr.verified:
-        bazarr_client = APIClient(config.bazarr.url, config.bazarr.api_key)
-        configure_bazarr(bazarr_client, config.sonarr, config.radarr, dry_run)
+    success = apply_plan(plan)
+    save_config(config)
+    return 0 if success else 1
 
-    if config.overseerr and config.overseerr.verified:
-        overseerr_client = APIClient(config.overseerr.url, config.overseerr.api_key)
-        configure_overseerr(overseerr_client, config.sonarr, config.radarr, config.plex, dry_run)
+def print_latency_history():
+    """p50/p95 of service checks over each HISTORY_WINDOWS window"""
+    print_header("Service Latency History")
 
-    # Summary
-    print_header("Configuration Complete")
+    if sqlite3 is None:
+        print_error("This Python has no sqlite3 module - latency history is not recorded")
+        return 1
+    history = get_latency_history().summary()
+    if history is None:
+        return 1
+    if not history:
+        print_warning(f"No checks recorded yet in {HISTORY_DB}. Run 'status' or keep 'exporter' running.")
+        return 0
 
-    if dry_run:
-        print_warning("DRY-RUN MODE - No changes were made")
-        print_info("Run without --dry-run to apply changes")
-    else:
-        print_success("Media stack has been configured!")
-        save_config(config)
+    def cell(stats: Optional[Dict[str, Any]]) -> str:
+        if not stats or stats["p50"] is None:
+            return "-"
+        return f"{stats['p50'] * 1000:.0f} / {stats['p95'] * 1000:.0f} ms"
+
+    windows = [window for window, _ in HISTORY_WINDOWS]
+    emit(f"\n{Colors.BOLD}{'Service':<12}" + "".join(f"{window + ' p50 / p95':>22}" for window in windows)
+          + f"{'failed (' + windows[-1] + ')':>17}{Colors.RESET}")
+
+    order = [key.replace('_', '-') for key in CONFIG_SERVICES]
+    for service in sorted(history, key=lambda name: (order.index(name) if name in order else len(order), name)):
+        stats = history[service]
+        longest = stats.get(windows[-1], {})
+        row = f"{service:<12}" + "".join(f"{cell(stats.get(window)):>22}" for window in windows)
+        row += f"{longest.get('failures', 0):>7} of {longest.get('checks', 0):<6}"
+
+        day, week = stats.get("1d"), stats.get("1w")
+        if day and week and day["p50"] and week["p50"] and day["p50"] > week["p50"] * HISTORY_DEGRADED_RATIO:
+            emit(f"{Colors.YELLOW}{row}  slower than usual{Colors.RESET}")
+        else:
+            emit(row)
 
+    emit("")
+    print_info(f"History: {HISTORY_DB} (checks kept {HISTORY_RAW_DAYS} days, hourly rollups {HISTORY_ROLLUP_DAYS} days)")
     return 0
 
 def cmd_status(args):
     """Check integration status"""
+    if getattr(args, 'history', False):
+        return print_latency_history()
+
     print_header("Media Stack Status")
 
     config = load_config()
@@ -1127,26 +4345,32 @@ def cmd_status(args):
         return 1
 
     # Check each service
-    print(f"\n{Colors.BOLD}Service Status:{Colors.RESET}")
+    emit(f"\n{Colors.BOLD}Service Status:{Colors.RESET}")
 
-    for key in ['sonarr', 'radarr', 'prowlarr', 'bazarr', 'overseerr', 'plex', 'rdt_client', 'tautulli', 'zurg']:
+    keys = CONFIG_SERVICES
+    configured = [(key, getattr(config, key, None)) for key in keys if getattr(config, key, None)]
+    results = dict(zip(
+        [key for key, _ in configured],
+        verify_services([(key.replace('_', '-'), svc.url, svc.api_key) for key, svc in configured])
+    ))
+
+    for key in keys:
         svc = getattr(config, key, None)
         if svc:
-            url_key = key.replace('_', '-')
-            verified, version = verify_service(url_key, svc.url, svc.api_key)
+            verified, version = results[key]
             if verified:
                 print_success(f"{svc.name}: {svc.url}" + (f" (v{version})" if version else ""))
             else:
                 print_error(f"{svc.name}: {svc.url} - {version}")
         else:
-            print(f"  {Colors.DIM}○ {key}: not configured{Colors.RESET}")
+            emit(f"  {Colors.DIM}○ {key}: not configured{Colors.RESET}")
 
     # Check integrations
-    print(f"\n{Colors.BOLD}Integrations:{Colors.RESET}")
+    emit(f"\n{Colors.BOLD}Integrations:{Colors.RESET}")
 
     # Check Sonarr download clients
     if config.sonarr and config.sonarr.verified:
-        client = APIClient(config.sonarr.url, config.sonarr.api_key)
+        client = get_client(config.sonarr.url, config.sonarr.api_key)
         status, response = client.get("/api/v3/downloadclient")
         if status == 200 and isinstance(response, list):
             debrid = any(c.get("name") == "Chimera-Debrid" for c in response)
@@ -1157,7 +4381,7 @@ def cmd_status(args):
 
     # Check Radarr download clients
     if config.radarr and config.radarr.verified:
-        client = APIClient(config.radarr.url, config.radarr.api_key)
+        client = get_client(config.radarr.url, config.radarr.api_key)
         status, response = client.get("/api/v3/downloadclient")
         if status == 200 and isinstance(response, list):
             debrid = any(c.get("name") == "Chimera-Debrid" for c in response)
@@ -1168,7 +4392,7 @@ def cmd_status(args):
 
     # Check Prowlarr applications
     if config.prowlarr and config.prowlarr.verified:
-        client = APIClient(config.prowlarr.url, config.prowlarr.api_key)
+        client = get_client(config.prowlarr.url, config.prowlarr.api_key)
         status, response = client.get("/api/v1/applications")
         if status == 200 and isinstance(response, list):
             apps = [a.get("name") for a in response]
@@ -1181,13 +4405,80 @@ def cmd_status(args):
             else:
                 print_warning("Prowlarr → Radarr not configured")
 
-    print(f"\n{Colors.BOLD}Paths:{Colors.RESET}")
+    emit(f"\n{Colors.BOLD}Paths:{Colors.RESET}")
     print_info(f"Movies: {config.movies_path}")
     print_info(f"TV Shows: {config.tv_path}")
     print_info(f"Downloads: {config.downloads_path}")
 
     return 0
 
+def cmd_inventory(args):
+    """Export what Sonarr/Radarr/Prowlarr/Overseerr hold as NDJSON or CSV"""
+    log = sys.stderr
+
+    if not CONFIG_FILE.exists():
+        print("No configuration found. Run 'configure' first.", file=log)
+        return 1
+    config = load_config()
+
+    kinds = set(args.kinds.split(",")) if args.kinds else set(INVENTORY_KINDS)
+    if args.episodes:
+        kinds.add("episodes")
+
+    sources = []
+    if kinds & {"series", "episodes"} and config.sonarr:
+        client = get_client(config.sonarr.url, config.sonarr.api_key)
+        sources.append(("sonarr", lambda emit, c=client: inventory_series(c, emit, "episodes" in kinds)))
+    if "movies" in kinds and config.radarr:
+        client = get_client(config.radarr.url, config.radarr.api_key)
+        sources.append(("radarr", lambda emit, c=client: inventory_movies(c, emit)))
+    if "indexers" in kinds and config.prowlarr:
+        client = get_client(config.prowlarr.url, config.prowlarr.api_key)
+        sources.append(("prowlarr", lambda emit, c=client: inventory_indexers(c, emit)))
+    if "requests" in kinds and config.overseerr:
+        client = get_client(config.overseerr.url, config.overseerr.api_key)
+        sources.append(("overseerr", lambda emit, c=client: inventory_requests(c, emit)))
+
+    if not sources:
+        print("No configured services match the requested kinds.", file=log)
+        return 1
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    records = queue.Queue(maxsize=INVENTORY_QUEUE_SIZE)
+    started = time.monotonic()
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(sources) + 1) as executor:
+            writer = executor.submit(write_inventory, records, out, args.format)
+            fetches = [(name, executor.submit(fetch, records.put)) for name, fetch in sources]
+
+            failed = 0
+            try:
+                for name, future in fetches:
+                    try:
+                        future.result()
+                    except (OSError, ValueError, http.client.HTTPException, zlib.error) as e:
+                        failed += 1
+                        print(f"{name}: inventory incomplete - {e}", file=log)
+            finally:
+                # The writer only stops on the sentinel - send it whatever happened above
+                records.put(None)
+            counts = writer.result()
+    except OSError as e:
+        # e.g. BrokenPipeError from `inventory | head`
+        print(f"Failed to write inventory to {args.output}: {e}", file=log)
+        if isinstance(e, BrokenPipeError) and out is sys.stdout:
+            # Otherwise Python reports the pipe again when it flushes stdout at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = ", ".join(f"{count} {service} {kind}" for (service, kind), count in sorted(counts.items()))
+    print(f"Exported {summary or 'nothing'} in {time.monotonic() - started:.1f}s", file=log)
+    return 1 if failed else 0
+
 def cmd_extract_keys(args):
     """Extract and display API keys from service config files"""
     print_header("API Key Extraction")
@@ -1219,11 +4510,163 @@ def cmd_extract_keys(args):
     return 0
 
 
+def cmd_watch(args):
+    """Reconfigure affected services whenever their containers start or stop"""
+    print_header("Watching Docker Events")
+
+    if not CONFIG_FILE.exists():
+        print_error("No configuration found. Run 'configure' first.")
+        return 1
+
+    config = load_config()
+    events = queue.Queue()
+    threading.Thread(target=stream_events, args=(events,), daemon=True).start()
+    print_info(f"Listening for container {'/'.join(WATCH_EVENTS)} events (Ctrl+C to stop)")
+
+    try:
+        while True:
+            batch = collect_event_batch(events, args.debounce)
+            if apply_event_batch(config, batch, args.appdata, args.dry_run) and not args.dry_run:
+                save_config(config)
+            flush_writes()
+            get_applied_ledger().save()
+            get_latency_stats().save()
+    except KeyboardInterrupt:
+        print_info("Stopped watching")
+    return 0
+
+def cmd_serve(args):
+    """Stay resident and answer forwarded commands with warm caches"""
+    print_header("Configurator Daemon")
+
+    family, address = parse_daemon_address(args.listen)
+    if family == socket.AF_UNIX:
+        existing = connect_daemon(args.listen)
+        if existing is not None:
+            existing.close()
+            print_error(f"A daemon is already listening on {address}")
+            return 1
+        Path(address).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(address):
+            os.unlink(address)  # stale socket from a daemon that didn't shut down cleanly
+        server = UnixDaemonServer(address, DaemonRequestHandler)
+        os.chmod(address, 0o660)
+    else:
+        # The daemon has no authentication and answers apply, so anyone who can reach
+        # the port can rewire the stack
+        if not is_loopback_host(address[0]) and not args.allow_remote:
+            print_error(f"Refusing to listen on {address[0]} - the daemon has no authentication. "
+                        "Use a localhost address, or --allow-remote on a trusted network")
+            return 1
+        try:
+            server = TCPDaemonServer(address, DaemonRequestHandler)
+        except OSError as e:
+            print_error(f"Cannot listen on {address[0]}:{address[1]}: {e}")
+            return 1
+
+    server.daemon = ConfiguratorDaemon()
+    get_pool().idle_timeout = DAEMON_POOL_IDLE
+
+    docker = get_docker_client()
+    if docker.api_available or docker.cli_available:
+        threading.Thread(target=server.daemon.follow_docker_events, daemon=True).start()
+
+    # Open connections to every configured service up front
+    if CONFIG_FILE.exists():
+        config = load_config()
+        keys = [key for key in CONFIG_SERVICES if getattr(config, key, None)]
+        capture_output(verify_config_services, config, keys)
+
+    print_info(f"Listening on {args.listen} - {', '.join(DAEMON_COMMANDS)} are answered here (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print_info("Stopped")
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+    return 0
+
+def cmd_wait_ready(args):
+    """Block until every required service answers, or the deadline passes"""
+    print_header("Waiting for Services")
+
+    if not CONFIG_FILE.exists():
+        print_error("No configuration found. Run 'configure' first.")
+        return 1
+    config = load_config()
+
+    keys = [key.replace('-', '_') for key in args.services] if args.services else READY_SERVICES
+    services = [(key, getattr(config, key, None)) for key in keys]
+    missing = [key for key, svc in services if not svc]
+    if args.services and missing:
+        print_error(f"Not configured: {', '.join(missing)}")
+        return 1
+    services = [(key, svc) for key, svc in services if svc and svc.enabled]
+    if not services:
+        print_warning("No services to wait for")
+        return 0
+
+    print_info(f"Polling {', '.join(svc.name for _, svc in services)} (deadline {args.deadline:g}s)")
+    deadline = time.monotonic() + args.deadline
+
+    def wait(entry: Tuple[str, ServiceConfig]) -> Tuple[bool, str, float]:
+        key, svc = entry
+        ready, version, waited = wait_for_service(key.replace('_', '-'), svc.url, svc.api_key, deadline)
+        if ready:
+            print_success(f"{svc.name} ready after {waited:.1f}s" + (f" (v{version})" if version else ""))
+        else:
+            print_error(f"{svc.name}: {version}")
+        return ready, version, waited
+
+    with ThreadPoolExecutor(max_workers=len(services), thread_name_prefix="ready") as executor:
+        results = list(executor.map(wait, services))
+
+    return 0 if all(ready for ready, _, _ in results) else 1
+
+def cmd_exporter(args):
+    """Serve Prometheus metrics from a snapshot refreshed in the background"""
+    print_header("Metrics Exporter")
+
+    if not CONFIG_FILE.exists():
+        print_error("No configuration found. Run 'configure' first.")
+        return 1
+
+    family, address = parse_daemon_address(args.listen)
+    if family != socket.AF_INET:
+        print_error(f"--listen must be [host:]port, not {args.listen}")
+        return 1
+    try:
+        server = MetricsHTTPServer(address, MetricsRequestHandler)
+    except OSError as e:
+        print_error(f"Cannot listen on {address[0]}:{address[1]}: {e}")
+        return 1
+
+    exporter = MetricsExporter(interval=args.interval, concurrency=args.concurrency)
+    server.exporter = exporter
+    get_pool().idle_timeout = max(POOL_IDLE_TIMEOUT, args.interval * 2)
+
+    print_info("Taking the first snapshot...")
+    threading.Thread(target=exporter.run, args=(exporter.tick(),), daemon=True).start()
+
+    print_info(f"Serving http://{address[0]}:{address[1]}/metrics - refreshed every {args.interval:g}s, "
+               f"{args.concurrency} requests at a time (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print_info("Stopped")
+    finally:
+        exporter.stop()
+        server.server_close()
+    return 0
+
 def cmd_reset(args):
     """Reset configuration"""
     if CONFIG_FILE.exists():
         if args.force or input("Delete configuration? [y/N]: ").strip().lower() == 'y':
             CONFIG_FILE.unlink()
+            get_applied_ledger().clear()
             print_success("Configuration deleted")
         else:
             print_info("Cancelled")
@@ -1235,7 +4678,7 @@ def cmd_reset(args):
 # Main Entry Point
 # ============================================================================
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Media Stack Configurator - Automated cross-configuration for arr suite",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -1244,49 +4687,168 @@ Examples:
   %(prog)s discover             Scan for available services
   %(prog)s configure            Run interactive configuration
   %(prog)s configure --dry-run  Preview changes without applying
+  %(prog)s configure --auto --wait   Configure as soon as each service is up
+  %(prog)s wait-ready           Block until the stack answers (e.g. after array start)
+  %(prog)s plan                 Show exactly what would be created or updated
+  %(prog)s apply                Apply only those changes
   %(prog)s status               Check current integration status
+  %(prog)s watch                Reconfigure when containers are recreated
+  %(prog)s inventory -o lib.csv --format csv   Export library contents
   %(prog)s reset                Clear saved configuration
+  %(prog)s --record run.json status   Capture every response for later replay
+  %(prog)s --replay run.json status   Re-run offline against a capture
+  %(prog)s serve                Keep caches warm; status/discover/plan/apply use it
+  %(prog)s exporter             Serve Prometheus metrics on :9707/metrics
+  %(prog)s --trace run.trace.json configure   Time every call (open in ui.perfetto.dev)
         """
     )
 
+    parser.add_argument('--local', action='store_true', help="Don't forward to a running 'serve' daemon")
+
+    capture = parser.add_mutually_exclusive_group()
+    capture.add_argument('--record', metavar='FILE', type=Path, help='Record every HTTP/Docker/probe interaction to FILE')
+    capture.add_argument('--replay', metavar='FILE', type=Path, help='Serve all interactions from a recording (no network, nothing saved)')
+    parser.add_argument('--trace', metavar='FILE', type=Path,
+                        help='Write a Chrome trace-event timeline to FILE and print the slowest operations')
+
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
     # discover
     discover_parser = subparsers.add_parser('discover', help='Discover available services')
+    discover_parser.add_argument('--cidr', action='append', help='Network to port-scan, e.g. 192.168.1.0/24 (repeatable, default: Docker bridge)')
+    discover_parser.add_argument('--scan-rate', type=float, default=SCAN_RATE, help=f'Max new connections per second (default: {SCAN_RATE})')
+    discover_parser.add_argument('--refresh', action='store_true', help='Ignore the discovery cache and rescan every container')
+    discover_parser.add_argument('--offline', action='store_true', help='Only read Unraid dockerMan templates (no Docker, no probing)')
+    discover_parser.add_argument('--scan-deadline', type=float, default=SCAN_DEADLINE, help=f'Overall port-scan deadline in seconds (default: {SCAN_DEADLINE})')
 
     # configure
     configure_parser = subparsers.add_parser('configure', help='Configure media stack integrations')
     configure_parser.add_argument('--dry-run', action='store_true', help='Preview changes without applying')
     configure_parser.add_argument('--interactive', '-i', action='store_true', help='Force interactive mode')
     configure_parser.add_argument('--auto', '-a', action='store_true', help='Fully automatic mode - discover services and extract API keys')
+    configure_parser.add_argument('--refresh', action='store_true', help='Ignore the discovery cache and rescan every container')
+    configure_parser.add_argument('--offline', action='store_true', help='With --auto, discover from Unraid dockerMan templates only')
     configure_parser.add_argument('--appdata', type=str, default='/mnt/user/appdata', help='Path to appdata directory (default: /mnt/user/appdata)')
+    configure_parser.add_argument('--wait', action='store_true', help='Wait for services still starting up; each step starts as soon as its services are ready')
+    configure_parser.add_argument('--deadline', type=float, default=READY_DEADLINE, help=f'With --wait, seconds to wait in total (default: {READY_DEADLINE:g})')
+
+    # wait-ready
+    wait_parser = subparsers.add_parser('wait-ready', help='Wait until the configured services answer (after array start / redeploy)')
+    wait_parser.add_argument('--services', nargs='+', metavar='SERVICE', help=f"Services to wait for (default: {' '.join(READY_SERVICES)})")
+    wait_parser.add_argument('--deadline', type=float, default=READY_DEADLINE, help=f'Seconds to wait in total (default: {READY_DEADLINE:g})')
 
     # status
     status_parser = subparsers.add_parser('status', help='Check integration status')
+    status_parser.add_argument('--history', action='store_true', help='Show p50/p95 check latency per service over the last hour, day and week')
 
     # extract-keys
     extract_parser = subparsers.add_parser('extract-keys', help='Extract API keys from service config files')
     extract_parser.add_argument('--appdata', type=str, default='/mnt/user/appdata', help='Path to appdata directory')
 
+    # plan / apply
+    subparsers.add_parser('plan', help='Diff live service state against the config')
+    subparsers.add_parser('apply', help='Create or update only what the plan reports')
+
+    # inventory
+    inventory_parser = subparsers.add_parser('inventory', help='Export library contents (series, movies, indexers, requests)')
+    inventory_parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help='Output format (default: ndjson)')
+    inventory_parser.add_argument('--output', '-o', type=str, default='-', help='Output file (default: stdout)')
+    inventory_parser.add_argument('--kinds', type=str, help=f'Comma-separated kinds (default: {",".join(INVENTORY_KINDS)})')
+    inventory_parser.add_argument('--episodes', action='store_true', help='Also export every Sonarr episode (one request per series)')
+
+    # watch
+    watch_parser = subparsers.add_parser('watch', help='Reconfigure automatically on Docker container events')
+    watch_parser.add_argument('--debounce', type=float, default=WATCH_DEBOUNCE, help=f'Seconds of quiet that end an event burst (default: {WATCH_DEBOUNCE})')
+    watch_parser.add_argument('--dry-run', action='store_true', help='Preview changes without applying')
+    watch_parser.add_argument('--appdata', type=str, default='/mnt/user/appdata', help='Path to appdata directory (for new services\' API keys)')
+
     # reset
     reset_parser = subparsers.add_parser('reset', help='Reset configuration')
     reset_parser.add_argument('--force', '-f', action='store_true', help='Skip confirmation')
 
-    args = parser.parse_args()
+    # serve
+    serve_parser = subparsers.add_parser('serve', help='Run as a resident daemon with warm caches')
+    serve_parser.add_argument('--listen', type=str, default=DAEMON_ADDRESS, help=f'Unix socket path, or [host:]port for localhost TCP (default: {DAEMON_ADDRESS})')
+    serve_parser.add_argument('--allow-remote', action='store_true', help='Allow --listen on a non-loopback address (no authentication - trusted networks only)')
 
-    if not args.command:
-        parser.print_help()
-        return 0
+    # exporter
+    exporter_parser = subparsers.add_parser('exporter', help='Serve Prometheus metrics for stack health and API latency')
+    exporter_parser.add_argument('--listen', type=str, default=EXPORTER_LISTEN, help=f'[host:]port to serve /metrics on (default: {EXPORTER_LISTEN})')
+    exporter_parser.add_argument('--interval', type=float, default=EXPORTER_INTERVAL, help=f'Seconds between refreshes (default: {EXPORTER_INTERVAL:g})')
+    exporter_parser.add_argument('--concurrency', type=int, default=EXPORTER_CONCURRENCY, help=f'Requests in flight during a refresh (default: {EXPORTER_CONCURRENCY})')
+
+    return parser
 
+def run_command(args: argparse.Namespace) -> int:
     commands = {
         'discover': cmd_discover,
         'configure': cmd_configure,
         'status': cmd_status,
         'reset': cmd_reset,
         'extract-keys': cmd_extract_keys,
+        'watch': cmd_watch,
+        'inventory': cmd_inventory,
+        'plan': cmd_plan,
+        'apply': cmd_apply,
+        'serve': cmd_serve,
+        'exporter': cmd_exporter,
+        'wait-ready': cmd_wait_ready,
     }
-
     return commands[args.command](args)
 
+def persist_state():
+    """Write everything a run may have changed (each write is skipped if unchanged)"""
+    flush_writes()
+    get_applied_ledger().save()
+    get_latency_stats().save()
+    get_latency_history().flush()
+    get_transport().save()
+
+def main(argv: List[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.record:
+        set_transport(RecordingTransport(get_transport(), args.record))
+    elif args.replay:
+        try:
+            set_transport(ReplayTransport(args.replay))
+        except (OSError, ValueError, KeyError) as e:
+            print_error(f"Cannot load recording {args.replay}: {e}")
+            return 1
+
+    # Recordings bypass the discovery cache so a capture holds every lookup it needs
+    if getattr(args, 'refresh', False) or args.record or args.replay:
+        get_discovery_cache().refresh = True
+
+    # ...and the applied ledger, whose state would change which lookups a run makes
+    if args.record or args.replay:
+        set_applied_ledger(AppliedLedger(persist=False))
+
+    if not args.command:
+        parser.print_help()
+        return 0
+
+    # A trace has to time this process, so it never goes through the daemon
+    if daemon_can_run(args) and not (args.local or args.record or args.replay or args.trace):
+        # configure --wait may legitimately run for its whole deadline
+        timeout = DAEMON_TIMEOUT + (args.deadline if getattr(args, 'wait', False) else 0)
+        code = forward_to_daemon(argv, timeout=timeout)
+        if code is not None:
+            return code
+
+    tracer = get_tracer()
+    tracer.enabled = bool(args.trace)
+    try:
+        with tracer.span(args.command, "command"):
+            return run_command(args)
+    finally:
+        persist_state()
+        if args.trace:
+            tracer.save(args.trace)
+            tracer.print_summary()
+            print_info(f"Trace written to {args.trace} (open in https://ui.perfetto.dev)")
+
 if __name__ == "__main__":
     sys.exit(main())
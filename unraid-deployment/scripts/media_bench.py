@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Media Configurator Benchmark
+============================
+Runs media_configurator.py end to end against local stand-ins and reports
+wall time, request counts and peak RSS per scenario - no Docker, no real
+services, nothing outside a temporary directory is touched.
+
+Stand-ins:
+- One HTTP server per service (Sonarr, Radarr, Prowlarr, Bazarr, Overseerr,
+  Plex, Rdt-Client, Tautulli, Zurg) with configurable latency, failure rate
+  (HTTP 503) and collection sizes
+- A Docker Engine API on a unix socket (DOCKER_HOST), half the containers
+  labeled and half matched by name
+- An appdata tree with config.xml / config.yaml / config.ini API keys
+
+Usage:
+    python3 media_bench.py                       # run and compare with the baseline
+    python3 media_bench.py --save-baseline       # record the baseline
+    python3 media_bench.py --latency 50 --failure-rate 0.05 --collection-size 500
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+CONFIGURATOR = Path(__file__).parent / "media_configurator.py"
+BASELINE_FILE = Path(__file__).parent / "media_bench_baseline.json"
+
+# Wall-time increase over the baseline that counts as a regression (requests must not grow at all)
+WALL_TOLERANCE = 0.25
+SCENARIO_TIMEOUT = 300
+
+# Status endpoint and version for every stand-in
+SERVICES = {
+    "sonarr": ("/api/v3/system/status", "4.0.0.0"),
+    "radarr": ("/api/v3/system/status", "5.0.0.0"),
+    "prowlarr": ("/api/v1/system/status", "1.0.0.0"),
+    "bazarr": ("/api/system/status", "1.4.0"),
+    "overseerr": ("/api/v1/status", "1.33.0"),
+    "plex": ("/identity", "1.40.0"),
+    "rdt-client": ("/api/settings", ""),
+    "tautulli": ("/api/v2", "2.13.0"),
+    "zurg": ("/api/v1/system/status", ""),
+}
+
+# Container-side ports the configurator expects (mirrors DEFAULT_PORTS in media_configurator.py)
+DEFAULT_PORTS = {
+    "sonarr": 8989, "radarr": 7878, "prowlarr": 9696, "bazarr": 6767, "overseerr": 5055,
+    "plex": 32400, "rdt-client": 6500, "tautulli": 8181, "zurg": 9090,
+}
+
+# Collections seeded with unrelated objects so list lookups have something to wade through
+SEEDED_COLLECTIONS = {
+    "sonarr": ["/api/v3/downloadclient", "/api/v3/rootfolder", "/api/v3/series"],
+    "radarr": ["/api/v3/downloadclient", "/api/v3/rootfolder", "/api/v3/movie"],
+    "prowlarr": ["/api/v1/applications", "/api/v1/indexer"],
+}
+
+# Each repeat runs these in order against one fresh state directory,
+# so "configure-warm" sees the caches and ledger "configure-cold" left behind
+SCENARIOS = [
+    ("extract-keys", ["extract-keys", "--appdata", "{appdata}"]),
+    ("discover", ["discover"]),
+    ("configure-cold", ["configure", "--auto", "--appdata", "{appdata}"]),
+    ("configure-warm", ["configure", "--auto", "--appdata", "{appdata}"]),
+    ("status", ["status"]),
+]
+
+# ============================================================================
+# Stand-in Services
+# ============================================================================
+
+class StandIn:
+    """Shared state for one fake service: its objects, request counter and behaviour"""
+
+    def __init__(self, service: str, latency: float, failure_rate: float, collection_size: int, seed: int):
+        self.service = service
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.collection_size = collection_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.failures = 0
+            self.next_id = 1
+            self.collections: Dict[str, List[Dict[str, Any]]] = {}
+            self.settings: Dict[str, Any] = {"general": {}, "sonarr": {}, "radarr": {}}
+            for collection in SEEDED_COLLECTIONS.get(self.service, []):
+                self.collections[collection] = [self._seed(collection) for _ in range(self.collection_size)]
+
+    def _seed(self, collection: str) -> Dict[str, Any]:
+        item_id = self.next_id
+        self.next_id += 1
+        name = f"bench-{collection.rsplit('/', 1)[-1]}-{item_id}"
+        return {"id": item_id, "name": name, "title": name, "path": f"/bench/{name}",
+                "fields": [{"name": "host", "value": "10.0.0.1"}, {"name": "port", "value": 1000 + item_id}]}
+
+    def admit(self) -> bool:
+        """Count a request, wait out the latency and decide whether it fails"""
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.failure_rate
+            self.failures += failed
+        if self.latency:
+            time.sleep(self.latency)
+        return not failed
+
+    def handle(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        status_path, version = SERVICES[self.service]
+        if method == "GET" and path == status_path:
+            return 200, {"version": version, "Version": version, "response": {"result": "success"}}
+        if path == "/api/system/settings":
+            if method == "GET":
+                return 200, self.settings
+            self.settings = body if isinstance(body, dict) else self.settings
+            return 204, None
+        if path.endswith("/command"):
+            return 201, {"id": 1, "name": (body or {}).get("name", "")}
+
+        with self.lock:
+            parts = path.rstrip("/").rsplit("/", 1)
+            if len(parts) == 2 and parts[1].isdigit():
+                items = self.collections.get(parts[0], [])
+                index = next((i for i, item in enumerate(items) if item.get("id") == int(parts[1])), None)
+                if index is None:
+                    return 404, {"message": "NotFound"}
+                if method == "PUT":
+                    items[index] = dict(body or {}, id=int(parts[1]))
+                elif method == "DELETE":
+                    return 200, items.pop(index)
+                return 200, items[index]
+
+            items = self.collections.setdefault(path, [])
+            if method == "POST":
+                created = dict(body or {}, id=self.next_id)
+                self.next_id += 1
+                items.append(created)
+                return 201, created
+            return 200, items
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        standin: StandIn = self.server.standin
+        if not standin.admit():
+            return self._reply(503, {"message": "Service Unavailable (injected)"})
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = None
+        status, data = standin.handle(method, urlsplit(self.path).path, body)
+        self._reply(status, data)
+
+    def _reply(self, status: int, data: Any):
+        payload = b"" if data is None else json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_PUT(self):
+        self._serve("PUT")
+
+    def do_DELETE(self):
+        self._serve("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+# ============================================================================
+# Stand-in Docker Engine API
+# ============================================================================
+
+class FakeDocker:
+    """Containers for every stand-in: even ones labeled com.chimera.*, odd ones matched by name"""
+
+    def __init__(self, ports: Dict[str, int]):
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.containers = []
+        self.inspect = {}
+        for index, (service, port) in enumerate(ports.items()):
+            container_id = f"{index:02d}" + "bench" * 12
+            labels = {"com.chimera.service": service, "com.chimera.port": str(port)} if index % 2 == 0 else {}
+            self.containers.append({
+                "Id": container_id, "Names": [f"/{service}"], "Image": f"bench/{service}",
+                "State": "running", "Status": "Up", "Labels": labels,
+            })
+            self.inspect[container_id[:12]] = {
+                "Id": container_id, "Image": f"sha256:{service}", "State": {"StartedAt": "2024-01-01T00:00:00Z"},
+                "NetworkSettings": {
+                    "Networks": {"bridge": {"IPAddress": "127.0.0.1"}},
+                    "Ports": {"%d/tcp" % DEFAULT_PORTS[service]: [{"HostIp": "0.0.0.0", "HostPort": str(port)}]},
+                },
+            }
+
+    def get(self, path: str) -> Tuple[int, Any]:
+        with self.lock:
+            self.requests += 1
+        parts = urlsplit(path)
+        if parts.path == "/containers/json":
+            filters = json.loads(unquote(parse_qs(parts.query).get("filters", ["{}"])[0]) or "{}")
+            containers = self.containers
+            for label in filters.get("label", []):
+                containers = [c for c in containers if label.split("=", 1)[0] in c["Labels"]]
+            return 200, containers
+        if parts.path.startswith("/containers/"):
+            info = self.inspect.get(parts.path.split("/")[2][:12])
+            return (200, info) if info else (404, {"message": "No such container"})
+        if parts.path.startswith("/networks/"):
+            return 200, {"IPAM": {"Config": [{"Subnet": "127.0.0.0/30", "Gateway": "127.0.0.1"}]}}
+        if parts.path in ("/_ping", "/version"):
+            return 200, {"ApiVersion": "1.43"}
+        return 404, {"message": "page not found"}
+
+class DockerHandler(StandInHandler):
+    def address_string(self):
+        return "docker"
+
+    def do_GET(self):
+        status, data = self.server.docker.get(self.path)
+        self._reply(status, data)
+
+class DockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+# ============================================================================
+# Bench Environment
+# ============================================================================
+
+class Bench:
+    """Stand-ins, fake Docker socket and appdata under one temporary directory"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.root = Path(tempfile.mkdtemp(prefix="chimera-bench-"))
+        self.appdata = self.root / "appdata"
+        self.standins: Dict[str, StandIn] = {}
+        self.servers = []
+
+        for index, service in enumerate(SERVICES):
+            standin = StandIn(service, args.latency / 1000.0, args.failure_rate, args.collection_size,
+                              args.seed + index)
+            server = StandInServer(("127.0.0.1", 0), StandInHandler)
+            server.standin = standin
+            standin.port = server.server_address[1]
+            self.standins[service] = standin
+            self._serve(server)
+
+        self.docker = FakeDocker({service: self.standins[service].port for service in SERVICES})
+        docker_server = DockerServer(str(self.root / "docker.sock"), DockerHandler)
+        docker_server.docker = self.docker
+        self._serve(docker_server)
+
+        self._write_appdata()
+
+    def _serve(self, server: socketserver.BaseServer):
+        self.servers.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def _write_appdata(self):
+        for service in ("sonarr", "radarr", "prowlarr"):
+            (self.appdata / service).mkdir(parents=True)
+            (self.appdata / service / "config.xml").write_text(
+                f"<Config><Port>{DEFAULT_PORTS[service]}</Port><ApiKey>{service}bench0123456789abcdef</ApiKey></Config>")
+        (self.appdata / "bazarr" / "config").mkdir(parents=True)
+        (self.appdata / "bazarr" / "config" / "config.yaml").write_text("auth:\n  apikey: bazarrbench0123456789\n")
+        (self.appdata / "tautulli").mkdir(parents=True)
+        (self.appdata / "tautulli" / "config.ini").write_text("[General]\napi_key = tautullibench0123456789\n")
+
+    def prepare_workdir(self) -> Path:
+        """Fresh working copy with its own config file and state directory"""
+        workdir = Path(tempfile.mkdtemp(prefix="run-", dir=self.root))
+        shutil.copy(CONFIGURATOR, workdir / CONFIGURATOR.name)
+        (workdir / "state").mkdir()
+        for standin in self.standins.values():
+            standin.reset()
+        return workdir
+
+    def environment(self, workdir: Path) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            "DOCKER_HOST": f"unix://{self.root / 'docker.sock'}",
+            "CHIMERA_STATE_DIR": str(workdir / "state"),
+            "CHIMERA_HISTORY_DB": str(workdir / "state" / "latency_history.db"),
+            "CHIMERA_DAEMON": str(workdir / "state" / "no-daemon.sock"),
+            # On an Unraid host these would default to the real flash config and templates
+            "CHIMERA_CONFIG_FILE": str(workdir / "config.json"),
+            "CHIMERA_TEMPLATES_DIR": str(workdir / "templates"),
+            "PATH": "/usr/bin:/bin",   # no docker CLI, even if this box has one
+        })
+        return env
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+# ============================================================================
+# Running Scenarios
+# ============================================================================
+
+def run_scenario(bench: Bench, workdir: Path, argv: List[str]) -> Dict[str, Any]:
+    """Run one configurator command and measure it (peak RSS from wait4, not the parent's rusage)"""
+    command = [sys.executable, str(workdir / CONFIGURATOR.name), "--local"]
+    command += [arg.format(appdata=bench.appdata) for arg in argv]
+
+    docker_before = bench.docker.requests
+    before = {service: standin.requests for service, standin in bench.standins.items()}
+    failures_before = sum(standin.failures for standin in bench.standins.values())
+
+    with open(workdir / "output.log", "ab") as log:
+        log.write(("\n$ " + " ".join(command) + "\n").encode("utf-8"))
+        log.flush()
+        started = time.perf_counter()
+        pid = os.posix_spawn(command[0], command, bench.environment(workdir), file_actions=[
+            (os.POSIX_SPAWN_DUP2, log.fileno(), 1),
+            (os.POSIX_SPAWN_DUP2, log.fileno(), 2),
+        ])
+        timer = threading.Timer(SCENARIO_TIMEOUT, os.kill, (pid, signal.SIGKILL))
+        timer.start()
+        try:
+            _, status, usage = os.wait4(pid, 0)
+        finally:
+            timer.cancel()
+        wall = time.perf_counter() - started
+
+    requests = {service: standin.requests - before[service] for service, standin in bench.standins.items()}
+    return {
+        "wall": wall,
+        "requests": sum(requests.values()),
+        "by_service": {service: count for service, count in requests.items() if count},
+        "docker_requests": bench.docker.requests - docker_before,
+        "injected_failures": sum(standin.failures for standin in bench.standins.values()) - failures_before,
+        "peak_rss_kb": usage.ru_maxrss,   # kilobytes on Linux
+        "exit_code": os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status),
+    }
+
+def run_all(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Run every scenario --repeat times; per scenario keep the median wall time and the worst RSS"""
+    runs: Dict[str, List[Dict[str, Any]]] = {name: [] for name, _ in SCENARIOS}
+    selected = [(name, argv) for name, argv in SCENARIOS if not args.only or name in args.only]
+
+    bench = Bench(args)
+    try:
+        for repeat in range(args.repeat):
+            workdir = bench.prepare_workdir()
+            for name, argv in selected:
+                result = run_scenario(bench, workdir, argv)
+                runs[name].append(result)
+                if result["exit_code"] != 0:
+                    print(f"  ! {name} exited with {result['exit_code']} (see {workdir / 'output.log'})")
+                    args.keep = True
+                print(f"  run {repeat + 1}/{args.repeat} {name:<15} {result['wall']:7.3f}s "
+                      f"{result['requests']:5d} requests", file=sys.stderr)
+    finally:
+        if args.keep:
+            print(f"Keeping {bench.root}", file=sys.stderr)
+            for server in bench.servers:
+                server.shutdown()
+        else:
+            bench.close()
+
+    results = {}
+    for name, results_list in runs.items():
+        if not results_list:
+            continue
+        results[name] = {
+            "wall": statistics.median(r["wall"] for r in results_list),
+            "wall_min": min(r["wall"] for r in results_list),
+            "requests": int(statistics.median(r["requests"] for r in results_list)),
+            "docker_requests": int(statistics.median(r["docker_requests"] for r in results_list)),
+            "injected_failures": sum(r["injected_failures"] for r in results_list),
+            "peak_rss_kb": max(r["peak_rss_kb"] for r in results_list),
+            "by_service": results_list[-1]["by_service"],
+            "failed_runs": sum(1 for r in results_list if r["exit_code"] != 0),
+        }
+    return results
+
+# ============================================================================
+# Baselines and Report
+# ============================================================================
+
+def parameters(args: argparse.Namespace) -> Dict[str, Any]:
+    """Settings a baseline is only comparable under"""
+    return {"latency_ms": args.latency, "failure_rate": args.failure_rate,
+            "collection_size": args.collection_size, "seed": args.seed}
+
+def parameters_key(params: Dict[str, Any]) -> str:
+    return ",".join(f"{key}={value}" for key, value in sorted(params.items()))
+
+def load_baselines(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_baseline(path: Path, params: Dict[str, Any], results: Dict[str, Dict[str, Any]]):
+    """Baselines are kept per parameter set, so latency/failure variants don't overwrite each other"""
+    baselines = load_baselines(path)
+    baselines[parameters_key(params)] = {
+        "parameters": params,
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "scenarios": {name: {key: value for key, value in result.items() if key != "by_service"}
+                      for name, result in results.items()},
+    }
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+def change(current: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ""
+    return f"{(current - baseline) / baseline * 100:+.0f}%"
+
+def report(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]], tolerance: float) -> List[str]:
+    """Print the results table; return the regressions found against the baseline"""
+    regressions = []
+    scenarios = (baseline or {}).get("scenarios", {})
+
+    print(f"\n{'Scenario':<16}{'wall (median)':>14}{'vs base':>9}{'requests':>10}{'vs base':>9}"
+          f"{'docker':>8}{'503s':>6}{'peak RSS':>11}")
+    for name, result in results.items():
+        base = scenarios.get(name, {})
+        wall_change = change(result["wall"], base.get("wall"))
+        request_change = change(result["requests"], base.get("requests"))
+        print(f"{name:<16}{result['wall']:>13.3f}s{wall_change:>9}{result['requests']:>10}{request_change:>9}"
+              f"{result['docker_requests']:>8}{result['injected_failures']:>6}{result['peak_rss_kb'] / 1024:>9.1f}MB")
+
+        if base.get("wall") and result["wall"] > base["wall"] * (1 + tolerance):
+            regressions.append(f"{name}: wall time {base['wall']:.3f}s -> {result['wall']:.3f}s")
+        if base.get("requests") is not None and result["requests"] > base["requests"]:
+            regressions.append(f"{name}: requests {base['requests']} -> {result['requests']}")
+        if result["failed_runs"]:
+            regressions.append(f"{name}: {result['failed_runs']} run(s) exited non-zero")
+
+    if baseline is None:
+        print("\nNo baseline for these parameters - record one with --save-baseline")
+    else:
+        print(f"\nBaseline recorded {baseline.get('recorded', '?')} on Python {baseline.get('python', '?')}")
+    return regressions
+
+# ============================================================================
+# Main
+# ============================================================================
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark media_configurator.py against local stand-in services",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s                                   Run all scenarios, compare with the baseline
+  %(prog)s --save-baseline                   Record the current numbers as the baseline
+  %(prog)s --latency 80 --failure-rate 0.05  Slow, flaky services
+  %(prog)s --only configure-cold configure-warm --repeat 10
+        """
+    )
+    parser.add_argument('--latency', type=float, default=5.0, help='Per-request latency of every stand-in in ms (default: 5)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503 (default: 0)')
+    parser.add_argument('--collection-size', type=int, default=50, help='Unrelated objects seeded in each collection (default: 50)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for injected failures (default: 1)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario; the median is reported (default: 3)')
+    parser.add_argument('--only', nargs='+', choices=[name for name, _ in SCENARIOS], help='Run only these scenarios')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_FILE, help=f'Baseline file (default: {BASELINE_FILE.name})')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=WALL_TOLERANCE, help=f'Allowed wall-time increase (default: {WALL_TOLERANCE})')
+    parser.add_argument('--json', type=Path, metavar='FILE', help='Also write the full results to FILE')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary directory (logs, state) afterwards')
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "posix_spawn") or not hasattr(os, "wait4"):
+        print("This benchmark needs Linux (os.posix_spawn / os.wait4)", file=sys.stderr)
+        return 2
+
+    params = parameters(args)
+    print(f"Benchmarking {CONFIGURATOR.name}: {parameters_key(params)}, {args.repeat} repeat(s)", file=sys.stderr)
+    results = run_all(args)
+
+    baseline = load_baselines(args.baseline).get(parameters_key(params))
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parameters": params, "scenarios": results}, f, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, params, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
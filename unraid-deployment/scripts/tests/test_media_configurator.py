@@ -0,0 +1,920 @@
+"""
+Regression tests for media_configurator.py - stdlib unittest, no real services.
+
+Run from unraid-deployment/scripts:
+    python3 -m unittest discover -s tests
+"""
+
+import argparse
+import errno
+import io
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Dict, Tuple
+
+SCRIPTS = Path(__file__).resolve().parent.parent
+STATE = tempfile.mkdtemp(prefix="chimera-test-")
+
+# Module-level paths are fixed at import time, so point them at a scratch dir first
+os.environ["CHIMERA_STATE_DIR"] = STATE
+os.environ["CHIMERA_HISTORY_DB"] = os.path.join(STATE, "latency_history.db")
+os.environ["CHIMERA_DAEMON"] = os.path.join(STATE, "no-daemon.sock")
+os.environ["CHIMERA_CONFIG_FILE"] = os.path.join(STATE, "config.json")
+os.environ["CHIMERA_TEMPLATES_DIR"] = os.path.join(STATE, "templates")
+os.environ["DOCKER_HOST"] = "unix://" + os.path.join(STATE, "no-docker.sock")
+sys.path.insert(0, str(SCRIPTS))
+
+import media_bench  # noqa: E402
+import media_configurator as mc  # noqa: E402
+
+def serve(handler: type) -> HTTPServer:
+    """Start an HTTP server for one test on an ephemeral localhost port"""
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_main(argv, timeout: float = 30.0):
+    """Run main() on a thread; returns (exit code, stdout+stderr), or fails the test if it hangs"""
+    result = {}
+    output = io.StringIO()
+
+    def target():
+        with redirect_stdout(output), redirect_stderr(output):
+            result["code"] = mc.main(argv)
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise AssertionError(f"main({argv}) did not return within {timeout}s")
+    return result.get("code"), output.getvalue()
+
+class TruncatedCollectionHandler(BaseHTTPRequestHandler):
+    """Sends the start of a chunked JSON array, then drops the connection"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = b'[{"id": 1, "title": "One"}, {"id": 2, "ti'
+        self.wfile.write(b"%x\r\n" % (len(chunk) + 100) + chunk)   # promises more than it sends
+        self.wfile.flush()
+        self.connection.shutdown(socket.SHUT_RDWR)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+class CorruptGzipHandler(TruncatedCollectionHandler):
+    """Claims a gzip body but sends bytes that aren't one"""
+
+    def do_GET(self):
+        body = b"\x1f\x8b\x08\x00" + b"not really gzip" * 4
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FlakyCollectionHandler(TruncatedCollectionHandler):
+    """503 on the first request, then a small JSON array"""
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        body = b"" if self.requests == 1 else json.dumps([{"id": 1}, {"id": 2}, {"id": 3}]).encode()
+        self.send_response(503 if self.requests == 1 else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+class StreamTests(unittest.TestCase):
+    """APIClient.stream's iterator only ever raises OSError or ValueError"""
+
+    def stream(self, handler: type):
+        server = serve(handler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = mc.APIClient(f"http://127.0.0.1:{server.server_address[1]}", "key")
+        status, items = client.stream("/api/v3/movie")
+        self.assertEqual(status, 200)
+        return items
+
+    def test_stream_is_retried_and_timed_after_the_body(self):
+        server = serve(FlakyCollectionHandler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        FlakyCollectionHandler.requests = 0
+        client = mc.APIClient(f"http://127.0.0.1:{server.server_address[1]}", "key")
+
+        with mock.patch.object(mc, "RETRY_BACKOFF", 0), \
+                mock.patch.object(mc.get_latency_stats(), "record") as record:
+            status, items = client.stream("/api/v3/series")
+            self.assertEqual(status, 200)
+            self.assertEqual(FlakyCollectionHandler.requests, 2)   # the 503 was retried
+            record.reset_mock()
+            self.assertEqual(next(items)["id"], 1)
+            record.assert_not_called()   # the first byte is not the response time
+            self.assertEqual([item["id"] for item in items], [2, 3])
+        record.assert_called_once()
+        self.assertEqual(record.call_args[0][:2], (client.base_url, "/api/v3/series"))
+
+    def test_large_item_is_not_redecoded_per_chunk(self):
+        text = json.dumps([{"overview": "x" * 200000}, {"id": 2}])
+        chunks = [text[i:i + 100] for i in range(0, len(text), 100)]
+        calls = []
+        real = json.JSONDecoder.raw_decode
+
+        def counting(decoder, s, idx=0):
+            calls.append(idx)
+            return real(decoder, s, idx)
+
+        with mock.patch.object(json.JSONDecoder, "raw_decode", counting):
+            items = list(mc.iter_json_array(iter(chunks)))
+        self.assertEqual(items[1], {"id": 2})
+        self.assertLess(len(calls), 40)   # one attempt per chunk would be ~2000
+
+    def test_truncated_body_raises_oserror(self):
+        with self.assertRaises(OSError):
+            list(self.stream(TruncatedCollectionHandler))
+
+    def test_corrupt_gzip_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            list(self.stream(CorruptGzipHandler))
+
+class BadGatewayHandler(BaseHTTPRequestHandler):
+    """Answers every request with 502, counting them per method"""
+    protocol_version = "HTTP/1.1"
+    requests = {}
+
+    def respond(self):
+        self.requests[self.command] = self.requests.get(self.command, 0) + 1
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(502)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.close_connection = True
+
+    do_GET = do_POST = do_PUT = respond
+
+    def log_message(self, format, *args):
+        pass
+
+class RetryTests(unittest.TestCase):
+    def setUp(self):
+        BadGatewayHandler.requests = {}
+        server = serve(BadGatewayHandler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.client = mc.APIClient(f"http://127.0.0.1:{server.server_address[1]}", "key")
+        patcher = mock.patch.object(mc, "RETRY_BACKOFF", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_are_retried_on_502(self):
+        self.assertEqual(self.client.get("/api/v3/system/status", use_cache=False)[0], 502)
+        self.assertEqual(BadGatewayHandler.requests, {"GET": mc.RETRY_ATTEMPTS + 1})
+
+    def test_writes_are_not_retried_on_502(self):
+        self.assertEqual(self.client.post("/api/v3/rootfolder", {"path": "/tv"})[0], 502)
+        self.assertEqual(self.client.put("/api/v3/rootfolder/1", {"path": "/tv"})[0], 502)
+        self.assertEqual(BadGatewayHandler.requests, {"POST": 1, "PUT": 1})
+
+    def test_one_connection_failure_does_not_open_the_circuit(self):
+        circuit = mc.CircuitBreaker()
+        circuit.record_failure("Connection refused")
+        self.assertTrue(circuit.allow())
+        for _ in range(mc.CIRCUIT_FAILURE_THRESHOLD - 1):
+            circuit.record_failure("Connection refused")
+        self.assertFalse(circuit.allow())
+
+class ScanTests(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.addCleanup(self.listener.close)
+        self.target = self.listener.getsockname()
+
+    def scan_with_socket_errors(self, *errors: int):
+        """Scan the listener while the first socket() calls fail with the given errnos"""
+        real_socket = socket.socket
+        failures = list(errors)
+
+        def flaky_socket(*args, **kwargs):
+            if failures:
+                code = failures.pop(0)
+                raise OSError(code, os.strerror(code))
+            return real_socket(*args, **kwargs)
+
+        with mock.patch.object(mc.socket, "socket", flaky_socket):
+            return mc._scan([self.target], rate=1000, concurrency=8, connect_timeout=1.0, deadline=2.0)
+
+    def test_out_of_descriptors_retries_the_target(self):
+        self.assertEqual(self.scan_with_socket_errors(errno.EMFILE, errno.ENFILE), [self.target])
+
+    def test_other_socket_errors_count_as_closed(self):
+        self.assertEqual(self.scan_with_socket_errors(errno.EAFNOSUPPORT), [])
+
+    def test_concurrency_stays_below_the_descriptor_limit(self):
+        soft, _ = mc.resource.getrlimit(mc.resource.RLIMIT_NOFILE)
+        self.assertLessEqual(mc.scan_concurrency(soft * 2), max(1, soft - mc.SCAN_FD_HEADROOM))
+
+class ServeTests(unittest.TestCase):
+    def test_non_interactive_configure_is_forwarded(self):
+        parser = mc.build_parser()
+        with mock.patch.object(mc, "CONFIG_FILE", Path(STATE) / "missing.json"):
+            self.assertTrue(mc.daemon_can_run(parser.parse_args(["configure", "--auto"])))
+            self.assertFalse(mc.daemon_can_run(parser.parse_args(["configure"])))   # would prompt
+            self.assertFalse(mc.daemon_can_run(parser.parse_args(["configure", "--auto", "-i"])))
+            self.assertFalse(mc.daemon_can_run(parser.parse_args(["watch"])))
+
+    def test_reply_holds_only_the_commands_own_output(self):
+        def command(args):
+            # e.g. follow_docker_events reporting while a client's command runs
+            noise = threading.Thread(target=mc.print_warning, args=("Docker event stream interrupted",))
+            noise.start()
+            noise.join()
+            mc.print_info("status output")
+            return 0
+
+        with mock.patch.object(mc, "run_command", command), redirect_stdout(io.StringIO()) as process_stdout:
+            code, reply = mc.ConfiguratorDaemon().run(["status"])
+
+        self.assertEqual(code, 0)
+        self.assertIn("status output", reply)
+        self.assertNotIn("Docker event stream", reply)
+        self.assertIn("Docker event stream", process_stdout.getvalue())
+
+    def test_non_loopback_tcp_is_refused_without_allow_remote(self):
+        with mock.patch.object(mc, "TCPDaemonServer") as server:
+            code, output = run_main(["serve", "--listen", "0.0.0.0:8787"])
+        self.assertEqual(code, 1)
+        self.assertIn("Refusing to listen on 0.0.0.0", output)
+        server.assert_not_called()
+
+    def test_loopback_hosts(self):
+        for host in ("localhost", "127.0.0.1", "127.1.2.3", "::1"):
+            self.assertTrue(mc.is_loopback_host(host), host)
+        for host in ("0.0.0.0", "192.168.1.10", "tower.local", ""):
+            self.assertFalse(mc.is_loopback_host(host), host)
+
+def serve_docker(test: unittest.TestCase, ports) -> Tuple[str, "media_bench.FakeDocker"]:
+    """Start the bench's fake Docker socket for one test; returns (socket path, fake)"""
+    socket_path = os.path.join(tempfile.mkdtemp(dir=STATE), "docker.sock")
+    docker = media_bench.FakeDocker(ports)
+    server = media_bench.DockerServer(socket_path, media_bench.DockerHandler)
+    server.docker = docker
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return socket_path, docker
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+SONARR_TEMPLATE = """<?xml version="1.0"?>
+<Container version="2">
+  <Name>sonarr</Name>
+  <Network>bridge</Network>
+  <Config Name="WebUI" Target="8989" Default="8989" Mode="tcp" Type="Port">18989</Config>
+  <Config Name="Config" Target="/config" Default="" Mode="rw" Type="Path">/mnt/user/appdata/sonarr</Config>
+</Container>
+"""
+
+RADARR_TEMPLATE = """<?xml version="1.0"?>
+<Container version="2">
+  <Name>binhex-radarr</Name>
+  <Network>br0</Network>
+  <MyIP>192.168.1.50 </MyIP>
+  <Config Name="Config" Target="/config" Default="/mnt/user/appdata/binhex-radarr" Mode="rw" Type="Path"></Config>
+</Container>
+"""
+
+PROWLARR_TEMPLATE = """<?xml version="1.0"?>
+<Container>
+  <Name>prowlarr</Name>
+  <Networking>
+    <Mode>bridge</Mode>
+    <Publish>
+      <Port><HostPort>19696</HostPort><ContainerPort>9696</ContainerPort><Protocol>tcp</Protocol></Port>
+    </Publish>
+  </Networking>
+  <Data>
+    <Volume><HostDir>/mnt/user/appdata/prowlarr</HostDir><ContainerDir>/config</ContainerDir><Mode>rw</Mode></Volume>
+  </Data>
+</Container>
+"""
+
+class TemplateTests(unittest.TestCase):
+    def setUp(self):
+        self.templates = Path(tempfile.mkdtemp(dir=STATE))
+        for name, text in [("my-sonarr.xml", SONARR_TEMPLATE), ("my-binhex-radarr.xml", RADARR_TEMPLATE),
+                           ("my-prowlarr.xml", PROWLARR_TEMPLATE), ("my-broken.xml", "<Container><Name>bazarr"),
+                           ("my-nginx.xml", "<Container><Name>nginx</Name></Container>")]:
+            (self.templates / name).write_text(text)
+
+    def test_templates_map_services_to_urls_and_appdata(self):
+        discovered = mc.discover_from_templates(self.templates)
+        self.assertEqual(set(discovered), {"sonarr", "radarr", "prowlarr"})
+        # Bridge network: the host port mapped onto the service's port
+        self.assertEqual(discovered["sonarr"]["url"], "http://localhost:18989")
+        self.assertEqual(discovered["sonarr"]["appdata"], "/mnt/user/appdata/sonarr")
+        # Custom network: the container's own IP, and the Default when the value is empty
+        self.assertEqual(discovered["radarr"]["url"], "http://192.168.1.50:7878")
+        self.assertEqual(discovered["radarr"]["appdata"], "/mnt/user/appdata/binhex-radarr")
+        # Version 1 template
+        self.assertEqual(discovered["prowlarr"]["url"], "http://localhost:19696")
+        self.assertEqual(discovered["prowlarr"]["appdata"], "/mnt/user/appdata/prowlarr")
+
+    def test_malformed_template_is_skipped(self):
+        self.assertIsNone(mc.parse_dockerman_template(self.templates / "my-broken.xml"))
+
+    def test_missing_template_directory_finds_nothing(self):
+        self.assertEqual(mc.discover_from_templates(self.templates / "missing"), {})
+
+class DockerClientTests(unittest.TestCase):
+    def setUp(self):
+        self.socket_path, self.docker = serve_docker(self, {"sonarr": 8989})
+
+    def test_removed_container_does_not_disable_the_api(self):
+        client = mc.DockerClient(self.socket_path)
+        container_id = client.containers()[0]["ID"]
+
+        self.assertIsNone(client.inspect("0123456789ab"))   # removed since the listing
+        self.assertTrue(client.api_available)
+        self.assertEqual(client.inspect(container_id)["Image"], "sha256:sonarr")
+        self.assertEqual(self.docker.requests, 3)
+
+    def test_missing_socket_disables_the_api(self):
+        client = mc.DockerClient(self.socket_path)
+        client.socket_path = self.socket_path + ".gone"
+        client.containers()
+        self.assertFalse(client.api_available)
+
+class WatchTests(unittest.TestCase):
+    def setUp(self):
+        self.port = free_port()
+        socket_path, self.docker = serve_docker(self, {"sonarr": self.port, "radarr": free_port()})
+        for name, value in (("_docker_client", mc.DockerClient(socket_path)), ("READY_BACKOFF", 0.1)):
+            patcher = mock.patch.object(mc, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.sonarr_id = self.docker.containers[0]["Id"]
+
+    def start_sonarr(self, delay: float):
+        """Bring Sonarr's port up only after a delay, like a container that was just started"""
+        def start():
+            time.sleep(delay)
+            server = media_bench.StandInServer(("127.0.0.1", self.port), media_bench.StandInHandler)
+            server.standin = media_bench.StandIn("sonarr", 0, 0.0, 5, 1)
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            server.serve_forever()
+        threading.Thread(target=start, daemon=True).start()
+
+    def test_only_the_containers_in_the_batch_are_resolved(self):
+        with redirect_stdout(io.StringIO()):
+            discovered = mc.discover_container_ids([self.sonarr_id])
+        self.assertEqual(list(discovered), ["sonarr"])
+        self.assertEqual(discovered["sonarr"]["url"], f"http://localhost:{self.port}")
+
+    def test_started_service_is_waited_for_before_its_steps(self):
+        config = mc.Config(sonarr=mc.ServiceConfig("Sonarr", "http://localhost:1", "key"))
+        event = {"Action": "start", "Actor": {"ID": self.sonarr_id, "Attributes": {
+            "name": "sonarr", "com.chimera.service": "sonarr"}}}
+        self.start_sonarr(delay=1.0)
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertTrue(mc.apply_event_batch(config, [event], STATE, dry_run=True))
+
+        self.assertTrue(config.sonarr.verified, output.getvalue())
+        self.assertEqual(config.sonarr.url, f"http://localhost:{self.port}")
+        self.assertIn("Sonarr became ready after", output.getvalue())
+
+class CollectionHandler(BaseHTTPRequestHandler):
+    """A tiny arr: GET lists what was POSTed to a path, counting every GET"""
+    items: Dict[str, list] = {}
+    gets: Dict[str, int] = {}
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+    def do_GET(self):
+        self.gets[self.path] = self.gets.get(self.path, 0) + 1
+        collection, _, item_id = self.path.rpartition("/")
+        if not item_id.isdigit():
+            self.reply(200, self.items.get(self.path, []))
+            return
+        match = [item for item in self.items.get(collection, []) if item.get("id") == int(item_id)]
+        self.reply(200, match[0]) if match else self.reply(404, {"message": "NotFound"})
+
+    def do_POST(self):
+        item = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        item["id"] = len(self.items.setdefault(self.path, [])) + 1
+        self.items[self.path].append(item)
+        self.reply(201, item)
+
+    do_PUT = do_POST
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        CollectionHandler.items, CollectionHandler.gets = {}, {}
+        server = serve(CollectionHandler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.client = mc.APIClient(f"http://127.0.0.1:{server.server_address[1]}", "key")
+        self.addCleanup(mc.get_response_cache().clear)
+
+    def test_repeated_gets_are_served_from_the_cache(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get("/api/v3/downloadclient"), (200, []))
+        self.assertEqual(CollectionHandler.gets, {"/api/v3/downloadclient": 1})
+
+    def test_writes_invalidate_their_resource_prefix(self):
+        self.client.get("/api/v3/downloadclient")
+        self.client.get("/api/v3/rootfolder")
+        self.client.put("/api/v3/downloadclient/5", {"id": 5})
+
+        self.assertEqual(self.client.get("/api/v3/downloadclient"), (200, []))
+        self.client.get("/api/v3/rootfolder")
+        self.assertEqual(CollectionHandler.gets, {"/api/v3/downloadclient": 2, "/api/v3/rootfolder": 1})
+
+        self.client.post("/api/v3/downloadclient", {"name": "Chimera-Debrid"})
+        self.assertEqual(self.client.get("/api/v3/downloadclient"), (200, [{"name": "Chimera-Debrid", "id": 1}]))
+
+    def test_entries_expire_and_least_recently_used_are_evicted(self):
+        cache = mc.ResponseCache(ttl=60, max_entries=2)
+        cache.put(("http://sonarr:8989", "key", "/a"), 200, [1])
+        cache.put(("http://sonarr:8989", "key", "/b"), 200, [2])
+        cache.get(("http://sonarr:8989", "key", "/a"))
+        cache.put(("http://sonarr:8989", "key", "/c"), 200, [3])
+        self.assertIsNone(cache.get(("http://sonarr:8989", "key", "/b")))
+        self.assertEqual(cache.get(("http://sonarr:8989", "key", "/a")), (200, [1]))
+
+        with mock.patch.object(mc.time, "monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(cache.get(("http://sonarr:8989", "key", "/c")))
+
+    def test_callers_get_their_own_copy(self):
+        cache = mc.ResponseCache()
+        cache.put(("http://bazarr:6767", "key", "/api/system/settings"), 200, {"sonarr": {"ip": ""}})
+        _, settings = cache.get(("http://bazarr:6767", "key", "/api/system/settings"))
+        settings["sonarr"]["ip"] = "sonarr"
+        self.assertEqual(cache.get(("http://bazarr:6767", "key", "/api/system/settings")),
+                         (200, {"sonarr": {"ip": ""}}))
+
+class AppliedLedgerTests(unittest.TestCase):
+    def setUp(self):
+        CollectionHandler.items, CollectionHandler.gets = {}, {}
+        server = serve(CollectionHandler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.sonarr = mc.APIClient(f"http://127.0.0.1:{server.server_address[1]}", "key")
+        self.addCleanup(mc.get_response_cache().clear)
+        self.path = Path(tempfile.mkdtemp(dir=STATE)) / "applied.json"
+        self.ledger = mc.AppliedLedger(self.path)
+        patcher = mock.patch.object(mc, "_applied_ledger", self.ledger)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_download_client(self, rdt_port: int = 6500) -> str:
+        mc.get_response_cache().clear()   # as between two configure runs
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertTrue(mc.add_download_client_to_arr(self.sonarr, "Sonarr", "rdt-client", rdt_port))
+        return output.getvalue()
+
+    def test_unchanged_item_is_confirmed_with_one_lookup(self):
+        self.assertIn("Added Chimera-Debrid", self.add_download_client())
+        self.assertEqual(CollectionHandler.gets, {"/api/v3/downloadclient": 1})
+
+        self.assertIn("already exists", self.add_download_client())
+        self.assertEqual(CollectionHandler.gets, {"/api/v3/downloadclient": 1, "/api/v3/downloadclient/1": 1})
+        self.assertEqual(len(CollectionHandler.items["/api/v3/downloadclient"]), 1)
+
+    def test_changed_inputs_are_not_skipped(self):
+        self.add_download_client()
+        self.add_download_client(rdt_port=6501)
+        self.assertNotIn("/api/v3/downloadclient/1", CollectionHandler.gets)
+        self.assertEqual(CollectionHandler.gets["/api/v3/downloadclient"], 2)
+
+    def test_item_deleted_on_the_service_is_added_again(self):
+        self.add_download_client()
+        CollectionHandler.items.clear()
+        self.assertIn("Added Chimera-Debrid", self.add_download_client())
+        self.assertEqual(CollectionHandler.gets["/api/v3/downloadclient/1"], 1)
+        self.assertEqual(len(CollectionHandler.items["/api/v3/downloadclient"]), 1)
+
+    def test_ledger_survives_a_restart(self):
+        self.add_download_client()
+        self.ledger.save()
+        inputs = self.ledger.digest(self.sonarr.base_url, self.sonarr.api_key,
+                                    mc.download_client_payload("Sonarr", "rdt-client", 6500))
+        reloaded = mc.AppliedLedger(self.path)
+        key = f"download_client {self.sonarr.base_url} Sonarr"
+        self.assertTrue(reloaded.confirm(key, inputs, self.sonarr, "/api/v3/downloadclient/{id}"))
+        self.assertFalse(mc.AppliedLedger(self.path, persist=False).confirm(
+            key, inputs, self.sonarr, "/api/v3/downloadclient/{id}"))
+
+class NotFoundHandler(BadGatewayHandler):
+    """Answers every request with 404 - a freshly recreated, empty instance"""
+
+    def respond(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.close_connection = True
+
+    do_GET = do_POST = do_PUT = respond
+
+class StaleCacheTests(unittest.TestCase):
+    def setUp(self):
+        server = serve(NotFoundHandler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.client = mc.APIClient(f"http://127.0.0.1:{server.server_address[1]}", "key")
+        self.cache = mc.get_response_cache()
+        self.addCleanup(self.cache.clear)
+        # What the instance answered before its container was recreated
+        self.cache.put((self.client.base_url, "key", "/api/v3/downloadclient/5"), 200, {"id": 5})
+
+    def test_ledger_confirm_bypasses_the_response_cache(self):
+        ledger = mc.AppliedLedger(persist=False)
+        digest = ledger.digest("rdt-client", 6500)
+        ledger.record("sonarr download client", digest, 5)
+        self.assertFalse(ledger.confirm("sonarr download client", digest, self.client, "/api/v3/downloadclient/{id}"))
+
+    def test_each_watch_batch_starts_with_an_empty_cache(self):
+        config = mc.Config(sonarr=mc.ServiceConfig("Sonarr", self.client.base_url, "key"))
+        event = {"Action": "die", "Actor": {"ID": "0123456789ab", "Attributes": {"name": "sonarr"}}}
+        with redirect_stdout(io.StringIO()):
+            mc.apply_event_batch(config, [event], STATE, dry_run=True)
+        self.assertIsNone(self.cache.get((self.client.base_url, "key", "/api/v3/downloadclient/5")))
+
+class PlanTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(mc, "_applied_ledger", mc.AppliedLedger(persist=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sonarr = mc.APIClient("http://sonarr:8989", "key")
+        self.payload = mc.download_client_payload("Sonarr", "rdt-client", 6500)
+        self.item = mc.DesiredItem(
+            "download_client", 'Sonarr: download client "Chimera-Debrid"', self.sonarr, "/api/v3/downloadclient",
+            mc.find_by("name", "Chimera-Debrid"), self.payload, "inputs",
+            compare=["fields.host", "fields.port", "fields.password"],
+            create="/api/v3/downloadclient", update="/api/v3/downloadclient/{id}",
+        )
+
+    def plan(self, status: int, data) -> mc.Plan:
+        return mc.build_plan([self.item], {(self.sonarr.base_url, "key", "/api/v3/downloadclient"): (status, data)})
+
+    def live_client(self, **fields) -> dict:
+        live = json.loads(json.dumps(self.payload))
+        live.update(id=7, tags=[3])
+        for entry in live["fields"]:
+            entry["value"] = fields.get(entry["name"], entry["value"])
+        live["fields"].append({"name": "recentTvPriority", "value": 1})
+        return live
+
+    def test_missing_object_is_created(self):
+        plan = self.plan(200, [])
+        self.assertEqual([(op.action, op.method, op.endpoint) for op in plan.operations],
+                         [("create", "POST", "/api/v3/downloadclient")])
+        self.assertEqual(plan.operations[0].body, self.payload)
+
+    def test_masked_secret_is_not_a_change(self):
+        plan = self.plan(200, [self.live_client(password=mc.MASKED_VALUE)])
+        self.assertEqual(plan.operations, [])
+        self.assertEqual(plan.unchanged, [self.item])
+
+    def test_update_replaces_only_the_changed_keys(self):
+        plan = self.plan(200, [self.live_client(host="192.168.1.9", password=mc.MASKED_VALUE)])
+        [op] = plan.operations
+        self.assertEqual((op.action, op.method, op.endpoint, op.remote_id), ("update", "PUT", "/api/v3/downloadclient/7", 7))
+        self.assertEqual(op.changes, [("fields.host", "192.168.1.9", "rdt-client")])
+        body = mc.flatten(op.body)
+        self.assertEqual(body["fields.host"], "rdt-client")
+        # Everything else is sent back as the service had it
+        self.assertEqual(body["fields.password"], mc.MASKED_VALUE)
+        self.assertEqual(body["fields.recentTvPriority"], 1)
+        self.assertEqual((op.body["id"], op.body["tags"]), (7, [3]))
+
+    def test_unreadable_collection_is_an_error(self):
+        plan = self.plan(401, "Unauthorized")
+        self.assertEqual(plan.operations, [])
+        self.assertEqual(plan.errors, [(self.item, "could not read /api/v3/downloadclient: Unauthorized")])
+
+    def test_sensitive_values_are_not_printed(self):
+        plan = self.plan(200, [self.live_client(password="hunter2")])
+        output = io.StringIO()
+        with redirect_stdout(output):
+            mc.print_plan(plan)
+        self.assertIn("fields.password: (sensitive) -> ", output.getvalue())
+        self.assertNotIn("hunter2", output.getvalue())
+        self.assertIn("0 to create, 1 to update, 0 unchanged", output.getvalue())
+
+class FakeArr:
+    """Stands in for an APIClient; fails POSTs to the endpoints in fail"""
+    def __init__(self, base_url: str, fail: Tuple[str, ...] = ()):
+        self.base_url, self.api_key, self.fail = base_url, "key", fail
+        self.calls, self.active, self.overlapped = [], 0, False
+        self.lock = threading.Lock()
+
+    def post(self, endpoint: str, body: dict):
+        with self.lock:
+            self.active += 1
+            self.overlapped = self.overlapped or self.active > 1
+            self.calls.append(endpoint)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return (500, "boom") if endpoint in self.fail else (201, {"id": len(self.calls)})
+
+    put = post
+
+def plan_for(client: FakeArr, *endpoints: str) -> mc.Plan:
+    plan = mc.Plan()
+    for endpoint in endpoints:
+        item = mc.DesiredItem(f"{client.base_url} {endpoint}", endpoint, client, "/collection",
+                              mc.find_by("id", 0), {}, "inputs", create=endpoint,
+                              followup=("/api/v1/applications/action/sync", {}))
+        plan.operations.append(mc.Operation(item, "create", "POST", endpoint, {}))
+    return plan
+
+class ApplyPlanTests(unittest.TestCase):
+    def test_operations_on_one_service_run_in_order(self):
+        prowlarr = FakeArr("http://prowlarr:9696")
+        with redirect_stdout(io.StringIO()):
+            self.assertTrue(mc.apply_plan(plan_for(prowlarr, "/a", "/b", "/c")))
+        self.assertFalse(prowlarr.overlapped)
+        self.assertEqual(prowlarr.calls, ["/a", "/b", "/c", "/api/v1/applications/action/sync"])
+
+    def test_followup_is_skipped_when_its_service_had_a_failure(self):
+        prowlarr = FakeArr("http://prowlarr:9696", fail=("/b",))
+        sonarr = FakeArr("http://sonarr:8989")
+        plan = plan_for(prowlarr, "/a", "/b")
+        plan.operations += plan_for(sonarr, "/a").operations
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertFalse(mc.apply_plan(plan))
+        self.assertEqual(prowlarr.calls, ["/a", "/b"])
+        self.assertEqual(sonarr.calls, ["/a", "/api/v1/applications/action/sync"])
+        self.assertIn("Skipped /api/v1/applications/action/sync", output.getvalue())
+
+class ExporterTests(unittest.TestCase):
+    def setUp(self):
+        self.exporter = mc.MetricsExporter(interval=60, concurrency=1)
+        self.addCleanup(self.exporter.executor.shutdown)
+
+    def test_page_reports_services_and_wiring(self):
+        server = media_bench.StandInServer(("127.0.0.1", 0), media_bench.StandInHandler)
+        server.standin = media_bench.StandIn("sonarr", 0, 0.0, 5, 1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        sonarr = f"http://127.0.0.1:{server.server_address[1]}"
+        config = mc.Config(sonarr=mc.ServiceConfig("Sonarr", sonarr, "key"),
+                           radarr=mc.ServiceConfig("Radarr", f"http://127.0.0.1:{free_port()}", "key"))
+        config_file = Path(tempfile.mkdtemp(dir=STATE)) / "config.json"
+        config_file.write_text(json.dumps(config.to_dict()))
+        self.addCleanup(mc.get_response_cache().clear)
+
+        with mock.patch.object(mc, "CONFIG_FILE", config_file), redirect_stdout(io.StringIO()):
+            self.exporter.refresh()
+            page = self.exporter.render().decode()
+            self.assertIn(f'chimera_service_up{{service="sonarr",url="{sonarr}"}} 1', page)
+            self.assertIn('chimera_service_info{service="sonarr",version="4.0.0.0"} 1', page)
+            self.assertRegex(page, r'chimera_service_up\{service="radarr",url="[^"]+"\} 0')
+            self.assertIn('chimera_api_request_duration_seconds_count{service="sonarr",endpoint="/api/v3/rootfolder"} 1', page)
+            root_folder = f'chimera_integration_wired{{service="sonarr",integration="Sonarr: root folder \\"{config.tv_path}\\""}}'
+            self.assertIn(f"{root_folder} 0", page)
+
+            # Once configure has added the root folder the next refresh sees it
+            server.standin.collections["/api/v3/rootfolder"].append({"id": 99, "path": config.tv_path})
+            self.exporter.refresh()
+            page = self.exporter.render().decode()
+        self.assertIn(f"{root_folder} 1", page)
+        self.assertIn("chimera_exporter_scrapes_total 2", page)
+        self.assertIn("chimera_exporter_refresh_errors_total 0", page)
+
+    def test_failed_refresh_is_counted_and_keeps_the_previous_page(self):
+        self.exporter.page = b"chimera_service_up{service=\"sonarr\"} 1\n"
+
+        def failing_refresh():
+            mc.print_info("Checking sonarr")
+            raise RuntimeError("config unreadable")
+
+        output = io.StringIO()
+        with mock.patch.object(self.exporter, "refresh", failing_refresh), redirect_stdout(output):
+            self.exporter.tick()
+
+        page = self.exporter.render().decode()
+        self.assertIn('chimera_service_up{service="sonarr"} 1', page)
+        self.assertIn("chimera_exporter_refresh_errors_total 1", page)
+        self.assertIn("Checking sonarr", output.getvalue())
+        self.assertIn("config unreadable", output.getvalue())
+
+class LatencyHistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp(dir=STATE)) / "latency_history.db"
+        self.history = mc.LatencyHistory(self.path)
+
+    def record_at(self, ts: float, service: str, latency: float, status: int = 200, version: str = "4.0.0.0"):
+        with mock.patch.object(mc.time, "time", return_value=ts):
+            self.history.record(service, latency, status, version)
+
+    def test_old_checks_become_hourly_rollups(self):
+        now = time.time()
+        hour = int(now - 10 * 86400) // 3600 * 3600
+        for offset, latency, status in [(60, 0.1, 200), (120, 0.3, 200), (180, 0.2, 200), (240, 5.0, 0)]:
+            self.record_at(hour + offset, "sonarr", latency, status)
+        self.record_at(now - 60, "sonarr", 0.05)
+        self.history.flush()
+
+        # A rollup past HISTORY_ROLLUP_DAYS is pruned by the next flush
+        db = sqlite3.connect(str(self.path))
+        self.addCleanup(db.close)
+        with db:
+            db.execute("INSERT INTO rollups VALUES (?, 'sonarr', 1, 0, 0.1, 0.1, 0.1, '')",
+                       (int(now - 400 * 86400) // 3600 * 3600,))
+        self.record_at(now - 30, "sonarr", 0.05)
+        self.history.flush()
+
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM checks").fetchone(), (2,))
+        self.assertEqual(db.execute("SELECT * FROM rollups").fetchall(),
+                         [(hour, "sonarr", 4, 1, 0.2, mc.percentile([0.1, 0.2, 0.3], 95), 0.3, "4.0.0.0")])
+
+    def test_summary_splits_checks_into_windows(self):
+        now = time.time()
+        self.record_at(now - 30 * 60, "sonarr", 0.1)
+        self.record_at(now - 2 * 3600, "sonarr", 0.3, version="4.0.1.0")
+        self.record_at(now - 3 * 86400, "sonarr", 0.5, status=0)
+        self.record_at(now - 30 * 86400, "sonarr", 0.9)
+        self.record_at(now - 60, "radarr", 0.2)
+
+        with redirect_stdout(io.StringIO()):
+            summary = self.history.summary()
+        self.assertEqual({window: stats["checks"] for window, stats in summary["sonarr"].items()},
+                         {"1h": 1, "1d": 2, "1w": 3})
+        self.assertEqual(summary["sonarr"]["1w"]["failures"], 1)
+        self.assertEqual(summary["sonarr"]["1d"]["p50"], mc.percentile([0.1, 0.3], 50))
+        self.assertEqual(summary["sonarr"]["1h"]["version"], "4.0.0.0")
+        self.assertEqual(summary["radarr"]["1h"]["checks"], 1)
+
+    def test_corrupt_database_is_reported_not_raised(self):
+        self.path.write_bytes(b"this is not a sqlite database" * 100)
+        output = io.StringIO()
+        with mock.patch.object(mc, "_latency_history", self.history), redirect_stdout(output):
+            self.assertEqual(mc.print_latency_history(), 1)
+        self.assertIn("Failed to read latency history", output.getvalue())
+
+    def test_summary_does_not_write_to_the_database(self):
+        sqlite3.connect(str(self.path)).close()   # exists, but has no tables yet
+        with redirect_stdout(io.StringIO()):
+            self.assertIsNone(self.history.summary())
+        db = sqlite3.connect(str(self.path))
+        self.addCleanup(db.close)
+        self.assertEqual(db.execute("SELECT name FROM sqlite_master").fetchall(), [])
+
+class LatencyStatsTests(unittest.TestCase):
+    def test_timeouts_grow_after_a_timeout(self):
+        stats = mc.LatencyStats(Path(STATE) / "latency_stats_test.json")
+        base_url = "http://sonarr:8989"
+        for _ in range(mc.LATENCY_SAMPLES):
+            stats.record(base_url, "/api/v3/series", 0.001, 0.01)
+        self.assertEqual(stats.timeouts(base_url, "/api/v3/series"), (mc.CONNECT_TIMEOUT_RANGE[0], 3.0))
+
+        # Each timeout lifts the read timeout until it reaches the ceiling
+        reads = []
+        for _ in range(3):
+            stats.record_timeout(base_url, "/api/v3/series", "read")
+            reads.append(stats.timeouts(base_url, "/api/v3/series")[1])
+        self.assertEqual(reads, [9.0, 27.0, mc.READ_TIMEOUT_RANGE[1]])
+
+        stats.record_timeout(base_url, "/api/v3/series", "connect")
+        self.assertEqual(stats.timeouts(base_url, "/api/v3/series")[0], 1.5)
+
+class InventoryTests(unittest.TestCase):
+    def setUp(self):
+        self.workdir = Path(tempfile.mkdtemp(dir=STATE))
+        self.saved_config_file = mc.CONFIG_FILE
+        mc.CONFIG_FILE = self.workdir / "config.json"
+
+    def tearDown(self):
+        mc.CONFIG_FILE = self.saved_config_file
+
+    def test_truncated_stream_fails_the_kind_instead_of_hanging(self):
+        server = serve(TruncatedCollectionHandler)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        config = mc.Config(radarr=mc.ServiceConfig("Radarr", url, "key", verified=True))
+        mc.CONFIG_FILE.write_text(json.dumps(config.to_dict()))
+
+        output_file = self.workdir / "inventory.ndjson"
+        code, output = run_main(["--local", "inventory", "--kinds", "movies", "-o", str(output_file)])
+
+        self.assertEqual(code, 1)
+        self.assertIn("radarr: inventory incomplete", output)
+
+    def test_closed_stdout_pipe_is_reported(self):
+        server = media_bench.StandInServer(("127.0.0.1", 0), media_bench.StandInHandler)
+        server.standin = media_bench.StandIn("radarr", 0, 0.0, 5, 1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        config = mc.Config(radarr=mc.ServiceConfig("Radarr", url, "key", verified=True))
+        mc.CONFIG_FILE.write_text(json.dumps(config.to_dict()))
+
+        # `inventory | head` after head has exited
+        read_end, write_end = os.pipe()
+        os.close(read_end)
+        stdout = open(write_end, "w")
+        self.addCleanup(stdout.close)
+        args = argparse.Namespace(kinds="movies", episodes=False, output="-", format="ndjson")
+        errors = io.StringIO()
+        with mock.patch.object(sys, "stdout", stdout), redirect_stderr(errors):
+            self.assertEqual(mc.cmd_inventory(args), 1)
+        self.assertIn("Failed to write inventory to -", errors.getvalue())
+
+class BenchTests(unittest.TestCase):
+    def test_configurator_paths_stay_inside_the_bench_directory(self):
+        bench = media_bench.Bench(argparse.Namespace(latency=0, failure_rate=0.0, collection_size=5, seed=1))
+        self.addCleanup(bench.close)
+        workdir = bench.prepare_workdir()
+        with mock.patch.dict(os.environ):
+            # The isolation must come from Bench.environment, not from this module's setup
+            for name in ("CHIMERA_CONFIG_FILE", "CHIMERA_TEMPLATES_DIR", "CHIMERA_STATE_DIR", "CHIMERA_HISTORY_DB"):
+                del os.environ[name]
+            env = bench.environment(workdir)
+
+        script = ("import media_configurator as mc; "
+                  "print(mc.CONFIG_FILE); print(mc.DOCKERMAN_TEMPLATES); print(mc.STATE_DIR); print(mc.HISTORY_DB)")
+        result = subprocess.run([sys.executable, "-c", script], cwd=workdir, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        for path in result.stdout.split():
+            self.assertTrue(path.startswith(str(bench.root) + os.sep), path)
+
+class RecordReplayTests(unittest.TestCase):
+    """Replaying a recording must make exactly the requests the recording captured"""
+
+    def setUp(self):
+        self.bench = media_bench.Bench(argparse.Namespace(latency=0, failure_rate=0.0, collection_size=5, seed=1))
+        self.addCleanup(self.bench.close)
+        self.workdir = self.bench.prepare_workdir()
+
+    def configurator(self, *argv: str) -> subprocess.CompletedProcess:
+        command = [sys.executable, str(self.workdir / "media_configurator.py"), "--local", *argv]
+        return subprocess.run(command, env=self.bench.environment(self.workdir), capture_output=True,
+                              text=True, timeout=120)
+
+    def test_replay_of_configure_auto_ignores_the_applied_ledger(self):
+        appdata = str(self.bench.appdata)
+        recording = str(self.workdir / "run.json")
+
+        # Recorded on a cold ledger: had the recording saved one, the replay would look up
+        # the recorded IDs (GET /api/v3/rootfolder/{id}) and find no response for them
+        recorded = self.configurator("--record", recording, "configure", "--auto", "--appdata", appdata)
+        self.assertEqual(recorded.returncode, 0, recorded.stdout + recorded.stderr)
+        replayed = self.configurator("--replay", recording, "configure", "--auto", "--appdata", appdata)
+
+        output = replayed.stdout + replayed.stderr
+        self.assertEqual(replayed.returncode, 0, output)
+        self.assertNotIn("No recorded response", output)
+        self.assertNotIn("Circuit open", output)
+        self.assertIn("Media stack has been configured", output)
+
+if __name__ == "__main__":
+    unittest.main()